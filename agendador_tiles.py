@@ -0,0 +1,192 @@
+import math
+import os
+import numpy as np
+
+# ==== AGENDAMENTO DOS TILES NA ORDEM FÍSICA DO ARQUIVO ====
+# Com o TIFF em tiles ou strips comprimidos, cada tile de trabalho decodifica os
+# segmentos internos que cobre. O agendador:
+#   1. alinha o tile_size aos segmentos, para que cada segmento caia em um só tile;
+#   2. ordena a fila pelo offset do primeiro segmento de cada tile (leitura sequencial);
+#   3. nos strips (que cobrem a largura toda) entrega a faixa inteira de tiles ao mesmo
+#      worker, que decodifica cada strip uma vez e reaproveita do cache nos vizinhos;
+#   4. com halo, cada chunk leva várias faixas seguidas, porque a borda extra decodifica
+#      a linha de segmentos das faixas vizinhas e só o mesmo worker a encontra no cache.
+
+CHUNK_PADRAO = 10
+FATOR_ALINHAMENTO_MAXIMO = 4  # não alinha se o múltiplo dos segmentos passar de 4x o tile pedido
+
+# ==== TAMANHO DE TILE ALINHADO AOS SEGMENTOS ====
+# Passo dos segmentos: mmc da altura e da largura nos tiles internos, a altura do strip
+# nos strips (1 sem layout)
+def passo_segmentos(layout):
+    if layout is None:
+        return 1
+    sh, sw = layout["segmento"]
+    return sh if layout["tipo"] == "strips" else math.lcm(sh, sw)
+
+# Múltiplo mais próximo do passo dos segmentos
+def alinhar_tile_size(tile_size, layout):
+    if layout is None:
+        return tile_size
+    passo = passo_segmentos(layout)
+    if passo > FATOR_ALINHAMENTO_MAXIMO * tile_size:
+        return tile_size
+    return max(passo, round(tile_size / passo) * passo)
+
+# ==== SEGMENTOS QUE UMA JANELA COBRE ====
+def segmentos_da_janela(layout, y0, y1, x0, x1):
+    sh, sw = layout["segmento"]
+    linhas, colunas = layout["grade"]
+    lins = np.arange(y0 // sh, min(linhas, -(-y1 // sh)))
+    cols = np.arange(x0 // sw, min(colunas, -(-x1 // sw)))
+    return (lins[:, None] * colunas + cols[None, :]).ravel()
+
+# ==== FILA ORDENADA E CHUNK ====
+# Retorna (tile_size, posições (x, y) na ordem de leitura, chunk_size).
+# chunk_size=None escolhe pelo layout; um inteiro é respeitado como antes.
+def agendar_tiles(layout, height, width, tile_size, num_workers, chunk_size=None, alinhar=True, halo=None):
+    if alinhar:
+        tile_size = alinhar_tile_size(tile_size, layout)
+    posicoes = [(x, y) for y in range(0, height, tile_size) for x in range(0, width, tile_size)]
+
+    if layout is not None:
+        offsets = layout["offsets"]
+        chave = {
+            (x, y): int(offsets[segmentos_da_janela(layout, y, min(y + tile_size, height), x, min(x + tile_size, width))].min())
+            for x, y in posicoes
+        }
+        posicoes.sort(key=lambda p: (chave[p], p[1], p[0]))
+
+    if chunk_size is None:
+        chunk_size = CHUNK_PADRAO
+        por_faixa = -(-width // tile_size)
+        faixas = -(-height // tile_size)
+        if layout is not None and halo is not None:
+            # Faixas seguidas por chunk, deixando ~2 chunks por worker para balancear a carga
+            chunk_size = por_faixa * max(1, faixas // (2 * num_workers))
+        elif layout is not None and layout["tipo"] == "strips":
+            # Uma faixa de tiles por chunk; faixas divididas só se houver menos faixas que workers
+            chunk_size = -(-por_faixa // max(1, -(-num_workers // faixas)))
+    return tile_size, posicoes, chunk_size
+
+# ==== AMPLIFICAÇÃO DE I/O ====
+# Bytes lidos por todos os tiles divididos pelos bytes de dados do arquivo
+def amplificacao_io(bytes_por_tile, bytes_dados):
+    return sum(bytes_por_tile.values()) / bytes_dados if bytes_dados else 0.0
+
+def salvar_relatorio_io(caminho, bytes_por_tile):
+    with open(caminho, "w") as f:
+        f.write("x,y,bytes_lidos\n")
+        for (x, y), n in sorted(bytes_por_tile.items(), key=lambda item: (item[0][1], item[0][0])):
+            f.write(f"{x},{y},{n}\n")
+
+# ==== AUTOAJUSTE: WORKERS E LOTES A PARTIR DO AQUECIMENTO ====
+# Uma amostra de tiles espalhada pela fila roda em série no processo principal, medindo
+# leitura e cálculo de cada tile. Daí saem:
+#   - o número de workers: núcleos / (1 - fração de espera por leitura), porque quem
+#     espera o disco libera o núcleo (no máximo SOBRESCRITA_MAXIMA x núcleos), limitado
+#     pela memória disponível;
+#   - o custo previsto de cada tile: a fração de pixels candidatos da visão geral barata
+#     (estimativa_amostral.visao_geral) vira custo por pixel numa reta ajustada aos tiles
+#     medidos, vezes a área do tile (tiles da borda são menores);
+#   - lotes guiados: os tiles mais caros primeiro e cada lote com uma fração do custo que
+#     ainda falta, então o começo vai em lotes grandes e a cauda em lotes pequenos.
+
+AMOSTRA_AUTOAJUSTE = 2         # tiles de aquecimento por núcleo
+AMOSTRA_MINIMA = 8
+FRACAO_AMOSTRA_MAXIMA = 0.1    # o aquecimento (em série) nunca passa de 10% dos tiles
+TILES_MINIMOS_AUTOAJUSTE = 2   # abaixo de 2 tiles por núcleo não há o que ajustar
+SOBRESCRITA_MAXIMA = 2         # workers por núcleo quando a leitura domina
+FRACAO_MEMORIA = 0.5           # fração da memória disponível que os workers podem usar
+MEMORIA_POR_TILE = 12          # pico de um worker em múltiplos dos bytes do tile (resize 2x, máscaras, rótulos)
+MEMORIA_BASE_PROCESSO = 100 * 1024**2  # interpretador + OpenCV de cada processo
+LOTES_POR_WORKER = 2           # cada lote leva 1 / (LOTES_POR_WORKER * workers) do custo restante
+CUSTO_MINIMO_LOTE = 0.02       # segundos: abaixo disso a ida e volta ao worker pesa mais que o lote
+
+# Memória disponível em bytes (MemAvailable no Linux); None quando não dá para saber
+def memoria_disponivel():
+    try:
+        with open("/proc/meminfo") as f:
+            for linha in f:
+                if linha.startswith("MemAvailable:"):
+                    return int(linha.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None  # Windows: sem limite por memória
+
+# Núcleos que este processo pode usar (afinidade/cgroup no Linux, senão todos)
+def nucleos_disponiveis():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+# Índices da amostra de aquecimento, espalhados pela fila; vazia quando não vale autoajustar
+def indices_amostra(n_tiles, n_cpus):
+    if n_tiles < TILES_MINIMOS_AUTOAJUSTE * n_cpus:
+        return []
+    n = min(int(FRACAO_AMOSTRA_MAXIMA * n_tiles), max(AMOSTRA_MINIMA, AMOSTRA_AUTOAJUSTE * n_cpus))
+    if n == 0:
+        return []
+    return sorted({int(i) for i in np.linspace(0, n_tiles - 1, n)})
+
+# leitura/calculo: segundos somados na amostra; bytes_tile: bytes de um tile inteiro
+# Retorna (workers, descrição do limite aplicado)
+def escolher_workers(leitura, calculo, bytes_tile, n_tiles, n_cpus, processos=True):
+    espera = leitura / (leitura + calculo) if leitura + calculo > 0 else 0.0
+    workers = min(SOBRESCRITA_MAXIMA * n_cpus, max(1, round(n_cpus / max(1.0 - espera, 1e-6))))
+    limite = f"{n_cpus} núcleos, {espera:.0%} de leitura"
+
+    disponivel = memoria_disponivel()
+    if disponivel is not None:
+        por_worker = MEMORIA_POR_TILE * bytes_tile + (MEMORIA_BASE_PROCESSO if processos else 0)
+        cabem = max(1, int(FRACAO_MEMORIA * disponivel // por_worker))
+        if cabem < workers:
+            workers = cabem
+            limite += f", memória para {cabem}"
+    return max(1, min(workers, n_tiles)), limite
+
+def _area(posicao, tile_size, height, width):
+    x, y = posicao
+    return (min(x + tile_size, width) - x) * (min(y + tile_size, height) - y)
+
+# notas: {(x, y): fração de candidatos} de todos os tiles (previstos e medidos)
+# custos_amostra: {(x, y): segundos} dos tiles medidos
+# Custo por pixel = base + inclinação x fração de candidatos, por mínimos quadrados na
+# amostra e limitado à faixa medida (sem extrapolar para fora dela)
+def prever_custos(posicoes, notas, custos_amostra, tile_size, height, width):
+    medidos = list(custos_amostra)
+    if not medidos:
+        return {p: float(_area(p, tile_size, height, width)) for p in posicoes}
+    x = np.array([notas[p] for p in medidos])
+    y = np.array([custos_amostra[p] / _area(p, tile_size, height, width) for p in medidos])
+    if len(medidos) > 1 and np.ptp(x) > 0:
+        inclinacao, base = np.polyfit(x, y, 1)
+    else:
+        inclinacao, base = 0.0, y.mean()
+    return {p: float(np.clip(base + inclinacao * notas[p], y.min(), y.max())) * _area(p, tile_size, height, width)
+            for p in posicoes}
+
+# Retorna a lista de lotes (listas de posições), os mais caros primeiro
+def lotes_guiados(posicoes, custos, num_workers):
+    fila = sorted(posicoes, key=lambda p: -custos[p])
+    restante = sum(custos[p] for p in fila)
+    lotes = []
+    lote = []
+    custo_lote = 0.0
+    alvo = max(CUSTO_MINIMO_LOTE, restante / (LOTES_POR_WORKER * num_workers))
+    for p in fila:
+        lote.append(p)
+        custo_lote += custos[p]
+        if custo_lote >= alvo:
+            lotes.append(lote)
+            restante -= custo_lote
+            lote = []
+            custo_lote = 0.0
+            alvo = max(CUSTO_MINIMO_LOTE, restante / (LOTES_POR_WORKER * num_workers))
+    if lote:
+        lotes.append(lote)
+    return lotes
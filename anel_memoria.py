@@ -0,0 +1,76 @@
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, wait, as_completed, FIRST_COMPLETED
+from multiprocessing import shared_memory
+
+# ==== ANEL DE BUFFERS EM MEMÓRIA COMPARTILHADA ====
+# O processo principal lê/decodifica cada item (tile ou imagem) direto num slot de
+# memória compartilhada e manda ao worker só o handle (nome do slot, shape, dtype).
+# Nenhum array passa pelo pickle nem pelo pipe. O número de slots limita a memória:
+# quando todos estão ocupados o principal espera um worker terminar (back-pressure).
+
+SLOTS_POR_WORKER = 2
+
+# ==== LADO DO WORKER ====
+_slots_abertos = {}  # índice do slot -> SharedMemory aberto neste processo
+
+def _abrir_slot(indice, nome):
+    memoria = _slots_abertos.get(indice)
+    if memoria is None or memoria.name != nome:
+        if memoria is not None:
+            memoria.close()  # o principal trocou o slot por um maior
+        memoria = shared_memory.SharedMemory(name=nome)
+        _slots_abertos[indice] = memoria
+    return memoria
+
+def _executar(funcao, indice, nome, shape, dtype, meta):
+    memoria = _abrir_slot(indice, nome)
+    dados = np.ndarray(shape, dtype=np.dtype(dtype), buffer=memoria.buf)
+    try:
+        return indice, funcao(dados, meta)
+    finally:
+        del dados  # o buffer não pode ficar exportado quando o slot for fechado
+
+# ==== LADO DO PROCESSO PRINCIPAL ====
+def _novo_slot(n_bytes):
+    return shared_memory.SharedMemory(create=True, size=max(int(n_bytes), 1))
+
+def _liberar_slots(slots):
+    for memoria in slots:
+        if memoria is not None:
+            memoria.close()
+            memoria.unlink()
+
+# produtor: iterável de (preencher, shape, dtype, meta). preencher(destino) escreve o
+# item no array destino (ex.: np.copyto do memmap, page.asarray(out=destino)).
+# funcao(dados, meta) roda no worker e devolve o resultado (sem referências a `dados`).
+# Gera os resultados na ordem em que ficam prontos.
+def processar_em_anel(produtor, funcao, num_workers, n_slots=None, bytes_slot=0, initializer=None, initargs=()):
+    n_slots = num_workers * SLOTS_POR_WORKER if n_slots is None else n_slots
+    slots = [_novo_slot(bytes_slot) if bytes_slot else None for _ in range(n_slots)]
+    livres = list(range(n_slots))
+    pendentes = set()
+
+    try:
+        with ProcessPoolExecutor(max_workers=num_workers, initializer=initializer, initargs=initargs) as executor:
+            for preencher, shape, dtype, meta in produtor:
+                while not livres:
+                    prontos, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+                    for futuro in prontos:
+                        indice, resultado = futuro.result()
+                        livres.append(indice)
+                        yield resultado
+
+                indice = livres.pop()
+                n_bytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+                if slots[indice] is None or slots[indice].size < n_bytes:
+                    _liberar_slots([slots[indice]])
+                    slots[indice] = _novo_slot(n_bytes)
+                destino = np.ndarray(shape, dtype=dtype, buffer=slots[indice].buf)
+                preencher(destino)
+                del destino
+                pendentes.add(executor.submit(_executar, funcao, indice, slots[indice].name, shape, np.dtype(dtype).str, meta))
+
+            for futuro in as_completed(pendentes):
+                yield futuro.result()[1]
+    finally:
+        _liberar_slots(slots)
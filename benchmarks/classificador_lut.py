@@ -0,0 +1,74 @@
+import numpy as np
+import time
+import os
+import sys
+import glob
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import motor_deteccao
+from comparar_subpixel import carregar_cena_rgb
+
+# ==== CONFIGURAÇÕES ====
+TILE_SIZE = 1024
+REPETICOES = 5
+# (kernel, parâmetros): a máscara de cada um é medida com o classificador direto e com a tabela
+CASOS = [
+    ("rgb", {"zoom": 1, "abrir": False}),  # só a regra de cor, sem resize nem abertura
+    ("rgb", {}),
+    ("hsv", {"ordem": "RGB"}),
+    ("vermelho_v1", {"ordem": "RGB"}),
+]
+
+# ==== MEDE UM CLASSIFICADOR EM TODOS OS TILES (melhor de REPETICOES) ====
+def medir(tiles, kernel, params, classificador):
+    melhor = float("inf")
+    mascaras = []
+    for _ in range(REPETICOES):
+        t0 = time.perf_counter()
+        mascaras = [motor_deteccao.calcular_mascara(t, kernel, classificador=classificador, **params) for t in tiles]
+        melhor = min(melhor, time.perf_counter() - t0)
+    return melhor, mascaras
+
+def tiles_da_cena(img, tile_size=TILE_SIZE):
+    height, width = img.shape[:2]
+    return [img[y:min(y+tile_size, height), x:min(x+tile_size, width)]
+            for y in range(0, height, tile_size) for x in range(0, width, tile_size)]
+
+# ==== EXECUÇÃO ====
+# Uso: python benchmarks/classificador_lut.py [cenas...]   (padrão: img/*)
+# Compara o tempo da máscara pelo caminho direto e pela tabela e exige máscaras
+# idênticas bit a bit; um tile com todas as 2^24 cores cobre qualquer pixel possível.
+# Sai com código 1 se algum pixel divergir.
+if __name__ == "__main__":
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    cenas = sys.argv[1:] or sorted(glob.glob(os.path.join(raiz, "img", "*")))
+    tiles = [t for c in cenas for t in tiles_da_cena(carregar_cena_rgb(c))]
+    print(f"🖼️ {len(cenas)} cenas, {len(tiles)} tiles de até {TILE_SIZE}px")
+
+    todas = motor_deteccao.classificador_lut.todas_as_cores()
+    divergencias = 0
+    for kernel, params in CASOS:
+        t0 = time.perf_counter()
+        motor_deteccao.calcular_mascara(todas[:1, :1], kernel, classificador="lut", **params)
+        compilacao = time.perf_counter() - t0
+
+        tempo_direto, direto = medir(tiles, kernel, params, "direto")
+        tempo_lut, lut = medir(tiles, kernel, params, "lut")
+        diferentes = sum(int(np.count_nonzero(a != b)) for a, b in zip(direto, lut))
+        if motor_deteccao.parametros_kernel(kernel, **params)["zoom"] == 1:
+            # Sem resize a máscara da imagem de todas as cores é a própria tabela conferida
+            diferentes += int(np.count_nonzero(
+                motor_deteccao.calcular_mascara(todas, kernel, **params)
+                != motor_deteccao.calcular_mascara(todas, kernel, classificador="lut", **params)
+            ))
+        divergencias += diferentes
+
+        n = len(tiles)
+        print(f"🎨 {kernel} {params}: direto {1000 * tempo_direto / n:.2f} ms/tile | "
+              f"tabela {1000 * tempo_lut / n:.2f} ms/tile ({tempo_direto / tempo_lut:.2f}x) | "
+              f"compilação {compilacao:.2f}s | pixels divergentes: {diferentes}")
+
+    if divergencias:
+        print(f"❌ {divergencias} pixels diferentes entre o classificador direto e a tabela.")
+        sys.exit(1)
+    print("✅ Tabela idêntica ao classificador direto.")
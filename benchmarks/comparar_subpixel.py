@@ -0,0 +1,124 @@
+import numpy as np
+import tifffile as tiff
+import cv2
+import time
+import os
+import sys
+import glob
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import motor_deteccao
+
+# ==== CONFIGURAÇÕES ====
+TOLERANCIA_PX = 1.5   # distância máxima aceita entre o centro sub-pixel e o centro do caminho com zoom
+TAXA_MINIMA_PARES = 0.8  # fração mínima dos focos de cada caminho que precisa ter par
+TILE_SIZE = 1024
+
+# ==== LEITURA DA CENA EM RGB (mesma ordem de canais do memmap TIFF) ====
+def carregar_cena_rgb(caminho):
+    ext = os.path.splitext(caminho)[1].lower()
+    if ext in [".tif", ".tiff"]:
+        img = tiff.imread(caminho)
+    else:
+        img = cv2.imread(caminho, cv2.IMREAD_COLOR)
+        if img is None:
+            raise FileNotFoundError(f"Imagem não encontrada: {caminho}")
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    if img.ndim == 2:
+        img = cv2.cvtColor(img, cv2.COLOR_GRAY2RGB)
+    return np.ascontiguousarray(img[:, :, :3])
+
+# ==== PAREAMENTO DOS CENTROS DOS DOIS CAMINHOS ====
+def parear_centros(referencia, candidatos, tolerancia):
+    ref = np.asarray(referencia, dtype=np.float64).reshape(-1, 2)
+    cand = np.asarray(candidatos, dtype=np.float64).reshape(-1, 2)
+    if len(ref) == 0 or len(cand) == 0:
+        return [], len(ref), len(cand)
+
+    dist = np.linalg.norm(ref[:, None, :] - cand[None, :, :], axis=2)
+    distancias = []
+    usados = set()
+    # pareamento guloso pelo par mais próximo
+    for i, j in zip(*np.unravel_index(np.argsort(dist, axis=None), dist.shape)):
+        if dist[i, j] > tolerancia:
+            break
+        if i in usados or ("c", j) in usados:
+            continue
+        usados.add(i)
+        usados.add(("c", j))
+        distancias.append(dist[i, j])
+    return distancias, len(ref) - len(distancias), len(cand) - len(distancias)
+
+# ==== COMPARA OS CAMINHOS TILE A TILE EM UMA CENA ====
+def comparar_cena(caminho, tile_size=TILE_SIZE, tolerancia=TOLERANCIA_PX):
+    img = carregar_cena_rgb(caminho)
+    height, width = img.shape[:2]
+
+    tempo_zoom = 0.0
+    tempo_subpixel = 0.0
+    n_tiles = 0
+    distancias = []
+    sem_par_zoom = 0
+    sem_par_subpixel = 0
+
+    for y in range(0, height, tile_size):
+        for x in range(0, width, tile_size):
+            tile = img[y:min(y+tile_size, height), x:min(x+tile_size, width)]
+
+            t0 = time.perf_counter()
+            focos_zoom = motor_deteccao.detectar(tile, "rgb", ordem="RGB")
+            t1 = time.perf_counter()
+            focos_subpixel = motor_deteccao.detectar(tile, "rgb_subpixel", ordem="RGB")
+            t2 = time.perf_counter()
+            centros_zoom = [(f["x"], f["y"]) for f in focos_zoom]
+            centros_subpixel = [(f["x"], f["y"]) for f in focos_subpixel]
+
+            tempo_zoom += t1 - t0
+            tempo_subpixel += t2 - t1
+            n_tiles += 1
+
+            d, sz, ss = parear_centros(centros_zoom, centros_subpixel, tolerancia)
+            distancias.extend(d)
+            sem_par_zoom += sz
+            sem_par_subpixel += ss
+
+    return {
+        "cena": os.path.basename(caminho),
+        "tiles": n_tiles,
+        "ms_tile_zoom": 1000 * tempo_zoom / max(n_tiles, 1),
+        "ms_tile_subpixel": 1000 * tempo_subpixel / max(n_tiles, 1),
+        "pares": len(distancias),
+        "dist_media": float(np.mean(distancias)) if distancias else 0.0,
+        "dist_max": float(np.max(distancias)) if distancias else 0.0,
+        "sem_par_zoom": sem_par_zoom,
+        "sem_par_subpixel": sem_par_subpixel,
+    }
+
+# ==== EXECUÇÃO ====
+# Uso: python benchmarks/comparar_subpixel.py [cenas...]   (padrão: img/*)
+# Os dois caminhos não são idênticos (o resize cúbico cria e funde manchas pequenas),
+# então a regressão exige que a maioria dos focos tenha par dentro da tolerância.
+# Sai com código 1 se a taxa de pareamento somada das cenas ficar abaixo do mínimo.
+if __name__ == "__main__":
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    cenas = sys.argv[1:] or sorted(glob.glob(os.path.join(raiz, "img", "*")))
+
+    pares = focos_zoom = focos_subpixel = 0
+    for caminho in cenas:
+        r = comparar_cena(caminho)
+        ganho = r["ms_tile_zoom"] / r["ms_tile_subpixel"] if r["ms_tile_subpixel"] > 0 else float("inf")
+        print(f"🖼️ {r['cena']}: {r['tiles']} tiles | zoom {r['ms_tile_zoom']:.2f} ms/tile | "
+              f"sub-pixel {r['ms_tile_subpixel']:.2f} ms/tile ({ganho:.1f}x) | "
+              f"{r['pares']} pares, dist média {r['dist_media']:.2f}px, máx {r['dist_max']:.2f}px | "
+              f"sem par: zoom {r['sem_par_zoom']}, sub-pixel {r['sem_par_subpixel']}")
+        pares += r["pares"]
+        focos_zoom += r["pares"] + r["sem_par_zoom"]
+        focos_subpixel += r["pares"] + r["sem_par_subpixel"]
+
+    taxa_zoom = pares / focos_zoom if focos_zoom else 1.0
+    taxa_subpixel = pares / focos_subpixel if focos_subpixel else 1.0
+    print(f"📊 Pareados dentro de {TOLERANCIA_PX}px: {taxa_zoom:.1%} dos focos com zoom, {taxa_subpixel:.1%} dos sub-pixel")
+    if min(taxa_zoom, taxa_subpixel) < TAXA_MINIMA_PARES:
+        print(f"❌ Taxa de pareamento abaixo de {TAXA_MINIMA_PARES:.0%}.")
+        sys.exit(1)
+    print("✅ Caminho sub-pixel compatível com o caminho com zoom.")
@@ -0,0 +1,195 @@
+import tifffile as tiff
+import cv2
+import csv
+import json
+import time
+import os
+import sys
+import resource
+import subprocess
+import importlib.util
+import itertools
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, "conversor_das_imagens"))
+import imagem_grande
+
+# ==== CONFIGURAÇÕES ====
+# Cenas sintéticas: (largura, altura, focos por megapixel). O fundo não tem fogo e os
+# focos ficam em posições conhecidas (gabarito de imagem_grande.py), com a mesma semente.
+CENAS = [
+    (4096, 4096, 2),
+    (8192, 8192, 2),
+    (8192, 8192, 20),
+]
+SEMENTE = 0
+TILES = [512, 1024, 2048]
+WORKERS = [1, 2, 4]
+CHUNKS = [None, 10]           # None: chunk escolhido pelo agendador (só o paralelo 2.0 aceita)
+CHUNK_V1 = 10                 # version 1.0/detectorparalelo exige um inteiro
+EXECUTORES = ("sequencial", "paralelo", "v1_paralelo", "fire_detector")
+
+PASTA_CENAS = os.path.join(RAIZ, "benchmarks", "cenas")
+ARQUIVO_RESULTADOS = os.path.join(RAIZ, "benchmarks", "resultados", "executores.csv")
+CAMPOS = ("data", "commit", "executor", "cena", "largura", "altura", "focos_gabarito", "tile_size",
+          "workers", "chunk_size", "tempo_s", "tiles_s", "mb_s", "rss_principal_mb", "rss_filhos_mb", "deteccoes")
+
+# ==== CENAS SINTÉTICAS (geradas uma vez e reaproveitadas) ====
+# O TIFF é contíguo (memmap dos detectores); o fire_detector só lê JPG/PNG, então cada
+# cena ganha também uma cópia PNG numa pasta própria
+def preparar_cena(largura, altura, densidade, pasta=PASTA_CENAS):
+    nome = f"cena_{largura}x{altura}_d{densidade}"
+    caminho = os.path.join(pasta, nome + ".tif")
+    if not os.path.exists(caminho):
+        n_focos = int(densidade * largura * altura / 1e6)
+        imagem_grande.gerar_imagem_gigante(None, caminho, n_focos=n_focos, semente=SEMENTE, dimensoes=(largura, altura))
+
+    pasta_png = os.path.join(pasta, nome + "_png")
+    caminho_png = os.path.join(pasta_png, nome + ".png")
+    if not os.path.exists(caminho_png):
+        os.makedirs(pasta_png, exist_ok=True)
+        cv2.imwrite(caminho_png, cv2.cvtColor(tiff.imread(caminho), cv2.COLOR_RGB2BGR))
+
+    gabarito = imagem_grande.caminho_gabarito(caminho)
+    n_gabarito = len(imagem_grande.carregar_gabarito(gabarito)) if os.path.exists(gabarito) else 0
+    return {"nome": nome, "tif": caminho, "pasta_png": pasta_png, "largura": largura, "altura": altura,
+            "focos_gabarito": n_gabarito}
+
+# ==== CASOS DA GRADE ====
+# Cada executor só varia os eixos que ele tem
+def casos(cena):
+    for tile_size in TILES:
+        yield {"executor": "sequencial", "tile_size": tile_size, "workers": 1, "chunk_size": None}
+        for workers, chunk in itertools.product(WORKERS, CHUNKS):
+            yield {"executor": "paralelo", "tile_size": tile_size, "workers": workers, "chunk_size": chunk}
+        for workers in WORKERS:
+            yield {"executor": "v1_paralelo", "tile_size": tile_size, "workers": workers, "chunk_size": CHUNK_V1}
+    for workers in WORKERS:
+        # Uma imagem inteira por worker: não há tile nem chunk
+        yield {"executor": "fire_detector", "tile_size": None, "workers": workers, "chunk_size": None}
+
+def _carregar(caminho, nome):
+    spec = importlib.util.spec_from_file_location(nome, caminho)
+    modulo = importlib.util.module_from_spec(spec)
+    sys.modules[nome] = modulo
+    spec.loader.exec_module(modulo)
+    return modulo
+
+# ==== UM CASO, NO PROCESSO FILHO ====
+# Roda um executor numa pasta de trabalho temporária e devolve (tempo, detecções).
+# A saída é a lista de focos (sem overlay), para medir a detecção e não a gravação.
+def executar_caso(caso, cena, pasta_trabalho):
+    os.makedirs(pasta_trabalho, exist_ok=True)
+    os.chdir(pasta_trabalho)
+    saida = os.path.join(pasta_trabalho, "saida.tiff")
+    executor = caso["executor"]
+
+    t0 = time.perf_counter()
+    if executor == "sequencial":
+        modulo = _carregar(os.path.join(RAIZ, "detectorsequencial.py"), "detectorsequencial")
+        _, deteccoes = modulo.process_large_image_sequential(
+            cena["tif"], tile_size=caso["tile_size"], output_path=saida, output_mode="deteccoes")
+    elif executor == "paralelo":
+        modulo = _carregar(os.path.join(RAIZ, "detectorparalelo2.0.py"), "detectorparalelo2")
+        _, deteccoes = modulo.process_large_image_parallel(
+            cena["tif"], tile_size=caso["tile_size"], output_path=saida, num_threads=caso["workers"],
+            chunk_size=caso["chunk_size"], output_mode="deteccoes")
+    elif executor == "v1_paralelo":
+        modulo = _carregar(os.path.join(RAIZ, "version 1.0", "detectorparalelo.py"), "detectorparalelo_v1")
+        _, deteccoes = modulo.process_large_image_parallel(
+            cena["tif"], tile_size=caso["tile_size"], output_path=saida, num_threads=caso["workers"],
+            chunk_size=caso["chunk_size"], salvar_overlay=False)
+    elif executor == "fire_detector":
+        modulo = _carregar(os.path.join(RAIZ, "fire_detector", "main.py"), "fire_detector_main")
+        modulo.PASTA_IMAGENS = cena["pasta_png"]
+        deteccoes = modulo.main(num_workers=caso["workers"])  # pixels vermelhos, não focos
+    else:
+        raise ValueError(f"Executor desconhecido: {executor} (use um de {EXECUTORES})")
+    return time.perf_counter() - t0, deteccoes
+
+# Pico de memória residente (MB) deste processo e do maior filho já encerrado (Linux: KB)
+def pico_rss_mb():
+    proprio = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    filhos = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return proprio, filhos
+
+# ==== UM CASO EM UM PROCESSO NOVO ====
+# Cada medição roda em um interpretador próprio: o pico de RSS não herda as execuções
+# anteriores e os caches (arquivo, OpenCV) não passam de um caso para o outro
+def medir_caso(caso, cena, pasta_trabalho):
+    comando = [sys.executable, os.path.abspath(__file__), "--caso", json.dumps(caso), json.dumps(cena), pasta_trabalho]
+    processo = subprocess.run(comando, capture_output=True, text=True)
+    linhas = [l for l in processo.stdout.splitlines() if l.startswith("{")]
+    if processo.returncode != 0 or not linhas:
+        raise RuntimeError(f"Falha em {caso}: {processo.stderr.strip()[-2000:]}")
+    return json.loads(linhas[-1])
+
+def _commit():
+    try:
+        return subprocess.run(["git", "-C", RAIZ, "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+def linha_resultado(caso, cena, medida, commit):
+    tempo = medida["tempo_s"]
+    if caso["tile_size"] is None:
+        unidades = 1
+    else:
+        unidades = -(-cena["altura"] // caso["tile_size"]) * -(-cena["largura"] // caso["tile_size"])
+    megabytes = cena["largura"] * cena["altura"] * 3 / 1e6
+    return {
+        "data": time.strftime("%Y-%m-%d %H:%M:%S"), "commit": commit, "executor": caso["executor"],
+        "cena": cena["nome"], "largura": cena["largura"], "altura": cena["altura"],
+        "focos_gabarito": cena["focos_gabarito"], "tile_size": caso["tile_size"], "workers": caso["workers"],
+        "chunk_size": caso["chunk_size"], "tempo_s": f"{tempo:.3f}",
+        "tiles_s": f"{unidades / tempo:.1f}" if tempo > 0 else "", "mb_s": f"{megabytes / tempo:.1f}" if tempo > 0 else "",
+        "rss_principal_mb": f"{medida['rss_principal_mb']:.0f}", "rss_filhos_mb": f"{medida['rss_filhos_mb']:.0f}",
+        "deteccoes": medida["deteccoes"],
+    }
+
+def salvar_linha(linha, caminho=ARQUIVO_RESULTADOS):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    novo = not os.path.exists(caminho)
+    with open(caminho, "a", newline="") as f:
+        escritor = csv.DictWriter(f, fieldnames=CAMPOS)
+        if novo:
+            escritor.writeheader()
+        escritor.writerow(linha)
+
+# ==== EXECUÇÃO ====
+# Uso: python benchmarks/executores.py [executores...]   (padrão: todos)
+# Gera as cenas de CENAS (uma vez), roda a grade de tiles/workers/chunks de cada executor,
+# cada caso num processo novo, e anexa uma linha por caso a ARQUIVO_RESULTADOS (com o
+# commit, para comparar execuções e achar regressões).
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--caso"]:
+        caso, cena, pasta_trabalho = json.loads(sys.argv[2]), json.loads(sys.argv[3]), sys.argv[4]
+        tempo, deteccoes = executar_caso(caso, cena, pasta_trabalho)
+        proprio, filhos = pico_rss_mb()
+        print(json.dumps({"tempo_s": tempo, "deteccoes": int(deteccoes),
+                          "rss_principal_mb": proprio, "rss_filhos_mb": filhos}))
+        sys.exit(0)
+
+    executores = sys.argv[1:] or list(EXECUTORES)
+    desconhecidos = set(executores) - set(EXECUTORES)
+    if desconhecidos:
+        print(f"❌ Executores desconhecidos: {sorted(desconhecidos)} (use {EXECUTORES})")
+        sys.exit(1)
+
+    commit = _commit()
+    pasta_trabalho = os.path.join(RAIZ, "benchmarks", "resultados", "trabalho")
+    for largura, altura, densidade in CENAS:
+        cena = preparar_cena(largura, altura, densidade)
+        print(f"🖼️ {cena['nome']}: {cena['focos_gabarito']} focos no gabarito")
+        for caso in casos(cena):
+            if caso["executor"] not in executores:
+                continue
+            linha = linha_resultado(caso, cena, medir_caso(caso, cena, pasta_trabalho), commit)
+            salvar_linha(linha)
+            print(f"⏱️ {caso['executor']:<13} tile {caso['tile_size']} | {caso['workers']} workers | "
+                  f"chunk {caso['chunk_size']} | {linha['tempo_s']}s | {linha['tiles_s']} tiles/s | "
+                  f"{linha['mb_s']} MB/s | RSS {linha['rss_principal_mb']}/{linha['rss_filhos_mb']} MB | "
+                  f"{linha['deteccoes']} detecções")
+    print(f"📄 Resultados em: {ARQUIVO_RESULTADOS}")
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import numpy as np
+
+# ==== CACHE DE RESULTADOS POR CONTEÚDO DO TILE ====
+# Em disco, uma entrada por arquivo: pasta/ab/abcdef....pkl. A chave é o hash dos pixels
+# do tile (bytes, shape e dtype) junto com o contexto da detecção (kernel e parâmetros:
+# zoom, área mínima, limiares...). Regiões que não mudaram entre execuções, ou que se
+# repetem em mosaicos sobrepostos, custam só o hash.
+# Vários processos e threads podem ler e gravar ao mesmo tempo: cada entrada é escrita
+# num temporário e renomeada. O acesso atualiza a data do arquivo e a poda apaga as
+# entradas mais antigas até o total caber no limite (LRU).
+
+LIMITE_PADRAO_BYTES = 2 * 1024**3
+EXTENSAO = ".pkl"
+
+def _serializavel(v):
+    if isinstance(v, np.ndarray):
+        return v.tolist()
+    if isinstance(v, np.generic):
+        return v.item()
+    return str(v)
+
+# ==== CHAVES ====
+# Contexto: tudo que, além dos pixels, muda o resultado (kernel, parâmetros, prefiltro...)
+def contexto_deteccao(*partes):
+    texto = json.dumps(partes, sort_keys=True, default=_serializavel)
+    return hashlib.blake2b(texto.encode(), digest_size=16).hexdigest()
+
+def chave_tile(tile, contexto):
+    h = hashlib.blake2b(digest_size=20)
+    h.update(contexto.encode())
+    h.update(f"{tile.shape}{tile.dtype.str}".encode())
+    h.update(memoryview(np.ascontiguousarray(tile)).cast("B"))
+    return h.hexdigest()
+
+# ==== ABERTURA ====
+# O cache é um dict serializável (vai para os workers): só a pasta e o limite
+def abrir_cache(pasta, limite_bytes=LIMITE_PADRAO_BYTES):
+    os.makedirs(pasta, exist_ok=True)
+    return {"pasta": pasta, "limite_bytes": limite_bytes}
+
+def _caminho(cache, chave):
+    return os.path.join(cache["pasta"], chave[:2], chave + EXTENSAO)
+
+# ==== CONSULTA E GRAVAÇÃO ====
+# Retorna (True, valor) num acerto e (False, None) numa falta
+def consultar(cache, chave):
+    caminho = _caminho(cache, chave)
+    try:
+        with open(caminho, "rb") as f:
+            valor = pickle.load(f)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        return False, None
+    try:
+        os.utime(caminho)  # mais recente para a poda LRU
+    except FileNotFoundError:
+        pass  # podada por outro processo depois da leitura
+    return True, valor
+
+def guardar(cache, chave, valor):
+    caminho = _caminho(cache, chave)
+    pasta = os.path.dirname(caminho)
+    os.makedirs(pasta, exist_ok=True)
+    fd, temporario = tempfile.mkstemp(dir=pasta, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(valor, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporario, caminho)
+    except BaseException:
+        os.remove(temporario)
+        raise
+
+# Consulta e, na falta, calcula com calcular() e grava. Retorna (valor, acerto).
+def obter(cache, chave, calcular):
+    acerto, valor = consultar(cache, chave)
+    if not acerto:
+        valor = calcular()
+        guardar(cache, chave, valor)
+    return valor, acerto
+
+# ==== PODA LRU ====
+# Apaga as entradas acessadas há mais tempo até o total ficar no limite.
+# Roda no processo principal (início/fim da execução), não a cada gravação.
+def podar_cache(cache):
+    entradas = []
+    total = 0
+    for raiz, _, arquivos in os.walk(cache["pasta"]):
+        for nome in arquivos:
+            caminho = os.path.join(raiz, nome)
+            try:
+                info = os.stat(caminho)
+            except FileNotFoundError:
+                continue
+            entradas.append((info.st_mtime_ns, info.st_size, caminho))
+            total += info.st_size
+
+    removidas = 0
+    entradas.sort()
+    for _, tamanho, caminho in entradas:
+        if total <= cache["limite_bytes"]:
+            break
+        try:
+            os.remove(caminho)
+        except FileNotFoundError:
+            pass
+        total -= tamanho
+        removidas += 1
+    return removidas, total
+
+# ==== RESUMO ====
+def resumo_acertos(acertos, consultas):
+    taxa = acertos / consultas if consultas else 0.0
+    return f"{acertos}/{consultas} tiles do cache ({taxa:.1%})"
@@ -0,0 +1,76 @@
+import sys
+import threading
+import numpy as np
+import cv2
+
+# ==== CLASSIFICADOR POR TABELA DE CORES ====
+# As regras de cor dos kernels (limiar R/G/B, faixas HSV sem blur, dominância do
+# vermelho) olham só os 3 bytes de cada pixel. Cada regra é avaliada uma única vez
+# sobre uma imagem com as 2^24 cores possíveis e vira uma tabela de 16 MB; depois a
+# máscara de um tile sai de uma única consulta por pixel, sem converter para HSV e
+# sem arrays booleanos intermediários.
+# A tabela é montada rodando a própria função da regra, então o resultado é idêntico
+# bit a bit ao caminho direto para qualquer ordem de canais e qualquer limiar.
+
+LADO_TABELA = 4096  # 4096 x 4096 = 2^24 cores
+
+_tabelas = {}
+_lock = threading.Lock()
+_buffers = threading.local()
+
+def _congelar(valor):
+    # Limiares em np.array viram tuplas para servir de chave do cache
+    if isinstance(valor, np.ndarray):
+        return ("array", valor.dtype.str, tuple(valor.tolist()))
+    return valor
+
+# ==== IMAGEM COM TODAS AS CORES ====
+# O pixel de índice i tem bytes (i & 0xFF, (i >> 8) & 0xFF, i >> 16) nos canais 0, 1, 2,
+# a mesma composição que aplicar_tabela faz com os bytes do tile
+def todas_as_cores():
+    indice = np.arange(1 << 24, dtype=np.uint32).reshape(LADO_TABELA, LADO_TABELA)
+    cores = np.empty((LADO_TABELA, LADO_TABELA, 3), dtype=np.uint8)
+    cores[:, :, 0] = indice & 0xFF
+    cores[:, :, 1] = (indice >> 8) & 0xFF
+    cores[:, :, 2] = indice >> 16
+    return cores
+
+# ==== COMPILAÇÃO DA REGRA (uma vez por processo e por conjunto de parâmetros) ====
+# regra(tile, *args) -> máscara uint8 (0/255) do mesmo tamanho do tile
+def compilar_tabela(regra, *args):
+    chave = (regra, tuple(_congelar(a) for a in args))
+    tabela = _tabelas.get(chave)
+    if tabela is None:
+        with _lock:
+            tabela = _tabelas.get(chave)
+            if tabela is None:
+                tabela = np.ascontiguousarray(regra(todas_as_cores(), *args)).ravel()
+                _tabelas[chave] = tabela
+    return tabela
+
+def limpar_cache():
+    _tabelas.clear()
+
+# ==== APLICAÇÃO ====
+# Em little-endian o BGRA visto como uint32 já é canal0 | canal1<<8 | canal2<<16 | alfa<<24;
+# o buffer BGRA é reaproveitado por thread entre tiles do mesmo tamanho
+def _indices(tile):
+    h, w = tile.shape[:2]
+    if sys.byteorder != "little":
+        t = tile.astype(np.uint32)
+        return t[:, :, 0] | (t[:, :, 1] << 8) | (t[:, :, 2] << 16)
+
+    bgra = getattr(_buffers, "bgra", None)
+    if bgra is None or bgra.shape[:2] != (h, w):
+        bgra = np.empty((h, w, 4), dtype=np.uint8)
+        _buffers.bgra = bgra
+    cv2.cvtColor(tile, cv2.COLOR_BGR2BGRA, dst=bgra)  # só acrescenta o 4º byte, não troca canais
+    indices = bgra.view(np.uint32).reshape(h, w)
+    indices &= 0xFFFFFF
+    return indices
+
+def aplicar_tabela(tile, tabela):
+    return np.take(tabela, _indices(tile))
+
+def classificar(tile, regra, *args):
+    return aplicar_tabela(tile, compilar_tabela(regra, *args))
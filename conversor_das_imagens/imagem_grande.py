@@ -4,13 +4,19 @@ import tifffile
 import math
 import os
 
-def gerar_imagem_gigante(caminho_imagem, caminho_saida, target_gb=20):
-    target_bytes = target_gb * 1024**3
+# ==== CONFIGURAÇÕES ====
+FAIXA_LINHAS = 256           # linhas escritas por vez no BigTIFF sem compressão
+TILE_PADRAO = 512            # tile interno usado quando há compressão e nenhum tile foi pedido
+COR_FOCO_RGB = (230, 40, 30) # passa nos kernels rgb, hsv e vermelho_v1 do motor_deteccao
+RAIO_FOCO = (2, 6)           # raio mínimo e máximo dos focos sintéticos (px)
+ESPACAMENTO_FOCOS = 64       # um foco no máximo por célula: focos nunca se tocam
 
+# ==== IMAGEM BASE REPLICADA ====
+def carregar_base(caminho_imagem):
     # Abre imagem e converte para RGB apenas se necessário
     imagem = Image.open(caminho_imagem)
     print(f"🖼️ Modo original da imagem: {imagem.mode}")
-    
+
     if imagem.mode != "RGB":
         print("⚠️ Convertendo imagem para RGB (modo atual não é RGB)...")
         imagem = imagem.convert("RGB")
@@ -24,35 +30,150 @@ def gerar_imagem_gigante(caminho_imagem, caminho_saida, target_gb=20):
         if np.mean(r) < np.mean(b):
             print("⚠️ Atenção: imagem parece estar em BGR! Corrigindo para RGB...")
             tile_array = tile_array[..., ::-1]  # Inverte os canais (BGR → RGB)
+    return np.ascontiguousarray(tile_array)
+
+# Fundo sem nenhum pixel vermelho (tons de vegetação e solo), para que o gabarito
+# contenha todos os focos da imagem
+def base_sintetica(semente=0, tamanho=512):
+    rng = np.random.default_rng(semente)
+    base = np.empty((tamanho, tamanho, 3), dtype=np.uint8)
+    base[..., 0] = rng.integers(40, 110, (tamanho, tamanho))  # R
+    base[..., 1] = rng.integers(70, 150, (tamanho, tamanho))  # G
+    base[..., 2] = rng.integers(30, 90, (tamanho, tamanho))   # B
+    return base
+
+# Janela [y0:y1, x0:x1] da cena formada pela base repetida em grade
+def janela_replicada(base, y0, y1, x0, x1):
+    h, w = base.shape[:2]
+    return base[np.arange(y0, y1)[:, None] % h, np.arange(x0, x1)[None, :] % w]
+
+# ==== FOCOS SINTÉTICOS EM POSIÇÕES CONHECIDAS ====
+# Cada foco fica numa célula própria de ESPACAMENTO_FOCOS px, com margem para o raio.
+# Retorna um array (N, 3) int64 com x, y, raio, ordenado por y.
+def sortear_focos(n_focos, altura, largura, semente=0, raio=RAIO_FOCO, espacamento=ESPACAMENTO_FOCOS):
+    rng = np.random.default_rng(semente)
+    celulas_x = largura // espacamento
+    celulas_y = altura // espacamento
+    n_celulas = celulas_x * celulas_y
+    if n_focos > n_celulas:
+        raise ValueError(f"{n_focos} focos não cabem em {n_celulas} células de {espacamento}px")
+
+    celulas = rng.choice(n_celulas, size=n_focos, replace=False)
+    raios = rng.integers(raio[0], raio[1] + 1, n_focos)
+    margem = raios + 1
+    cy, cx = np.divmod(celulas, celulas_x)
+    x = cx * espacamento + margem + (rng.random(n_focos) * (espacamento - 2 * margem)).astype(np.int64)
+    y = cy * espacamento + margem + (rng.random(n_focos) * (espacamento - 2 * margem)).astype(np.int64)
+
+    focos = np.stack([x, y, raios], axis=1).astype(np.int64)
+    return focos[np.argsort(focos[:, 1], kind="stable")]
+
+# Desenha (discos cheios) os focos que tocam a janela; o resultado não depende do corte
+def desenhar_focos(janela, focos, y0, x0, cor=COR_FOCO_RGB):
+    if len(focos) == 0:
+        return janela
+    y1, x1 = y0 + janela.shape[0], x0 + janela.shape[1]
+    raio_max = int(focos[:, 2].max())
+    ini, fim = np.searchsorted(focos[:, 1], [y0 - raio_max, y1 + raio_max])
+    for fx, fy, r in focos[ini:fim]:
+        a0, a1 = max(y0, fy - r), min(y1, fy + r + 1)
+        b0, b1 = max(x0, fx - r), min(x1, fx + r + 1)
+        if a0 >= a1 or b0 >= b1:
+            continue
+        yy = np.arange(a0, a1)[:, None] - fy
+        xx = np.arange(b0, b1)[None, :] - fx
+        disco = yy * yy + xx * xx <= r * r
+        janela[a0 - y0:a1 - y0, b0 - x0:b1 - x0][disco] = cor
+    return janela
+
+def caminho_gabarito(caminho_saida):
+    return os.path.splitext(caminho_saida)[0] + "_gabarito.npy"
 
+def carregar_gabarito(caminho):
+    # (N, 3) int64: x, y, raio de cada foco sintético
+    return np.load(caminho)
+
+# ==== GERAÇÃO EM STREAMING ====
+# Sem compressão e sem tile: BigTIFF contíguo (memmap dos detectores), escrito por
+# faixas de linhas. Com tile e/ou compressão: tiles internos gerados um a um.
+# A memória usada é a de uma faixa ou um tile, nunca a da cena.
+def gerar_imagem_gigante(caminho_imagem, caminho_saida, target_gb=20, tile=None, compression=None,
+                         n_focos=0, semente=0, dimensoes=None):
+    # caminho_imagem: imagem replicada em grade; None usa um fundo sintético sem fogo
+    # tile: lado do tile interno do TIFF (múltiplo de 16); None grava em faixas
+    # compression: ex. "zlib", "lzw", "jpeg" (exige tile; usa TILE_PADRAO se não houver)
+    # n_focos: focos sintéticos sorteados com `semente`; o gabarito vai para *_gabarito.npy
+    # dimensoes: (largura, altura) explícitas em vez de target_gb
+    tile_array = base_sintetica(semente) if caminho_imagem is None else carregar_base(caminho_imagem)
     tile_h, tile_w, channels = tile_array.shape
     tile_bytes = tile_h * tile_w * channels
 
     print(f"Imagem original: {tile_w}x{tile_h}px, canais: {channels}, ~{tile_bytes / 1024**2:.2f} MB por cópia")
 
-    # Cálculo de quantas réplicas serão necessárias
-    tiles_needed = target_bytes / tile_bytes
-    n = math.sqrt(tiles_needed)
-    n_x = math.ceil(n)
-    n_y = math.ceil(tiles_needed / n_x)
+    if dimensoes is None:
+        target_bytes = target_gb * 1024**3
+
+        # Cálculo de quantas réplicas serão necessárias
+        tiles_needed = target_bytes / tile_bytes
+        n = math.sqrt(tiles_needed)
+        n_x = math.ceil(n)
+        n_y = math.ceil(tiles_needed / n_x)
+
+        print(f"Objetivo: ~{target_gb} GB → {tiles_needed:.2f} cópias → grade {n_x} x {n_y} = {n_x * n_y} cópias")
+        largura, altura = n_x * tile_w, n_y * tile_h
+    else:
+        largura, altura = dimensoes
+
+    print(f"Imagem final: {(altura, largura, channels)}, tamanho: {altura * largura * channels / 1024**3:.2f} GB")
 
-    print(f"Objetivo: ~{target_gb} GB → {tiles_needed:.2f} cópias → grade {n_x} x {n_y} = {n_x * n_y} cópias")
+    focos = sortear_focos(n_focos, altura, largura, semente) if n_focos else np.empty((0, 3), dtype=np.int64)
 
-    # Replicação da imagem
-    linha = np.concatenate([tile_array] * n_x, axis=1)
-    final_image = np.concatenate([linha] * n_y, axis=0)
+    output_dir = os.path.dirname(caminho_saida)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
 
-    tamanho_gb = final_image.nbytes / 1024**3
-    print(f"Imagem final: {final_image.shape}, tamanho na memória: {tamanho_gb:.2f} GB")
+    if compression is not None and tile is None:
+        tile = TILE_PADRAO
+        print(f"ℹ️ Compressão exige tiles internos: usando {tile}x{tile}")
+
+    if tile is None:
+        # ✅ BigTIFF contíguo, preservando os canais RGB, preenchido faixa a faixa
+        saida = tifffile.memmap(caminho_saida, shape=(altura, largura, channels), dtype=np.uint8,
+                                photometric="rgb", bigtiff=True)
+        for y in range(0, altura, FAIXA_LINHAS):
+            y1 = min(y + FAIXA_LINHAS, altura)
+            saida[y:y1] = desenhar_focos(janela_replicada(tile_array, y, y1, 0, largura), focos, y, 0)
+        saida.flush()
+        del saida
+    else:
+        def tiles():
+            for y in range(0, altura, tile):
+                for x in range(0, largura, tile):
+                    # tiles da borda completados com zero, como o tifffile espera
+                    bloco = np.zeros((tile, tile, channels), dtype=np.uint8)
+                    y1, x1 = min(y + tile, altura), min(x + tile, largura)
+                    bloco[:y1 - y, :x1 - x] = desenhar_focos(janela_replicada(tile_array, y, y1, x, x1), focos, y, x)
+                    yield bloco
+
+        tifffile.imwrite(caminho_saida, tiles(), shape=(altura, largura, channels), dtype=np.uint8,
+                         tile=(tile, tile), photometric="rgb", compression=compression, bigtiff=True)
 
-    # ✅ Salva como BigTIFF, preservando os canais RGB
-    tifffile.imwrite(caminho_saida, final_image, bigtiff=True)
     print(f"✅ Imagem gigante salva em: {caminho_saida}")
     print(f"📦 Tamanho do arquivo salvo: {os.path.getsize(caminho_saida) / 1024**3:.2f} GB")
 
+    if n_focos:
+        gabarito = caminho_gabarito(caminho_saida)
+        np.save(gabarito, focos)
+        print(f"🎯 Gabarito com {len(focos)} focos sintéticos salvo em: {gabarito}")
+    return focos
+
 if __name__ == "__main__":
     os.makedirs("img_gigantes", exist_ok=True)
     caminho_saida = os.path.join("img_gigantes", "imagem_gigante_20GB.tiff")
 
     # Altere para o caminho da imagem original com fogo visível
     gerar_imagem_gigante("./img/4.jpg", caminho_saida, target_gb=20)
+
+    # Fixture pequena com gabarito (fundo sem fogo + focos em posições conhecidas):
+    # gerar_imagem_gigante(None, "img_gigantes/fixture_1GB.tiff", target_gb=1, tile=512,
+    #                      compression="zlib", n_focos=5000, semente=42)
@@ -1,40 +1,128 @@
 import cv2
+import numpy as np
 import tifffile as tiff
 import os
+import sys
 
-def salvar_tile(imagem_path, x=0, y=0, tile_size=1024, nome_saida="tile_extraido.jpg"):
-    print(f"🖼️ Abrindo imagem: {imagem_path}")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import leitor_tiles
 
-    ext = os.path.splitext(imagem_path)[1].lower()
-    if ext in [".tif", ".tiff"]:
-        with tiff.TiffFile(imagem_path) as tif:
-            img = tif.asarray()
-    else:
-        img = cv2.imread(imagem_path, cv2.IMREAD_UNCHANGED)
-        if img is None:
-            raise FileNotFoundError("❌ Imagem não encontrada ou inválida.")
+# ==== CONFIGURAÇÕES DA VISÃO GERAL ====
+FATOR_VISAO_GERAL = 16     # redução do primeiro nível da pirâmide
+NIVEL_MINIMO = 256         # a pirâmide para quando o maior lado fica abaixo disso
+FAIXA_VISAO_GERAL = 16     # faixas de FAIXA_VISAO_GERAL * fator linhas lidas por vez
 
-    altura, largura = img.shape[:2]
-    print(f"📐 Dimensões da imagem: {largura}x{altura}")
+# ==== CONVERSÃO DO TILE PARA O cv2.imwrite ====
+def _tile_bgr(tile, ordem):
+    if tile.ndim == 2:
+        return cv2.cvtColor(tile, cv2.COLOR_GRAY2BGR)
+    if tile.shape[2] == 4:
+        tile = tile[:, :, :3]
+    # ✅ Corrigir cor RGB para BGR (JPG/PNG lidos pelo OpenCV já estão em BGR)
+    return cv2.cvtColor(tile, cv2.COLOR_RGB2BGR) if ordem == "RGB" else tile
 
-    tile = img[y:min(y+tile_size, altura), x:min(x+tile_size, largura)]
+def _dentro(x, y, largura, altura):
+    return 0 <= x < largura and 0 <= y < altura
 
-    if tile.ndim == 2:
-        tile = cv2.cvtColor(tile, cv2.COLOR_GRAY2BGR)
-    elif tile.shape[2] == 4:
-        tile = cv2.cvtColor(tile, cv2.COLOR_BGRA2BGR)
+# ==== UM TILE: LÊ SÓ A JANELA PEDIDA ====
+# leitor: leitor_tiles já aberto (reaproveitado no lote); None abre e fecha aqui
+def salvar_tile(imagem_path, x=0, y=0, tile_size=1024, nome_saida="tile_extraido.jpg", pasta_saida="tiles", leitor=None):
+    proprio = leitor is None
+    if proprio:
+        print(f"🖼️ Abrindo imagem: {imagem_path}")
+        leitor = leitor_tiles.abrir_leitor_local(imagem_path)
+    try:
+        altura, largura = leitor["shape"][:2]
+        if proprio:
+            print(f"📐 Dimensões da imagem: {largura}x{altura} (leitura: {leitor['modo']})")
+        if not _dentro(x, y, largura, altura):
+            raise ValueError(f"Origem do tile ({x}, {y}) fora da imagem {largura}x{altura}")
 
-    # ✅ Corrigir cor RGB para BGR
-    tile_bgr = cv2.cvtColor(tile, cv2.COLOR_RGB2BGR)
+        tile = leitor_tiles.ler_janela(leitor, y, min(y+tile_size, altura), x, min(x+tile_size, largura))
+        tile_bgr = _tile_bgr(np.asarray(tile), leitor["ordem"])
 
-    # 📁 Garante que a pasta "tiles" existe
-    pasta_saida = "tiles"
-    os.makedirs(pasta_saida, exist_ok=True)
+        # 📁 Garante que a pasta de saída existe
+        os.makedirs(pasta_saida, exist_ok=True)
 
-    caminho_saida = os.path.join(pasta_saida, nome_saida)
-    cv2.imwrite(caminho_saida, tile_bgr)
+        caminho_saida = os.path.join(pasta_saida, nome_saida)
+        cv2.imwrite(caminho_saida, tile_bgr)
+    finally:
+        if proprio:
+            leitor_tiles.fechar_leitor(leitor)
 
     print(f"✅ Tile salvo em: {caminho_saida}")
+    return caminho_saida
+
+# ==== VÁRIAS JANELAS EM UMA CHAMADA ====
+# janelas: lista de (x, y); o arquivo é aberto uma vez e as janelas são lidas na ordem
+# das linhas, para reaproveitar os segmentos já decodificados
+def salvar_tiles(imagem_path, janelas, tile_size=1024, pasta_saida="tiles", prefixo="tile", extensao=".jpg"):
+    print(f"🖼️ Abrindo imagem: {imagem_path}")
+    leitor = leitor_tiles.abrir_leitor_local(imagem_path)
+    caminhos = []
+    try:
+        altura, largura = leitor["shape"][:2]
+        for x, y in sorted(set(janelas), key=lambda j: (j[1], j[0])):
+            if not _dentro(x, y, largura, altura):
+                print(f"⚠️ Janela ({x}, {y}) fora da imagem {largura}x{altura}, ignorada")
+                continue
+            nome = f"{prefixo}_x{x}_y{y}{extensao}"
+            caminhos.append(salvar_tile(imagem_path, x, y, tile_size, nome, pasta_saida, leitor))
+    finally:
+        leitor_tiles.fechar_leitor(leitor)
+    print(f"📦 {len(caminhos)} tiles salvos em: {pasta_saida}")
+    return caminhos
+
+# Origem dos tiles da grade que contêm pelo menos um foco (ex.: saida_tiles.carregar_deteccoes)
+def tiles_com_deteccoes(deteccoes, tile_size=1024):
+    return sorted({(int(cx) // tile_size * tile_size, int(cy) // tile_size * tile_size) for cx, cy in deteccoes},
+                  key=lambda j: (j[1], j[0]))
+
+# ==== PIRÂMIDE DE VISÃO GERAL ====
+# Média de blocos fator x fator; sobras da borda que não completam um bloco são descartadas
+def _reduzir(bloco, fator):
+    h = bloco.shape[0] // fator * fator
+    w = bloco.shape[1] // fator * fator
+    b = bloco[:h, :w].reshape((h // fator, fator, w // fator, fator) + bloco.shape[2:])
+    return b.mean(axis=(1, 3)).round().astype(np.uint8)
+
+# Lê a cena uma vez, em faixas, e grava um TIFF com o nível 1/fator e sub-resoluções
+# (SubIFDs) reduzidas de 2 em 2 até o maior lado ficar abaixo de NIVEL_MINIMO
+def salvar_visao_geral(imagem_path, caminho_saida=None, fator=FATOR_VISAO_GERAL, compression="zlib"):
+    if caminho_saida is None:
+        caminho_saida = os.path.splitext(imagem_path)[0] + "_visao_geral.tif"
+    leitor = leitor_tiles.abrir_leitor_local(imagem_path)
+    try:
+        altura, largura = leitor["shape"][:2]
+        faixa = FAIXA_VISAO_GERAL * fator
+        partes = []
+        for y in range(0, altura // fator * fator, faixa):
+            y1 = min(y + faixa, altura // fator * fator)
+            bloco = np.asarray(leitor_tiles.ler_janela(leitor, y, y1, 0, largura))
+            if bloco.ndim == 3 and bloco.shape[2] == 4:
+                bloco = bloco[:, :, :3]
+            partes.append(_reduzir(bloco, fator))
+        ordem = leitor["ordem"]
+    finally:
+        leitor_tiles.fechar_leitor(leitor)
+
+    niveis = [np.concatenate(partes, axis=0)]
+    if ordem == "BGR" and niveis[0].ndim == 3:
+        niveis[0] = np.ascontiguousarray(niveis[0][:, :, ::-1])  # TIFF gravado em RGB
+    while max(niveis[-1].shape[:2]) >= 2 * NIVEL_MINIMO:
+        niveis.append(_reduzir(niveis[-1], 2))
+
+    output_dir = os.path.dirname(caminho_saida)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    photometric = "rgb" if niveis[0].ndim == 3 else "minisblack"
+    with tiff.TiffWriter(caminho_saida, bigtiff=True) as tw:
+        tw.write(niveis[0], subifds=len(niveis) - 1, tile=(256, 256), photometric=photometric, compression=compression)
+        for nivel in niveis[1:]:
+            tw.write(nivel, subfiletype=1, tile=(256, 256), photometric=photometric, compression=compression)
+
+    print(f"🗺️ Visão geral salva em: {caminho_saida} ({' -> '.join(f'{n.shape[1]}x{n.shape[0]}' for n in niveis)})")
+    return caminho_saida
 
 # === CONFIGURAÇÃO ===
 CAMINHO_IMAGEM = "D:/fire_detector/fire_detector/img_gigantes/imagem_gigante_20GB.tiff"
@@ -45,3 +133,8 @@ SAIDA = "tile_inspecao.jpg"  # nome do arquivo dentro da pasta tiles/
 
 if __name__ == "__main__":
     salvar_tile(CAMINHO_IMAGEM, X_TILE, Y_TILE, TAMANHO_TILE, SAIDA)
+
+    # Todos os tiles com focos de uma execução no modo "deteccoes":
+    # from saida_tiles import carregar_deteccoes
+    # salvar_tiles(CAMINHO_IMAGEM, tiles_com_deteccoes(carregar_deteccoes("..._deteccoes.npy"), TAMANHO_TILE), TAMANHO_TILE)
+    # salvar_visao_geral(CAMINHO_IMAGEM)
@@ -3,7 +3,8 @@ import tifffile as tiff
 import cv2
 import time
 import os
-from tqdm import tqdm
+import motor_deteccao
+import registros_deteccoes
 
 # ==== PARÂMETROS DE DETECÇÃO ====
 AREA_MINIMA = 5  # pixels
@@ -13,58 +14,56 @@ VERMELHO_BAIXO2 = np.array([160, 120, 120])
 VERMELHO_ALTO2 = np.array([180, 255, 255])
 
 # ==== DETECÇÃO HSV (sem zoom) ====
-def detectar_areas_vermelhas_HSV(tile):
-    hsv = cv2.cvtColor(tile, cv2.COLOR_BGR2HSV)
+def detectar_focos_HSV(tile, ordem="BGR", cores=False):
+    return motor_deteccao.detectar(
+        tile, "hsv", ordem=ordem, area_minima=AREA_MINIMA,
+        baixo1=VERMELHO_BAIXO1, alto1=VERMELHO_ALTO1,
+        baixo2=VERMELHO_BAIXO2, alto2=VERMELHO_ALTO2, cores=cores,
+    )
 
-    # Máscaras para faixas de vermelho
-    mask1 = cv2.inRange(hsv, VERMELHO_BAIXO1, VERMELHO_ALTO1)
-    mask2 = cv2.inRange(hsv, VERMELHO_BAIXO2, VERMELHO_ALTO2)
-    mascara = cv2.bitwise_or(mask1, mask2)
-
-    # Morfologia
-    mascara = cv2.morphologyEx(mascara, cv2.MORPH_OPEN, np.ones((3, 3), np.uint8))
-    contornos, _ = cv2.findContours(mascara, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-    centros = []
-    for contorno in contornos:
-        if cv2.contourArea(contorno) >= AREA_MINIMA:
-            M = cv2.moments(contorno)
-            if M["m00"] != 0:
-                cx = int(M["m10"] / M["m00"])
-                cy = int(M["m01"] / M["m00"])
-                centros.append((cx, cy))
-    return centros
+def detectar_areas_vermelhas_HSV(tile, ordem="BGR"):
+    return [(f["x"], f["y"]) for f in detectar_focos_HSV(tile, ordem)]
 
 # ==== PROCESSAMENTO SEQUENCIAL ====
-def process_image_sequencial(image_path, output_path="saida_hsv_sequencial.jpg"):
+# registros: caminho .csv, .parquet ou .geojson com um registro por foco (ver registros_deteccoes.py)
+def process_image_sequencial(image_path, output_path="saida_hsv_sequencial.jpg", registros=None):
     print(f"🖼️ Lendo imagem: {image_path}")
     ext = os.path.splitext(image_path)[1].lower()
 
     if ext in [".tif", ".tiff"]:
         with tiff.TiffFile(image_path) as tif:
             img = tif.asarray()
+        ordem = "RGB"
     else:
         img = cv2.imread(image_path)
+        ordem = "BGR"
 
     if img is None:
         raise FileNotFoundError(f"Imagem inválida: {image_path}")
 
     # Garantir 3 canais
-    if img.ndim == 2:
-        img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
-    elif img.shape[2] == 4:
-        img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
+    img = motor_deteccao.garantir_3_canais(img)
 
     print("🔥 Detectando focos...")
     start = time.time()
 
-    centros = detectar_areas_vermelhas_HSV(img)
-
+    focos = detectar_focos_HSV(img, ordem, cores=registros is not None)
+    centros = [(f["x"], f["y"]) for f in focos]
+    if registros is not None:
+        # A imagem inteira é um único tile com origem (0, 0)
+        escritor = registros_deteccoes.abrir_registros(
+            registros, registros_deteccoes.cena_da_imagem(image_path), registros_deteccoes.georreferencia(image_path)
+        )
+        registros_deteccoes.escrever_registros(escritor, registros_deteccoes.focos_globais(focos, 0, 0))
+        print(f"🗒️ {registros_deteccoes.fechar_registros(escritor)} registros gravados em: {registros}")
+
+    # cv2.imwrite espera BGR: o círculo vermelho e a imagem seguem a ordem da entrada
+    cor = (0, 0, 255) if ordem == "BGR" else (255, 0, 0)
     for cx, cy in centros:
-        cv2.circle(img, (cx, cy), 6, (0, 0, 255), 2)
+        cv2.circle(img, (cx, cy), 6, cor, 2)
 
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    cv2.imwrite(output_path, img)
+    cv2.imwrite(output_path, img if ordem == "BGR" else cv2.cvtColor(img, cv2.COLOR_RGB2BGR))
 
     elapsed = time.time() - start
     print(f"✅ {len(centros)} focos detectados em {elapsed:.2f} segundos.")
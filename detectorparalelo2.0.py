@@ -1,85 +1,513 @@
 import numpy as np
-import tifffile as tiff
 import cv2
 import time
 import os
 from tqdm import tqdm
 import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from saida_tiles import MODO_RASTER, MODO_NENHUM, MODOS_SAIDA, salvar_saida
+from fusao_tiles import janela_com_halo
+import motor_deteccao
+import leitor_tiles
+import agendador_tiles
+import registros_deteccoes
+import diario_tiles
+import cache_tiles
+import metricas_execucao
+import orcamento_memoria
+import estimativa_amostral
 
-# ==== CONFIGURAÇÕES HSV E DETECÇÃO ====
-AREA_MINIMA = 1  # pixels
-
-def detectar_areas_vermelhas_tile_RGB(tile, zoom=2):
-    imagem_ampliada = cv2.resize(tile, None, fx=zoom, fy=zoom, interpolation=cv2.INTER_CUBIC)
-    R, G, B = cv2.split(imagem_ampliada)
-    mascara = (R > 150) & (G < 100) & (B < 100)
-    mascara = mascara.astype(np.uint8) * 255
-    mascara = cv2.morphologyEx(mascara, cv2.MORPH_OPEN, np.ones((3, 3), np.uint8))
-    contornos, _ = cv2.findContours(mascara, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-    centros = []
-    for contorno in contornos:
-        if cv2.contourArea(contorno) >= AREA_MINIMA:
-            M = cv2.moments(contorno)
-            if M["m00"] != 0:
-                cx = int(M["m10"] / M["m00"]) // zoom
-                cy = int(M["m01"] / M["m00"]) // zoom
-                centros.append((cx, cy))
-    return centros
-
-# ==== VARIÁVEL GLOBAL DO MEMMAP ====
-global_img = None
-
-def init_worker(img_path):
-    global global_img
-    global_img = tiff.memmap(img_path)  # cada processo carrega sua própria referência memmap
+# ==== CONFIGURAÇÕES DE DETECÇÃO ====
+# Kernel do motor_deteccao ("rgb" = limiar R/G/B com zoom 2x; "rgb_subpixel" = resolução nativa)
+KERNEL = "rgb"
+PARAMETROS_KERNEL = {}  # ajustes aos padrões registrados do kernel (ex.: {"area_minima": 3})
+
+# ==== BACKENDS DE EXECUÇÃO ====
+BACKEND_PROCESSOS = "processos"  # multiprocessing.Pool, um leitor por processo (original)
+BACKEND_THREADS = "threads"      # ThreadPoolExecutor no mesmo processo, memmap compartilhado
+BACKEND_AUTO = "auto"            # mede uma amostra de tiles e escolhe entre os dois
+BACKENDS = (BACKEND_PROCESSOS, BACKEND_THREADS, BACKEND_AUTO)
+AMOSTRA_POR_THREAD = 2           # tiles da amostra do modo auto, por thread
+AUTO = "auto"                    # num_threads/chunk_size escolhidos pelo aquecimento (agendador_tiles)
+
+# ==== VARIÁVEL GLOBAL DO LEITOR ====
+global_leitor = None
+global_kernel = None
+
+def init_worker(descritor, kernel, parametros, cache=None, metricas=False):
+    global global_leitor, global_kernel
+    # cada processo abre seu próprio memmap, arquivo segmentado ou memória compartilhada
+    global_leitor = leitor_tiles.abrir_leitor(descritor)
+    global_kernel = (kernel, parametros, cache, metricas)
 
 # ==== PROCESSA UM TILE DADO SEU X, Y ====
+# cache: cache_tiles com o "contexto" da execução; o penúltimo campo do retorno diz se o
+# resultado veio do cache (None sem cache)
+# metricas: mede as etapas do tile (metricas_execucao); o último campo traz as medidas (ou None)
+def processar_posicao(leitor, kernel, parametros, args, cache=None, metricas=False):
+    x, y, tile_size, height, width, halo, prefiltro = args
+    medidas = metricas_execucao.iniciar_tile() if metricas else None
+    bytes_antes = leitor["bytes_lidos"]
+    with metricas_execucao.etapa("leitura"):
+        if halo is None:
+            tile = leitor_tiles.ler_janela(leitor, y, min(y+tile_size, height), x, min(x+tile_size, width))
+            nucleo = None
+        else:
+            y0, y1, x0, x1, topo, esq, h, w = janela_com_halo(x, y, tile_size, height, width, halo)
+            tile = leitor_tiles.ler_janela(leitor, y0, y1, x0, x1)
+            nucleo = (x, y, topo, esq, h, w)
+        if medidas is not None and leitor["modo"] == leitor_tiles.MODO_MEMMAP:
+            # a janela do memmap é só uma vista: as faltas de página aconteceriam dentro do
+            # kernel. Copiando aqui, elas contam como leitura.
+            tile = np.ascontiguousarray(tile)
+
+    # Com halo o worker devolve os componentes do núcleo; a fusão é feita no processo principal
+    def detectar():
+        return motor_deteccao.processar_tile(tile, nucleo, kernel, prefiltro, **parametros)
+
+    acerto = None
+    if cache is None:
+        resultado, descartado = detectar()
+    else:
+        # Os componentes do halo guardam coordenadas globais: a posição do núcleo entra na chave
+        with metricas_execucao.etapa("hash_cache"):
+            chave = cache_tiles.chave_tile(tile, cache["contexto"] + ("" if nucleo is None else str(nucleo)))
+        (resultado, descartado), acerto = cache_tiles.obter(cache, chave, detectar)
+    if medidas is not None:
+        medidas = metricas_execucao.encerrar_tile()
+    return x, y, resultado, descartado, leitor["bytes_lidos"] - bytes_antes, acerto, medidas
+
 def process_tile_wrapper(args):
-    x, y, tile_size, height, width = args
-    tile = global_img[y:min(y+tile_size, height), x:min(x+tile_size, width)]
+    kernel, parametros, cache, metricas = global_kernel
+    return processar_posicao(global_leitor, kernel, parametros, args, cache, metricas)
+
+# Lote de tamanho variável (chunk_size="auto"): uma tarefa do Pool, uma lista de resultados
+def process_lote_wrapper(lote):
+    return [process_tile_wrapper(args) for args in lote]
+
+def _worker_pronto(_):
+    return os.getpid()
+
+# ==== EXECUÇÃO EM PROCESSOS ====
+# Gera os resultados e preenche `estatisticas` com o tempo de início do pool.
+# lotes: lista de listas de tiles (lotes guiados); None usa chunks fixos de chunk_size
+def _resultados_processos(descritor, kernel, parametros, tiles_data, num_threads, chunk_size, estatisticas, cache=None, metricas=False, lotes=None):
+    t0 = time.perf_counter()
+    with multiprocessing.Pool(processes=num_threads, initializer=init_worker, initargs=(descritor, kernel, parametros, cache, metricas)) as pool:
+        pool.map(_worker_pronto, range(num_threads), chunksize=1)  # espera os workers subirem
+        estatisticas["inicio"] = time.perf_counter() - t0
+        if lotes is None:
+            yield from pool.imap_unordered(process_tile_wrapper, tiles_data, chunksize=chunk_size)
+        else:
+            # o Pool entrega as tarefas na ordem da lista: os lotes caros saem primeiro
+            for resultados in pool.imap_unordered(process_lote_wrapper, lotes, chunksize=1):
+                yield from resultados
 
-    # Garantir 3 canais
-    if tile.ndim == 2:
-        tile = cv2.cvtColor(tile, cv2.COLOR_GRAY2BGR)
-    elif tile.shape[2] == 4:
-        tile = cv2.cvtColor(tile, cv2.COLOR_BGRA2BGR)
+# ==== EXECUÇÃO EM THREADS ====
+# As chamadas do OpenCV (resize, morphologyEx, findContours, inRange) soltam o GIL.
+# Todas as threads usam o mesmo memmap/memória compartilhada; no modo "segmentos"
+# cada thread abre o seu handle do arquivo na primeira leitura.
+def _resultados_threads(leitor, descritor, kernel, parametros, tiles_data, num_threads, estatisticas, cache=None, metricas=False):
+    t0 = time.perf_counter()
+    local = threading.local()
+    clones = []
+    lock = threading.Lock()
 
-    centros = detectar_areas_vermelhas_tile_RGB(tile)
-    return x, y, centros
+    def tarefa(args):
+        clone = getattr(local, "leitor", None)
+        if clone is None:
+            clone = local.leitor = leitor_tiles.clonar_leitor(leitor, descritor)
+            with lock:
+                clones.append(clone)
+        return processar_posicao(clone, kernel, parametros, args, cache, metricas)
+
+    try:
+        with ThreadPoolExecutor(max_workers=num_threads) as executor:
+            estatisticas["inicio"] = time.perf_counter() - t0
+            yield from executor.map(tarefa, tiles_data)
+    finally:
+        for clone in clones:
+            if clone["modo"] == leitor_tiles.MODO_SEGMENTOS:
+                leitor_tiles.fechar_leitor(clone)
+
+# ==== MODO AUTO: MEDE A AMOSTRA EM THREADS E EM PROCESSOS ====
+# A mesma amostra (tiles espalhados pela fila) roda nos dois backends, sem cache para que
+# nenhum dos dois aproveite o que o outro gravou. De cada um saem o tempo de início (subir
+# o pool) e os tiles/s; vence o menor tempo previsto para a fila inteira, início + tiles /
+# taxa. Retorna (backend, resultados da amostra no backend escolhido, tiles restantes).
+def _escolher_backend(leitor, descritor, kernel, parametros, tiles_data, num_threads, chunk_size=None, metricas=False):
+    n = min(len(tiles_data), AMOSTRA_POR_THREAD * num_threads)
+    passo = max(1, len(tiles_data) // max(n, 1))
+    indices = set(range(0, len(tiles_data), passo)[:n])
+    amostra = [tiles_data[i] for i in sorted(indices)]
+    restantes = [t for i, t in enumerate(tiles_data) if i not in indices]
+    if not amostra:
+        return BACKEND_PROCESSOS, [], restantes
+
+    processar_posicao(leitor, kernel, parametros, amostra[0])  # aquecimento (imports do OpenCV, caches)
+    chunk_amostra = max(1, min(chunk_size or 1, len(amostra) // num_threads))
+    medidas = {}
+    for backend in (BACKEND_THREADS, BACKEND_PROCESSOS):
+        estatisticas = {"inicio": 0.0}
+        t0 = time.perf_counter()
+        if backend == BACKEND_THREADS:
+            resultados = list(_resultados_threads(leitor, descritor, kernel, parametros, amostra, num_threads, estatisticas, None, metricas))
+        else:
+            resultados = list(_resultados_processos(descritor, kernel, parametros, amostra, num_threads, chunk_amostra, estatisticas, None, metricas))
+        tempo_tiles = time.perf_counter() - t0 - estatisticas["inicio"]
+        taxa = len(amostra) / tempo_tiles if tempo_tiles > 0 else float("inf")
+        medidas[backend] = (estatisticas["inicio"], taxa, estatisticas["inicio"] + len(tiles_data) / taxa, resultados)
+
+    backend = min(medidas, key=lambda b: medidas[b][2])
+    print(f"🔎 Auto: amostra de {len(amostra)} tiles com {num_threads} workers | " +
+          " | ".join(f"{b}: início {inicio:.2f}s, {taxa:.1f} tiles/s" for b, (inicio, taxa, _, _) in medidas.items()) +
+          f" -> {backend}")
+    return backend, medidas[backend][3], restantes
+
+# ==== AUTOAJUSTE: AQUECIMENTO EM SÉRIE ====
+# Roda a amostra de agendador_tiles.indices_amostra (no máximo 10% dos tiles) no processo
+# principal medindo leitura e cálculo de cada tile. Os resultados valem (entram na saída
+# como os demais). Retorna (resultados, tiles restantes, leitura, cálculo, {(x, y): segundos}).
+def _aquecer(leitor, kernel, parametros, tiles_data, n_cpus):
+    indices = agendador_tiles.indices_amostra(len(tiles_data), n_cpus)
+    escolhidos = set(indices)
+    restantes = [t for i, t in enumerate(tiles_data) if i not in escolhidos]
+
+    resultados = []
+    leitura = calculo = 0.0
+    custos = {}
+    for i in indices:
+        r = processar_posicao(leitor, kernel, parametros, tiles_data[i], metricas=True)
+        medidas = r[6]
+        total = medidas["fim"] - medidas["inicio"]
+        leitura += medidas["etapas"].get("leitura", 0.0)
+        calculo += total - medidas["etapas"].get("leitura", 0.0)
+        custos[(r[0], r[1])] = total
+        resultados.append(r)
+    return resultados, restantes, leitura, calculo, custos
 
 # ==== PROCESSAMENTO PARALELO ====
-def process_large_image_parallel(image_path, tile_size=1024, output_path="resultados_paralelo/resultado_incendios_paralelo.tiff", num_threads=4, chunk_size=10):
+def process_large_image_parallel(image_path, tile_size=1024, output_path="resultados_paralelo/resultado_incendios_paralelo.tiff", num_threads=4, chunk_size=None, output_mode=MODO_RASTER, halo=None, kernel=KERNEL, parametros_kernel=None, prefiltro=True, modo_leitura=None, alinhar_tiles=True, relatorio_io=None, backend=BACKEND_PROCESSOS, registros=None, checkpoint=None, pasta_cache=None, limite_cache=cache_tiles.LIMITE_PADRAO_BYTES, metricas=None, max_memoria=None):
+    # output_mode: "raster" (canvas do tamanho da cena), "tiff" (BigTIFF gravado tile a tile)
+    # ou "deteccoes" (apenas a lista de focos; o overlay é desenhado sob demanda)
+    # halo: None mantém os tiles disjuntos; um inteiro (ex.: fusao_tiles.HALO_PADRAO) lê essa
+    # borda extra em volta de cada tile e funde os focos que cruzam as bordas dos tiles
+    # kernel/parametros_kernel: kernel registrado no motor_deteccao e ajustes dos seus padrões
+    # prefiltro: descarta, por máximo/mínimo dos canais, tiles que não podem ter pixel candidato
+    # modo_leitura: None escolhe pelo arquivo ("memmap", "segmentos" ou "compartilhada", ver leitor_tiles.py)
+    # num_threads: inteiro ou "auto" (núcleos, espera por leitura e memória medidos num aquecimento)
+    # chunk_size: None escolhe pelo layout do arquivo (faixa de strips inteira por worker); "auto"
+    # manda os tiles mais caros primeiro em lotes guiados que diminuem na cauda (sem layout de segmentos)
+    # alinhar_tiles: arredonda o tile_size para múltiplo dos tiles/strips internos do TIFF
+    # relatorio_io: caminho de um CSV com os bytes lidos por tile (x, y, bytes_lidos)
+    # backend: "processos" (Pool), "threads" (mesmo processo) ou "auto" (mede e escolhe)
+    # registros: caminho .csv, .parquet ou .geojson com um registro por foco (ver registros_deteccoes.py),
+    # gravado à medida que os tiles terminam; com output_mode="nenhum" é a única saída
+    # checkpoint: caminho do diário de tiles concluídos (ver diario_tiles.py); se existir, a execução
+    # retoma de onde parou e só processa os tiles que faltam. É apagado quando a saída é gravada.
+    # pasta_cache: cache em disco dos resultados por conteúdo do tile (ver cache_tiles.py), podado
+    # para limite_cache bytes ao final
+    # metricas: caminho .json ou .prom (Prometheus) com histogramas do tempo de cada etapa por tile
+    # e o tempo ocupado/ocioso de cada worker (ver metricas_execucao.py)
+    # max_memoria: orçamento ("8GB", "512MB" ou bytes); reduz tiles em voo, workers e, se preciso,
+    # o tile_size para o pico estimado caber nele (ver orcamento_memoria.py)
+    if output_mode not in MODOS_SAIDA:
+        raise ValueError(f"Modo de saída inválido: {output_mode} (use um de {MODOS_SAIDA})")
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend inválido: {backend} (use um de {BACKENDS})")
+    if num_threads != AUTO and (not isinstance(num_threads, int) or num_threads < 1):
+        raise ValueError(f"num_threads inválido: {num_threads} (use um inteiro positivo ou '{AUTO}')")
+    if chunk_size not in (None, AUTO) and (not isinstance(chunk_size, int) or chunk_size < 1):
+        raise ValueError(f"chunk_size inválido: {chunk_size} (use None, um inteiro positivo ou '{AUTO}')")
+    if metricas is not None:
+        metricas_execucao.formato_metricas(metricas)  # valida a extensão antes de processar
+    if max_memoria is not None:
+        max_memoria = orcamento_memoria.interpretar_bytes(max_memoria)
+    parametros = dict(PARAMETROS_KERNEL if parametros_kernel is None else parametros_kernel)
+    if registros is not None:
+        parametros.setdefault("cores", True)  # cor média de cada foco nos registros
+    motor_deteccao.parametros_kernel(kernel, **parametros)  # valida antes de subir o pool
+
     print(f"🔄 Carregando imagem (modo leitura por tile): {image_path}")
     start = time.time()
 
-    with tiff.TiffFile(image_path) as tif:
-        page = tif.pages[0]
-        height, width = page.shape[:2]
+    descritor, memoria = leitor_tiles.preparar_leitura(image_path, modo_leitura)
+    escritor = None
+    try:
+        if registros is not None:
+            escritor = registros_deteccoes.abrir_registros(
+                registros, registros_deteccoes.cena_da_imagem(image_path), registros_deteccoes.georreferencia(image_path)
+            )
+        config = {
+            "tile_size": tile_size, "output_path": output_path, "num_threads": num_threads, "chunk_size": chunk_size,
+            "output_mode": output_mode, "halo": halo, "kernel": kernel, "parametros": parametros, "prefiltro": prefiltro,
+            "alinhar_tiles": alinhar_tiles, "relatorio_io": relatorio_io, "backend": backend, "escritor": escritor,
+            "checkpoint": checkpoint, "pasta_cache": pasta_cache, "limite_cache": limite_cache, "metricas": metricas,
+            "max_memoria": max_memoria,
+        }
+        return _processar(descritor, config, start)
+    finally:
+        if escritor is not None:
+            n_registros = registros_deteccoes.fechar_registros(escritor)
+            print(f"🗒️ {n_registros} registros gravados em: {registros}")
+        leitor_tiles.liberar_leitura(memoria)
+
+# ==== ETAPAS DE UMA EXECUÇÃO ====
+# config: os argumentos de process_large_image_parallel já validados (mais o escritor de
+# registros). plano: o que é decidido a partir deles e do arquivo (tile, workers, chunk,
+# backend, orçamento) e ajustado pelas etapas seguintes.
+
+# Orçamento de memória e fila de posições, na ordem física dos segmentos do arquivo
+def _planejar(descritor, config):
+    height, width = descritor["shape"][:2]
+    tile_size, num_threads, chunk_size, halo = config["tile_size"], config["num_threads"], config["chunk_size"], config["halo"]
+    layout = leitor_tiles.layout_arquivo(descritor)
+    n_cpus = agendador_tiles.nucleos_disponiveis()
+    auto_workers = num_threads == AUTO
+    pedido_chunk = None if chunk_size == AUTO else chunk_size
+    pedido_workers = agendador_tiles.SOBRESCRITA_MAXIMA * n_cpus if auto_workers else num_threads
+    canais = descritor["shape"][2] if len(descritor["shape"]) > 2 else 1
+    governo = None
+    if config["max_memoria"] is not None:
+        max_memoria = config["max_memoria"]
+        if config["alinhar_tiles"]:
+            tile_size = agendador_tiles.alinhar_tile_size(tile_size, layout)
+        passo = agendador_tiles.passo_segmentos(layout)
+        # Fixo: canvas do raster e, na memória compartilhada, a cena decodificada
+        fixo = height * width * 3 if config["output_mode"] == MODO_RASTER else 0
+        if descritor["modo"] == leitor_tiles.MODO_COMPARTILHADA:
+            fixo += descritor["bytes_dados"]
+        governo = orcamento_memoria.governar(
+            max_memoria, fixo, config["kernel"], config["parametros"], tile_size, pedido_workers, canais, halo,
+            processos=config["backend"] != BACKEND_THREADS,
+            extra_worker=leitor_tiles.CACHE_SEGMENTOS_BYTES if descritor["modo"] == leitor_tiles.MODO_SEGMENTOS else 0,
+            passo=passo if tile_size % passo == 0 else 1,
+        )
+        tile_size = governo["tile_size"]
+        if not auto_workers:
+            num_threads = governo["workers"]
+        print(f"🧮 Orçamento de memória {max_memoria / 1024**2:.0f} MB: " +
+              (", ".join(governo["ajustes"]) if governo["ajustes"] else "cabe sem ajustes"))
+    tile_size, posicoes, chunk_size = agendador_tiles.agendar_tiles(
+        layout, height, width, tile_size, n_cpus if auto_workers else num_threads, pedido_chunk, config["alinhar_tiles"], halo
+    )
+    if layout is not None:
+        sh, sw = layout["segmento"]
+        print(f"🧱 Layout: {layout['tipo']} de {sw}x{sh} | tile {tile_size}" +
+              (f" (ajustado de {config['tile_size']})" if tile_size != config["tile_size"] else "") +
+              f" | chunk {chunk_size}")
+    return {
+        "layout": layout, "n_cpus": n_cpus, "canais": canais, "governo": governo, "tile_size": tile_size,
+        "num_threads": num_threads, "chunk_size": chunk_size, "pedido_chunk": pedido_chunk, "backend": config["backend"],
+        "auto_workers": auto_workers,
+        # Lotes guiados só sem segmentos: com eles a ordem física da fila vale mais que o custo
+        "auto_lotes": config["chunk_size"] == AUTO and layout is None,
+        "tiles_data": [(x, y, tile_size, height, width, halo, config["prefiltro"]) for x, y in posicoes],
+    }
+
+# Autoajuste de workers e lotes (aquecimento) e escolha do backend no modo auto.
+# Ajusta num_threads, chunk_size e backend do plano; retorna (resultados do aquecimento,
+# resultados da amostra do backend, tiles restantes, lotes guiados ou None)
+def _escolher_execucao(leitor, descritor, config, plano, pendentes, coletor):
+    height, width = descritor["shape"][:2]
+    kernel, parametros, halo = config["kernel"], config["parametros"], config["halo"]
+    n_cpus, governo, tile_size = plano["n_cpus"], plano["governo"], plano["tile_size"]
+    resultados_aquecimento = []
+    restantes = pendentes
+    custos = {}
+    if (plano["auto_workers"] or plano["auto_lotes"]) and not agendador_tiles.indices_amostra(len(pendentes), n_cpus):
+        # Poucos tiles: o aquecimento custaria mais do que o ajuste economiza
+        print(f"⚙️ Autoajuste dispensado: {len(pendentes)} tiles para {n_cpus} núcleos")
+        if plano["auto_workers"]:
+            plano["num_threads"] = max(1, min(n_cpus, len(pendentes), governo["workers"] if governo is not None else n_cpus))
+        plano["auto_workers"] = plano["auto_lotes"] = False
+    if plano["auto_workers"] or plano["auto_lotes"]:
+        resultados_aquecimento, restantes, leitura, calculo, custos = _aquecer(leitor, kernel, parametros, pendentes, n_cpus)
+        if coletor is None:
+            resultados_aquecimento = [r[:6] + (None,) for r in resultados_aquecimento]
+        n_amostra = max(len(custos), 1)
+        print(f"🎛️ Aquecimento: {len(custos)} tiles, {1000 * (leitura + calculo) / n_amostra:.1f} ms/tile "
+              f"({1000 * leitura / n_amostra:.1f} ms de leitura)")
+        if plano["auto_workers"]:
+            lado = tile_size + 2 * (halo or 0)
+            num_threads, limite = agendador_tiles.escolher_workers(
+                leitura, calculo, lado * lado * plano["canais"], max(len(restantes), 1), n_cpus, plano["backend"] != BACKEND_THREADS
+            )
+            if governo is not None and governo["workers"] < num_threads:
+                num_threads, limite = governo["workers"], "orçamento de memória"
+            plano["num_threads"] = num_threads
+            print(f"⚙️ Autoajuste: {num_threads} workers ({limite})")
+            if plano["pedido_chunk"] is None and not plano["auto_lotes"]:
+                # chunk do layout recalculado para o número de workers escolhido
+                _, _, plano["chunk_size"] = agendador_tiles.agendar_tiles(plano["layout"], height, width, tile_size, num_threads, None, False, halo)
+    print(f"⚙️ Usando {plano['num_threads']} threads para processamento paralelo.")
+
+    resultados_amostra = []
+    if plano["backend"] == BACKEND_AUTO:
+        plano["backend"], resultados_amostra, restantes = _escolher_backend(
+            leitor, descritor, kernel, parametros, restantes, plano["num_threads"], plano["chunk_size"], coletor is not None)
+
+    lotes = None
+    if plano["auto_lotes"] and restantes:
+        por_posicao = {(t[0], t[1]): t for t in restantes}
+        # Fração de candidatos de cada tile, medida em poucas linhas dele (ou na pirâmide)
+        avaliados = list(por_posicao) + list(custos)
+        notas = dict(zip(avaliados, estimativa_amostral.visao_geral(
+            leitor, descritor["caminho"], avaliados, tile_size, kernel, parametros)))
+        previstos = agendador_tiles.prever_custos(list(por_posicao), notas, custos, tile_size, height, width)
+        lotes = [[por_posicao[p] for p in lote] for lote in agendador_tiles.lotes_guiados(list(por_posicao), previstos, plano["num_threads"])]
+        restantes = [t for lote in lotes for t in lote]  # mais caros primeiro (ordem das threads)
+        tamanhos = [len(lote) for lote in lotes]
+        print(f"📦 Lotes guiados: {len(lotes)} lotes de {max(tamanhos)} a {min(tamanhos)} tiles, os mais caros primeiro")
+    return resultados_aquecimento, resultados_amostra, restantes, lotes
+
+# Um iterador com todos os resultados, na ordem: tiles do diário (sem medidas, que são da
+# execução anterior), aquecimento, amostra do backend e o backend escolhido. Os novos
+# passam pelo diário e a espera pelos do backend entra nas métricas.
+def _fonte_resultados(leitor, descritor, config, plano, execucao, concluidos, diario, cache, coletor, estatisticas):
+    resultados_aquecimento, resultados_amostra, restantes, lotes = execucao
+    kernel, parametros = config["kernel"], config["parametros"]
+    if plano["backend"] == BACKEND_THREADS:
+        results = _resultados_threads(leitor, descritor, kernel, parametros, restantes, plano["num_threads"], estatisticas, cache, coletor is not None)
+    else:
+        results = _resultados_processos(descritor, kernel, parametros, restantes, plano["num_threads"], plano["chunk_size"], estatisticas, cache, coletor is not None, lotes)
+    if coletor is not None:
+        results = metricas_execucao.cronometrando(coletor, "espera_resultados", results)
+    if diario is not None:
+        resultados_aquecimento = diario_tiles.registrando(diario, resultados_aquecimento)
+        resultados_amostra = diario_tiles.registrando(diario, resultados_amostra)
+        results = diario_tiles.registrando(diario, results)
+    fontes = ((r[:6] + (None,) for r in concluidos), resultados_aquecimento, resultados_amostra, results)
+    return (r for fonte in fontes for r in fonte)
+
+# Acumula um resultado de tile em coleta (contadores, detecções ou componentes para a fusão)
+def _acumular(coleta, config, coletor, resultado_tile):
+    x_coord, y_coord, resultado, descartado, bytes_lidos, acerto, medidas = resultado_tile
+    if medidas is not None:
+        metricas_execucao.acrescentar_tile(coletor, medidas)
+    coleta["tiles_descartados"] += descartado
+    coleta["bytes_por_tile"][(x_coord, y_coord)] = bytes_lidos
+    if acerto is not None:
+        coleta["consultas_cache"] += 1
+        coleta["acertos_cache"] += acerto
+    if config["halo"] is None:
+        coleta["deteccoes"].extend((f["x"] + x_coord, f["y"] + y_coord) for f in resultado)
+        if config["escritor"] is not None:
+            with metricas_execucao.medindo(coletor, "registros"):
+                registros_deteccoes.escrever_registros(config["escritor"], registros_deteccoes.focos_globais(resultado, x_coord, y_coord))
+    elif resultado is not None:
+        coleta["componentes"].append(resultado)
+
+# Fusão, relatórios, poda do cache, saída e métricas; retorna o total de focos
+def _finalizar(descritor, config, plano, coleta, output, cache, coletor, tempo_tiles):
+    height, width = descritor["shape"][:2]
+    escritor, tile_size, n_tiles = config["escritor"], plano["tile_size"], len(plano["tiles_data"])
+    deteccoes = coleta["deteccoes"]
+    if config["halo"] is not None:
+        with metricas_execucao.medindo(coletor, "fusao"):
+            focos = motor_deteccao.fundir(coleta["componentes"], tile_size, config["kernel"], **config["parametros"])
+        deteccoes = [(f["x"], f["y"]) for f in focos]
+        if escritor is not None:
+            with metricas_execucao.medindo(coletor, "registros"):
+                registros_deteccoes.escrever_registros(escritor, registros_deteccoes.atribuir_tiles(focos, tile_size))
+        print(f"🧩 Fusão entre tiles: {sum(c['n'] for c in coleta['componentes'])} componentes -> {len(focos)} focos")
+
+    if config["prefiltro"]:
+        descartados = coleta["tiles_descartados"]
+        print(f"⏭️ Pré-filtro: {descartados}/{n_tiles} tiles descartados ({descartados / n_tiles:.1%})")
+
+    bytes_por_tile = coleta["bytes_por_tile"]
+    amplificacao = agendador_tiles.amplificacao_io(bytes_por_tile, descritor["bytes_dados"])
+    print(f"📦 Leitura: {sum(bytes_por_tile.values()) / 1e6:.1f} MB lidos para {descritor['bytes_dados'] / 1e6:.1f} MB de dados (amplificação {amplificacao:.2f}x)")
+    if config["relatorio_io"] is not None:
+        agendador_tiles.salvar_relatorio_io(config["relatorio_io"], bytes_por_tile)
+
+    if cache is not None:
+        removidas, tamanho = cache_tiles.podar_cache(cache)
+        print(f"🗃️ Cache: {cache_tiles.resumo_acertos(coleta['acertos_cache'], coleta['consultas_cache'])} | "
+              f"{tamanho / 1e6:.1f} MB em disco, {removidas} entradas podadas")
+
+    output_path, output_mode = config["output_path"], config["output_mode"]
+    with metricas_execucao.medindo(coletor, "overlay"):
+        if output is not None:
+            for cx, cy in deteccoes:
+                cv2.circle(output, (int(round(cx)), int(round(cy))), 6, (0, 0, 255), 2)
+            output_dir = os.path.dirname(output_path)
+            os.makedirs(output_dir, exist_ok=True)
+            cv2.imwrite(output_path, output)
+        elif output_mode != MODO_NENHUM:
+            output_path = salvar_saida(output_mode, output_path, deteccoes, height, width)
+            print(f"💾 Saída ({output_mode}) gravada em: {output_path}")
+
+    if coletor is not None:
+        metricas_execucao.encerrar_coletor(coletor, tempo_tiles)
+        print(metricas_execucao.resumo_metricas(coletor))
+        print(f"📈 Métricas gravadas em: {metricas_execucao.salvar_metricas(coletor, config['metricas'])}")
+    if plano["governo"] is not None:
+        print(orcamento_memoria.resumo_memoria(plano["governo"], plano["num_threads"]))
+    return len(deteccoes)
+
+def _processar(descritor, config, start):
+    # tifffile entrega os canais como gravados (RGB); JPG/PNG decodificados pelo OpenCV vêm em BGR
+    config["parametros"].setdefault("ordem", descritor["ordem"])
+    height, width = descritor["shape"][:2]
 
     print(f"📐 Dimensões da imagem: {width}x{height}")
-    print(f"⚙️ Usando {num_threads} threads para processamento paralelo.")
+    print(f"📖 Leitura dos tiles: {descritor['modo']}")
+
+    plano = _planejar(descritor, config)
+    tiles_data = plano["tiles_data"]
 
-    # Lista apenas de posições
-    tiles_data = [(x, y, tile_size, height, width)
-                  for y in range(0, height, tile_size)
-                  for x in range(0, width, tile_size)]
+    # Tiles já concluídos numa execução anterior interrompida
+    diario = None
+    concluidos = []
+    pendentes = tiles_data
+    if config["checkpoint"] is not None:
+        assinatura = diario_tiles.assinatura_execucao(descritor["caminho"], plano["tile_size"], config["halo"], config["kernel"],
+                                                      config["parametros"], config["prefiltro"])
+        diario, concluidos = diario_tiles.abrir_diario(config["checkpoint"], assinatura)
+        feitos = {(r[0], r[1]) for r in concluidos}
+        pendentes = [t for t in tiles_data if (t[0], t[1]) not in feitos]
+        if concluidos:
+            print(f"♻️ Retomando do diário {config['checkpoint']}: {len(concluidos)}/{len(tiles_data)} tiles já concluídos")
 
-    output = np.zeros((height, width, 3), dtype=np.uint8)
-    total_detectados = 0
+    cache = None
+    if config["pasta_cache"] is not None:
+        cache = cache_tiles.abrir_cache(config["pasta_cache"], config["limite_cache"])
+        cache["contexto"] = cache_tiles.contexto_deteccao(config["kernel"], config["parametros"], config["prefiltro"])
+    coletor = metricas_execucao.novo_coletor() if config["metricas"] is not None else None
 
-    print("▶️ Processando tiles em paralelo...")
-    with multiprocessing.Pool(processes=num_threads, initializer=init_worker, initargs=(image_path,)) as pool:
-        results = pool.imap_unordered(process_tile_wrapper, tiles_data, chunksize=chunk_size)
+    # Só o modo raster aloca a cena inteira; os demais guardam apenas os centros globais
+    output = np.zeros((height, width, 3), dtype=np.uint8) if config["output_mode"] == MODO_RASTER else None
+    coleta = {"deteccoes": [], "componentes": [], "tiles_descartados": 0, "bytes_por_tile": {},
+              "acertos_cache": 0, "consultas_cache": 0}
+
+    # O leitor do processo principal serve ao aquecimento, ao modo auto e às threads
+    usa_leitor = plano["backend"] != BACKEND_PROCESSOS or plano["auto_workers"] or plano["auto_lotes"]
+    leitor = leitor_tiles.abrir_leitor(descritor) if usa_leitor else None
+    try:
+        execucao = _escolher_execucao(leitor, descritor, config, plano, pendentes, coletor)
+        print(f"▶️ Processando tiles em paralelo ({plano['backend']})...")
+        estatisticas = {"inicio": 0.0}
+        t0 = time.perf_counter()
+        resultados = _fonte_resultados(leitor, descritor, config, plano, execucao, concluidos, diario, cache, coletor, estatisticas)
+        for resultado_tile in tqdm(resultados, total=len(tiles_data), desc="Tiles Processados", unit="tile"):
+            _acumular(coleta, config, coletor, resultado_tile)
+        tempo_tiles = time.perf_counter() - t0 - estatisticas["inicio"]
+    finally:
+        if leitor is not None:
+            leitor_tiles.fechar_leitor(leitor)
+        if diario is not None:
+            diario_tiles.fechar_diario(diario)
 
-        for x_coord, y_coord, centros in tqdm(results, total=len(tiles_data), desc="Tiles Processados", unit="tile"):
-            total_detectados += len(centros)
-            for cx, cy in centros:
-                cv2.circle(output, (cx + x_coord, cy + y_coord), 6, (0, 0, 255), 2)
+    restantes = execucao[2]
+    print(f"🚀 Backend {plano['backend']}: início {estatisticas['inicio']:.2f}s | "
+          f"{len(restantes) / tempo_tiles if tempo_tiles > 0 else 0.0:.1f} tiles/s")
 
-    output_dir = os.path.dirname(output_path)
-    os.makedirs(output_dir, exist_ok=True)
-    cv2.imwrite(output_path, output)
+    total_detectados = _finalizar(descritor, config, plano, coleta, output, cache, coletor, tempo_tiles)
+    if diario is not None:
+        diario_tiles.remover_diario(diario)
 
     elapsed = time.time() - start
     print(f"✅ Processamento Paralelo Concluído: {total_detectados} focos detectados em {elapsed:.2f} segundos.")
@@ -90,7 +518,7 @@ if __name__ == "__main__":
     image_to_process = "D:/fire_detector/fire_detector/img/4.jpg"
     output_image_name_parallel = "resultados_paralelo/resultado_incendios_paralelo.tiff"
     tile_dimension = 1024
-    num_parallel_threads = 6  # Ajuste conforme sua máquina
+    num_parallel_threads = AUTO  # ou um inteiro fixo
 
     try:
         elapsed, fires = process_large_image_parallel(
@@ -98,7 +526,8 @@ if __name__ == "__main__":
             tile_size=tile_dimension,
             output_path=output_image_name_parallel,
             num_threads=num_parallel_threads,
-            chunk_size=10
+            chunk_size=AUTO,  # lotes guiados; None: chunk alinhado ao layout do arquivo
+            halo=None  # use fusao_tiles.HALO_PADRAO para contagens independentes do tamanho do tile
         )
         print(f"📂 Imagem salva em: {output_image_name_parallel}")
     except FileNotFoundError as e:
@@ -1,72 +1,168 @@
 import numpy as np
-import tifffile as tiff
 import cv2
 import time
 import os
 from tqdm import tqdm
+from saida_tiles import MODO_RASTER, MODO_NENHUM, MODOS_SAIDA, salvar_saida
+from fusao_tiles import janela_com_halo
+import motor_deteccao
+import leitor_tiles
+import registros_deteccoes
+import metricas_execucao
+import orcamento_memoria
+import leitura_antecipada
+
+# ==== CONFIGURAÇÕES DE DETECÇÃO (iguais ao paralelo) ====
+KERNEL = "rgb"
+PARAMETROS_KERNEL = {}  # ajustes aos padrões registrados do kernel
+
+# ==== TILES SOB DEMANDA ====
+# Gerador: cada janela (com a borda do halo, se houver) só é lida do arquivo quando o laço
+# pede o próximo tile, então a detecção começa no primeiro tile e a memória não cresce com
+# a cena. copiar: materializa a janela do memmap aqui, para as faltas de página caírem na
+# leitura (e na thread leitora, com leitura antecipada) e não na detecção
+def tiles_sob_demanda(leitor, tile_size, halo=None, copiar=False):
+    height, width = leitor["shape"][:2]
+    for y in range(0, height, tile_size):
+        for x in range(0, width, tile_size):
+            if halo is None:
+                tile = leitor_tiles.ler_janela(leitor, y, min(y+tile_size, height), x, min(x+tile_size, width))
+                nucleo = None
+            else:
+                y0, y1, x0, x1, topo, esq, h, w = janela_com_halo(x, y, tile_size, height, width, halo)
+                tile = leitor_tiles.ler_janela(leitor, y0, y1, x0, x1)
+                nucleo = (x, y, topo, esq, h, w)
+            yield (np.ascontiguousarray(tile) if copiar else tile), x, y, nucleo
+
+def process_large_image_sequential(image_path, tile_size=1024, output_path="resultados_sequencial/resultado_incendios_sequencial.tiff", delay_per_tile_seconds=0, output_mode=MODO_RASTER, halo=None, kernel=KERNEL, parametros_kernel=None, prefiltro=True, registros=None, metricas=None, max_memoria=None, profundidade_leitura=0):
+    # output_mode: "raster", "tiff" ou "deteccoes" (ver saida_tiles.py)
+    # halo: None mantém os tiles disjuntos; um inteiro lê a borda extra e funde os focos entre tiles
+    # kernel/parametros_kernel: kernel registrado no motor_deteccao e ajustes dos seus padrões
+    # prefiltro: descarta, por máximo/mínimo dos canais, tiles que não podem ter pixel candidato
+    # registros: caminho .csv, .parquet ou .geojson com um registro por foco (ver registros_deteccoes.py)
+    # metricas: caminho .json ou .prom com o tempo de cada etapa por tile (ver metricas_execucao.py)
+    # max_memoria: orçamento ("8GB", "512MB" ou bytes); reduz o tile_size se o pico estimado não couber
+    # profundidade_leitura: quantos tiles uma thread leitora deixa prontos enquanto o atual é
+    # detectado (0 lê no próprio laço; ver leitura_antecipada.py)
+    if output_mode not in MODOS_SAIDA:
+        raise ValueError(f"Modo de saída inválido: {output_mode} (use um de {MODOS_SAIDA})")
+    if metricas is not None:
+        metricas_execucao.formato_metricas(metricas)
+    if max_memoria is not None:
+        max_memoria = orcamento_memoria.interpretar_bytes(max_memoria)
+    parametros = dict(PARAMETROS_KERNEL if parametros_kernel is None else parametros_kernel)
+    if registros is not None:
+        parametros.setdefault("cores", True)
+    motor_deteccao.parametros_kernel(kernel, **parametros)
 
-AREA_MINIMA = 1  # igual ao paralelo
-ZOOM = 2          # também igual
-
-def detectar_areas_vermelhas_tile_RGB(tile, zoom=ZOOM):
-    imagem_ampliada = cv2.resize(tile, None, fx=zoom, fy=zoom, interpolation=cv2.INTER_CUBIC)
-    R, G, B = cv2.split(imagem_ampliada)
-    mascara = (R > 150) & (G < 100) & (B < 100)
-    mascara = mascara.astype(np.uint8) * 255
-    mascara = cv2.morphologyEx(mascara, cv2.MORPH_OPEN, np.ones((3, 3), np.uint8))
-    contornos, _ = cv2.findContours(mascara, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-    centros = []
-    for contorno in contornos:
-        if cv2.contourArea(contorno) >= AREA_MINIMA:
-            M = cv2.moments(contorno)
-            if M["m00"] != 0:
-                cx = int(M["m10"] / M["m00"]) // zoom
-                cy = int(M["m01"] / M["m00"]) // zoom
-                centros.append((cx, cy))
-    return centros
-
-def process_large_image_sequential(image_path, tile_size=1024, output_path="resultados_sequencial/resultado_incendios_sequencial.tiff", delay_per_tile_seconds=0):
     print(f"🔄 Carregando imagem: {image_path}")
     start = time.time()
 
-    ext = os.path.splitext(image_path)[1].lower()
-    if ext in [".tif", ".tiff"]:
-        with tiff.TiffFile(image_path) as tif:
-            page = tif.pages[0]
-            height, width = page.shape[:2]
-            img = tif.asarray(out='memmap')
-    else:
-        img = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
-        if img is None:
-            raise FileNotFoundError(f"Imagem não encontrada: {image_path}")
-        if img.ndim == 2:
-            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
-        elif img.shape[2] == 4:
-            img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
-        height, width = img.shape[:2]
+    # Sem cópia da cena: TIFF sem compressão é mapeado direto do arquivo, TIFF em tiles/strips
+    # decodifica só os segmentos de cada janela; JPG/PNG (e TIFF comprimido sem segmentos)
+    # continuam decodificados inteiros
+    leitor = leitor_tiles.abrir_leitor_local(image_path)
+    height, width = leitor["shape"][:2]
+    parametros.setdefault("ordem", leitor["ordem"])  # tifffile entrega RGB, cv2.imread entrega BGR
+    n_tiles = -(-height // tile_size) * -(-width // tile_size)
 
     print(f"📐 Dimensões da imagem: {width}x{height}")
+    print(f"📖 Leitura dos tiles: {leitor['modo']}")
 
-    tiles = []
-    for y in range(0, height, tile_size):
-        for x in range(0, width, tile_size):
-            tile = img[y:min(y+tile_size, height), x:min(x+tile_size, width)]
-            tiles.append((tile, x, y))
-
-    output = np.zeros((height, width, 3), dtype=np.uint8)
-    total_detectados = 0
-
-    print("▶️ Processando tiles sequencialmente...")
-    for tile, x, y in tqdm(tiles, desc="Tiles", unit="tile"):
-        centros = detectar_areas_vermelhas_tile_RGB(tile)
-        total_detectados += len(centros)
-        for cx, cy in centros:
-            cv2.circle(output, (cx + x, cy + y), 6, (0, 0, 255), 2)
-        time.sleep(delay_per_tile_seconds)
-
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    cv2.imwrite(output_path, output)
+    output = None
+    deteccoes = []
+    componentes = []
+    tiles_descartados = 0
+    coletor = metricas_execucao.novo_coletor() if metricas is not None else None
+    governo = None
+    escritor = None
+    antecipados = None
+    try:
+        if max_memoria is not None:
+            # Fixo: canvas do raster e a imagem decodificada em memória; o principal é o único worker
+            fixo = height * width * 3 if output_mode == MODO_RASTER else 0
+            if leitor["modo"] == leitor_tiles.MODO_COMPARTILHADA:
+                fixo += leitor["imagem"].nbytes
+            canais = leitor["shape"][2] if len(leitor["shape"]) > 2 else 1
+            governo = orcamento_memoria.governar(max_memoria, fixo, kernel, parametros, tile_size, 1, canais, halo,
+                                                 processos=False, em_voo=1 + profundidade_leitura,
+                                                 em_voo_minimo=1 + profundidade_leitura)
+            tile_size = governo["tile_size"]
+            n_tiles = -(-height // tile_size) * -(-width // tile_size)
+            print(f"🧮 Orçamento de memória {max_memoria / 1024**2:.0f} MB: " +
+                  (", ".join(governo["ajustes"]) if governo["ajustes"] else "cabe sem ajustes"))
+
+        # Só o modo raster aloca a cena inteira; os demais guardam apenas os centros globais
+        output = np.zeros((height, width, 3), dtype=np.uint8) if output_mode == MODO_RASTER else None
+        if registros is not None:
+            escritor = registros_deteccoes.abrir_registros(
+                registros, registros_deteccoes.cena_da_imagem(image_path), registros_deteccoes.georreferencia(image_path)
+            )
+
+        print("▶️ Processando tiles sequencialmente...")
+        t0 = time.perf_counter()
+        tiles = tiles_sob_demanda(leitor, tile_size, halo, coletor is not None or profundidade_leitura > 0)
+        if profundidade_leitura > 0:
+            antecipacao = leitura_antecipada.nova_estatistica(profundidade_leitura)
+            tiles = antecipados = leitura_antecipada.antecipar(tiles, profundidade_leitura, antecipacao)
+        if coletor is not None:
+            # Com leitura antecipada a etapa "leitura" é só a espera que sobrou para a detecção
+            tiles = metricas_execucao.cronometrando(coletor, "leitura", tiles)
+        for tile, x, y, nucleo in tqdm(tiles, total=n_tiles, desc="Tiles", unit="tile"):
+            if coletor is not None:
+                metricas_execucao.iniciar_tile()
+            resultado, descartado = motor_deteccao.processar_tile(tile, nucleo, kernel, prefiltro, **parametros)
+            if coletor is not None:
+                metricas_execucao.acrescentar_tile(coletor, metricas_execucao.encerrar_tile())
+            tiles_descartados += descartado
+            if nucleo is None:
+                deteccoes.extend((f["x"] + x, f["y"] + y) for f in resultado)
+                if escritor is not None:
+                    with metricas_execucao.medindo(coletor, "registros"):
+                        registros_deteccoes.escrever_registros(escritor, registros_deteccoes.focos_globais(resultado, x, y))
+            elif resultado is not None:
+                componentes.append(resultado)
+            if delay_per_tile_seconds:
+                time.sleep(delay_per_tile_seconds)  # só para simulação; medições usam 0
+        tempo_tiles = time.perf_counter() - t0
+        if antecipados is not None:
+            print(leitura_antecipada.resumo_antecipacao(antecipacao))
+
+        if halo is not None:
+            with metricas_execucao.medindo(coletor, "fusao"):
+                focos = motor_deteccao.fundir(componentes, tile_size, kernel, **parametros)
+            deteccoes = [(f["x"], f["y"]) for f in focos]
+            if escritor is not None:
+                registros_deteccoes.escrever_registros(escritor, registros_deteccoes.atribuir_tiles(focos, tile_size))
+            print(f"🧩 Fusão entre tiles: {sum(c['n'] for c in componentes)} componentes -> {len(focos)} focos")
+    finally:
+        if escritor is not None:
+            n_registros = registros_deteccoes.fechar_registros(escritor)
+            print(f"🗒️ {n_registros} registros gravados em: {registros}")
+        if antecipados is not None:
+            antecipados.close()  # encerra a thread leitora antes de fechar o arquivo
+        leitor_tiles.fechar_leitor(leitor)
+
+    if prefiltro:
+        print(f"⏭️ Pré-filtro: {tiles_descartados}/{n_tiles} tiles descartados ({tiles_descartados / n_tiles:.1%})")
+
+    total_detectados = len(deteccoes)
+    with metricas_execucao.medindo(coletor, "overlay"):
+        if output is not None:
+            for cx, cy in deteccoes:
+                cv2.circle(output, (int(round(cx)), int(round(cy))), 6, (0, 0, 255), 2)
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            cv2.imwrite(output_path, output)
+        elif output_mode != MODO_NENHUM:
+            output_path = salvar_saida(output_mode, output_path, deteccoes, height, width)
+            print(f"💾 Saída ({output_mode}) gravada em: {output_path}")
+
+    if coletor is not None:
+        metricas_execucao.encerrar_coletor(coletor, tempo_tiles)
+        print(metricas_execucao.resumo_metricas(coletor))
+        print(f"📈 Métricas gravadas em: {metricas_execucao.salvar_metricas(coletor, metricas)}")
+    if governo is not None:
+        print(orcamento_memoria.resumo_memoria(governo))
 
     elapsed = time.time() - start
     print(f"✅ Concluído: {total_detectados} focos detectados em {elapsed:.2f} segundos.")
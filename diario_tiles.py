@@ -0,0 +1,107 @@
+import json
+import os
+import pickle
+import struct
+import time
+import zlib
+import numpy as np
+
+# ==== DIÁRIO DE TILES CONCLUÍDOS (checkpoint / retomada) ====
+# Arquivo só de acréscimo: um cabeçalho com a assinatura da execução e, para cada tile
+# concluído, o resultado devolvido pelo worker (posição, focos ou componentes, descarte
+# e bytes lidos). Cada registro tem tamanho e CRC32; depois de uma queda o registro
+# incompleto do fim é descartado e o arquivo truncado no último registro válido.
+# A execução retomada reaplica os registros do diário como se os tiles tivessem acabado
+# de terminar, então a saída é a mesma de uma execução sem interrupção.
+
+FSYNC_INTERVALO = 2.0   # segundos entre fsyncs (cada registro já vai para o SO no flush)
+_CABECALHO_REGISTRO = struct.Struct("<II")  # tamanho do pickle, CRC32
+
+# ==== ASSINATURA DA EXECUÇÃO ====
+# Tudo que muda o resultado de um tile: o arquivo (tamanho e data), a grade e o kernel
+def assinatura_execucao(image_path, tile_size, halo, kernel, parametros, prefiltro):
+    info = os.stat(image_path)
+    dados = {
+        "imagem": os.path.abspath(image_path),
+        "tamanho": info.st_size,
+        "modificado": info.st_mtime_ns,
+        "tile_size": tile_size,
+        "halo": halo,
+        "kernel": kernel,
+        "parametros": {k: parametros[k] for k in sorted(parametros)},
+        "prefiltro": prefiltro,
+    }
+    return json.dumps(dados, sort_keys=True, default=lambda v: v.tolist() if isinstance(v, np.ndarray) else str(v))
+
+# ==== LEITURA DOS REGISTROS VÁLIDOS ====
+def _ler_registros(arquivo):
+    registros = []
+    fim_valido = 0
+    while True:
+        cabecalho = arquivo.read(_CABECALHO_REGISTRO.size)
+        if len(cabecalho) < _CABECALHO_REGISTRO.size:
+            break
+        tamanho, crc = _CABECALHO_REGISTRO.unpack(cabecalho)
+        dados = arquivo.read(tamanho)
+        if len(dados) < tamanho or zlib.crc32(dados) != crc:
+            break  # escrita interrompida no meio do registro
+        registros.append(pickle.loads(dados))
+        fim_valido = arquivo.tell()
+    return registros, fim_valido
+
+# ==== ABERTURA ====
+# Retorna (diario, resultados já concluídos). Um diário de outra execução (outra imagem,
+# tile_size, halo ou parâmetros) não é reaproveitado: ValueError em vez de misturar.
+def abrir_diario(caminho, assinatura):
+    concluidos = []
+    if os.path.exists(caminho):
+        with open(caminho, "rb") as f:
+            registros, fim_valido = _ler_registros(f)
+        if registros:
+            if registros[0] != assinatura:
+                raise ValueError(f"O diário {caminho} é de outra execução (imagem ou parâmetros diferentes); "
+                                 "apague-o para recomeçar do zero")
+            concluidos = registros[1:]
+        arquivo = open(caminho, "r+b")
+        arquivo.truncate(fim_valido)
+        arquivo.seek(fim_valido)
+    else:
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        arquivo = open(caminho, "wb")
+
+    diario = {"caminho": caminho, "arquivo": arquivo, "ultimo_fsync": time.monotonic()}
+    if arquivo.tell() == 0:
+        registrar(diario, assinatura)
+        _sincronizar(diario)
+    return diario, concluidos
+
+# ==== ESCRITA ====
+def _sincronizar(diario):
+    diario["arquivo"].flush()
+    os.fsync(diario["arquivo"].fileno())
+    diario["ultimo_fsync"] = time.monotonic()
+
+def registrar(diario, registro):
+    dados = pickle.dumps(registro, protocol=pickle.HIGHEST_PROTOCOL)
+    diario["arquivo"].write(_CABECALHO_REGISTRO.pack(len(dados), zlib.crc32(dados)) + dados)
+    diario["arquivo"].flush()
+    if time.monotonic() - diario["ultimo_fsync"] >= FSYNC_INTERVALO:
+        _sincronizar(diario)
+
+# Repassa os resultados de uma fonte gravando cada um no diário antes de entregá-lo
+def registrando(diario, resultados):
+    for resultado in resultados:
+        registrar(diario, resultado)
+        yield resultado
+
+def fechar_diario(diario):
+    _sincronizar(diario)
+    diario["arquivo"].close()
+
+# Execução concluída e saída gravada: o diário não é mais necessário
+def remover_diario(diario):
+    if not diario["arquivo"].closed:
+        diario["arquivo"].close()
+    os.remove(diario["caminho"])
@@ -0,0 +1,197 @@
+import math
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from statistics import NormalDist
+import numpy as np
+import tifffile as tiff
+import motor_deteccao
+import leitor_tiles
+import agendador_tiles
+
+# ==== ESTIMATIVA POR AMOSTRAGEM ESTRATIFICADA ====
+# Para triagem: em vez de detectar todos os tiles de uma cena enorme, detecta uma fração
+# deles e estima o total de focos com um intervalo de confiança.
+#   1. Visão geral barata: a fração de pixels candidatos (regra de cor do kernel, sem
+#      ampliação nem morfologia) de cada tile, medida no menor nível da pirâmide do TIFF
+#      que ainda tenha alguns pixels por tile ou, sem pirâmide, em LINHAS_VISAO linhas de
+#      cada tile (no modo segmentos, no segmento central do tile).
+#   2. Estratos: tiles sem candidato nenhum num estrato; os demais em faixas de igual
+#      tamanho pela fração de candidatos.
+#   3. Amostra aleatória em cada estrato, proporcional ao tamanho dele (mínimo de
+#      AMOSTRA_MINIMA_ESTRATO, para estimar a variância), detectada por completo.
+#   4. Total = soma de N_h x média do estrato; variância da amostragem sem reposição,
+#      V = soma de N_h² (1 - n_h/N_h) s_h² / n_h, e intervalo normal com a confiança pedida.
+#      Com poucos tiles por estrato s_h² pode sair 0 por acaso; como focos por tile são
+#      contagens (variância ao menos a da Poisson), s_h² nunca fica abaixo da média.
+# Com fracao=1 todos os tiles são detectados e o resultado é exato (intervalo nulo).
+
+KERNEL = "rgb"
+PARAMETROS_KERNEL = {}  # ajustes aos padrões registrados do kernel
+FRACAO_PADRAO = 0.1
+ESTRATOS = 4
+CONFIANCA = 0.95
+LINHAS_VISAO = 16             # linhas lidas por tile na visão geral sem pirâmide
+PIXELS_NIVEL_POR_TILE = 16    # nível da pirâmide com pelo menos 16x16 pixels por tile
+AMOSTRA_MINIMA_ESTRATO = 3
+
+# ==== VISÃO GERAL ====
+def _candidatos(amostra, kernel, parametros):
+    if amostra.size == 0:
+        return 0.0
+    amostra = motor_deteccao.garantir_3_canais(np.ascontiguousarray(amostra))
+    sem_extras = {k: v for k, v in (("zoom", 1), ("abrir", False)) if k in motor_deteccao.parametros_kernel(kernel)}
+    mascara = motor_deteccao.calcular_mascara(amostra, kernel, **dict(parametros, **sem_extras))
+    return np.count_nonzero(mascara) / (amostra.shape[0] * amostra.shape[1])
+
+# Menor nível reduzido da pirâmide com pelo menos PIXELS_NIVEL_POR_TILE pixels por tile; None sem pirâmide
+def _nivel_piramide(caminho, tile_size):
+    if not caminho.lower().endswith(leitor_tiles.EXTENSOES_TIFF):
+        return None
+    with tiff.TiffFile(caminho) as tif:
+        niveis = tif.series[0].levels
+        altura = niveis[0].shape[0]
+        for nivel in reversed(niveis[1:]):
+            if tile_size * nivel.shape[0] / altura >= PIXELS_NIVEL_POR_TILE:
+                return nivel.asarray()
+    return None
+
+def visao_geral(leitor, caminho, posicoes, tile_size, kernel, parametros):
+    height, width = leitor["shape"][:2]
+    nivel = _nivel_piramide(caminho, tile_size)
+    if nivel is not None:
+        fy, fx = nivel.shape[0] / height, nivel.shape[1] / width
+        return np.array([
+            _candidatos(nivel[int(y * fy):max(int(y * fy) + 1, int(min(y + tile_size, height) * fy)),
+                              int(x * fx):max(int(x * fx) + 1, int(min(x + tile_size, width) * fx))], kernel, parametros)
+            for x, y in posicoes
+        ])
+
+    notas = []
+    for x, y in posicoes:
+        y1, x1 = min(y + tile_size, height), min(x + tile_size, width)
+        if leitor["modo"] == leitor_tiles.MODO_SEGMENTOS:
+            # Só o segmento que contém o centro do tile é decodificado
+            sh, sw = leitor["segmento"]
+            cy, cx = (y + y1) // 2 // sh * sh, (x + x1) // 2 // sw * sw
+            amostra = leitor_tiles.ler_janela(leitor, max(cy, y), min(cy + sh, y1), max(cx, x), min(cx + sw, x1))
+        else:
+            linhas = np.unique(np.linspace(y, y1 - 1, LINHAS_VISAO).astype(int))
+            amostra = leitor["imagem"][linhas, x:x1]
+        notas.append(_candidatos(amostra, kernel, parametros))
+    return np.array(notas)
+
+# ==== ESTRATOS E ALOCAÇÃO ====
+# Retorna a lista de estratos, cada um um array de índices de tiles
+def estratificar(notas, n_estratos=ESTRATOS):
+    indices = np.arange(len(notas))
+    sem_candidatos = indices[notas == 0]
+    com_candidatos = indices[notas > 0]
+    com_candidatos = com_candidatos[np.argsort(notas[com_candidatos], kind="stable")]
+    faixas = [f for f in np.array_split(com_candidatos, max(1, n_estratos - 1)) if len(f)]
+    return [e for e in [sem_candidatos] + faixas if len(e)]
+
+def alocar(estratos, fracao):
+    total = sum(len(e) for e in estratos)
+    n = max(1, math.ceil(fracao * total))
+    return [min(len(e), max(AMOSTRA_MINIMA_ESTRATO, round(n * len(e) / total))) for e in estratos]
+
+# ==== ESTIMADOR ====
+# contagens: por estrato, os focos dos tiles amostrados; tamanhos: N_h
+def estimar_total(contagens, tamanhos, confianca=CONFIANCA):
+    total = variancia = 0.0
+    for amostra, n_estrato in zip(contagens, tamanhos):
+        amostra = np.asarray(amostra, dtype=float)
+        total += n_estrato * amostra.mean()
+        if len(amostra) < n_estrato:
+            s2 = max(amostra.var(ddof=1), amostra.mean())
+            variancia += n_estrato ** 2 * (1 - len(amostra) / n_estrato) * s2 / len(amostra)
+    margem = NormalDist().inv_cdf((1 + confianca) / 2) * math.sqrt(variancia)
+    observado = sum(sum(amostra) for amostra in contagens)  # o total nunca é menor que o já visto
+    return total, (max(observado, total - margem), total + margem)
+
+# ==== EXECUÇÃO ====
+# Tiles amostrados em threads (o OpenCV solta o GIL), cada uma com o seu clone do leitor,
+# como no backend "threads" do detectorparalelo2.0
+def _detectar_amostra(leitor, descritor, kernel, parametros, tiles, tile_size, num_threads):
+    height, width = leitor["shape"][:2]
+    local = threading.local()
+    clones = []
+    lock = threading.Lock()
+
+    def contar(posicao):
+        clone = getattr(local, "leitor", None)
+        if clone is None:
+            clone = local.leitor = leitor_tiles.clonar_leitor(leitor, descritor)
+            with lock:
+                clones.append(clone)
+        x, y = posicao
+        tile = leitor_tiles.ler_janela(clone, y, min(y + tile_size, height), x, min(x + tile_size, width))
+        focos, _ = motor_deteccao.processar_tile(tile, None, kernel, True, **parametros)
+        return len(focos)
+
+    try:
+        with ThreadPoolExecutor(max_workers=num_threads) as executor:
+            return list(executor.map(contar, tiles))
+    finally:
+        for clone in clones:
+            if clone["modo"] == leitor_tiles.MODO_SEGMENTOS:
+                leitor_tiles.fechar_leitor(clone)
+
+# Retorna {"estimativa", "intervalo", "confianca", "tiles", "amostrados", "estratos", "tempo_s"}
+def estimar_focos(image_path, fracao=FRACAO_PADRAO, tile_size=1024, kernel=KERNEL, parametros_kernel=None,
+                  confianca=CONFIANCA, n_estratos=ESTRATOS, semente=0, modo_leitura=None, num_threads=None):
+    if not 0 < fracao <= 1:
+        raise ValueError(f"Fração de amostragem inválida: {fracao} (use 0 < fração <= 1)")
+    if not 0 < confianca < 1:
+        raise ValueError(f"Confiança inválida: {confianca} (use 0 < confiança < 1)")
+    parametros = dict(PARAMETROS_KERNEL if parametros_kernel is None else parametros_kernel)
+    motor_deteccao.parametros_kernel(kernel, **parametros)
+    num_threads = num_threads or agendador_tiles.nucleos_disponiveis()
+    inicio = time.perf_counter()
+
+    descritor, memoria = leitor_tiles.preparar_leitura(image_path, modo_leitura)
+    parametros.setdefault("ordem", descritor["ordem"])
+    leitor = leitor_tiles.abrir_leitor(descritor)
+    try:
+        height, width = descritor["shape"][:2]
+        posicoes = [(x, y) for y in range(0, height, tile_size) for x in range(0, width, tile_size)]
+        notas = visao_geral(leitor, image_path, posicoes, tile_size, kernel, parametros)
+        tempo_visao = time.perf_counter() - inicio
+
+        estratos = estratificar(notas, n_estratos)
+        sorteio = np.random.default_rng(semente)
+        escolhidos = [np.sort(sorteio.choice(e, n, replace=False)) for e, n in zip(estratos, alocar(estratos, fracao))]
+        contagens = _detectar_amostra(leitor, descritor, kernel, parametros,
+                                      [posicoes[i] for e in escolhidos for i in e], tile_size, num_threads)
+    finally:
+        leitor_tiles.fechar_leitor(leitor)
+        leitor_tiles.liberar_leitura(memoria)
+
+    por_estrato, i = [], 0
+    for e in escolhidos:
+        por_estrato.append(contagens[i:i + len(e)])
+        i += len(e)
+    total, intervalo = estimar_total(por_estrato, [len(e) for e in estratos], confianca)
+    resultado = {
+        "estimativa": total,
+        "intervalo": intervalo,
+        "confianca": confianca,
+        "tiles": len(posicoes),
+        "amostrados": len(contagens),
+        "estratos": [{"tiles": len(e), "amostrados": len(c), "focos_amostra": int(sum(c))}
+                     for e, c in zip(estratos, por_estrato)],
+        "tempo_s": time.perf_counter() - inicio,
+    }
+    print(f"🎯 Estimativa: {total:.0f} focos (IC {confianca:.0%}: {intervalo[0]:.0f} a {intervalo[1]:.0f}) | "
+          f"{len(contagens)}/{len(posicoes)} tiles detectados em {len(estratos)} estratos | "
+          f"visão geral {tempo_visao:.2f}s, total {resultado['tempo_s']:.2f}s")
+    return resultado
+
+# python estimativa_amostral.py cena.tif [fração]
+if __name__ == "__main__":
+    try:
+        estimar_focos(sys.argv[1], float(sys.argv[2]) if len(sys.argv) > 2 else FRACAO_PADRAO)
+    except (IndexError, FileNotFoundError, ValueError) as e:
+        print(f"❌ Erro: {e}. Uso: python estimativa_amostral.py cena.tif [fração]")
@@ -1,7 +1,21 @@
 import cv2
 import numpy as np
 import os
-from concurrent.futures import ProcessPoolExecutor
+import sys
+import time
+import json
+import math
+import contextlib
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import motor_deteccao
+import anel_memoria
+import cache_tiles
+import leitor_tiles
+import orcamento_memoria
 
 PASTA_IMAGENS = "imagens"
 PASTA_RESULTADOS = "resultados"
@@ -12,43 +26,461 @@ VERMELHO_BAIXO1 = np.array([0, 100, 100])
 VERMELHO_ALTO1 = np.array([10, 255, 255])
 VERMELHO_BAIXO2 = np.array([170, 100, 100])
 VERMELHO_ALTO2 = np.array([179, 255, 255])
+PARAMETROS_KERNEL = dict(
+    ordem="BGR", abrir=False,
+    baixo1=VERMELHO_BAIXO1, alto1=VERMELHO_ALTO1,
+    baixo2=VERMELHO_BAIXO2, alto2=VERMELHO_ALTO2,
+)
+
+# Cache em disco das máscaras por conteúdo (ver cache_tiles.py); None desliga. A chave é
+# cada bloco de até TILE_CACHE x TILE_CACHE da imagem (ou do tile, no modo por tiles):
+# uma imagem com uma região alterada só recalcula os blocos que mudaram
+PASTA_CACHE = None
+TILE_CACHE = 512
+
+# Modo por tiles: todas as imagens da pasta viram unidades (imagem, tile) numa fila só,
+# das maiores imagens para as menores; uma cena grande ocupa todos os workers em vez de
+# prender um só enquanto os outros ficam parados
+TILE_LOTE = 2048          # maior tile; sem tile_size, cada imagem rende ao menos um tile por worker
+TILE_LOTE_MINIMO = 256
+MEMORIA_EM_VOO = 512 * 1024**2  # bytes de imagens decodificadas (e máscaras) no principal ao mesmo tempo
+TILES_NA_FILA_POR_WORKER = 2    # nova imagem entra enquanto houver menos tiles pendentes que isso x workers
+# Com max_memoria, parte do orçamento reservada às imagens abertas no principal (limitada
+# a MEMORIA_EM_VOO); o resto vai para os workers via orcamento_memoria.governar
+FRACAO_ORCAMENTO_IMAGENS = 0.5
+
+# Modo serviço (python main.py servico): observa PASTA_IMAGENS com o pool já aquecido
+INTERVALO_SERVICO = 5.0  # segundos entre varreduras da pasta
+ARQUIVO_ESTADO = os.path.join(PASTA_RESULTADOS, "estado_servico.json")
+EXTENSOES_IMAGENS = ('.jpg', '.jpeg', '.png')
 
-def detectar_fogo_vermelho(imagem_path):
+# Retorna os pixels de fogo
+# so_contagem: só conta os pixels, sem montar nem gravar a imagem de resultado
+def detectar_fogo_vermelho(imagem_path, pasta_cache=None, so_contagem=False):
+    return _detectar_fogo_vermelho(imagem_path, pasta_cache, so_contagem)[0]
+
+# Retorna (pixels de fogo, acertos no cache: um bool por bloco consultado, vazio sem cache)
+def _detectar_fogo_vermelho(imagem_path, pasta_cache=None, so_contagem=False):
     imagem_bgr = cv2.imread(imagem_path)
     if imagem_bgr is None:
         print(f"[ERRO] Imagem inválida: {imagem_path}")
-        return 0
+        return 0, []
+    return _detectar_fogo_vermelho_imagem(imagem_bgr, imagem_path, pasta_cache, so_contagem)
+
+# Máscara para tons de vermelho (kernel HSV do motor, sem morfologia) e os acertos no cache
+def _mascara_fogo(imagem_bgr, pasta_cache):
+    if pasta_cache is None:
+        return motor_deteccao.calcular_mascara(imagem_bgr, "hsv", **PARAMETROS_KERNEL), []
+    cache = cache_tiles.abrir_cache(pasta_cache)
+    contexto = cache_tiles.contexto_deteccao("hsv", PARAMETROS_KERNEL)
+    height, width = imagem_bgr.shape[:2]
+    mascara = np.empty((height, width), dtype=np.uint8)
+    acertos = []
+    for y in range(0, height, TILE_CACHE):
+        for x in range(0, width, TILE_CACHE):
+            bloco = imagem_bgr[y:y + TILE_CACHE, x:x + TILE_CACHE]
+            # A máscara é guardada com 1 bit por pixel
+            bits, acerto = cache_tiles.obter(
+                cache, cache_tiles.chave_tile(bloco, contexto),
+                lambda: np.packbits(motor_deteccao.calcular_mascara(bloco, "hsv", **PARAMETROS_KERNEL) > 0),
+            )
+            h, w = bloco.shape[:2]
+            mascara[y:y + h, x:x + w] = np.unpackbits(bits, count=h * w).reshape(h, w) * np.uint8(255)
+            acertos.append(acerto)
+    return mascara, acertos
 
-    imagem_hsv = cv2.cvtColor(imagem_bgr, cv2.COLOR_BGR2HSV)
+# Também chamada pelo modo anel, com a imagem numa vista da memória compartilhada
+def detectar_fogo_vermelho_imagem(imagem_bgr, imagem_path, pasta_cache=None, so_contagem=False):
+    return _detectar_fogo_vermelho_imagem(imagem_bgr, imagem_path, pasta_cache, so_contagem)[0]
 
-    # Máscaras para tons de vermelho
-    mascara1 = cv2.inRange(imagem_hsv, VERMELHO_BAIXO1, VERMELHO_ALTO1)
-    mascara2 = cv2.inRange(imagem_hsv, VERMELHO_BAIXO2, VERMELHO_ALTO2)
-    mascara_fogo = cv2.bitwise_or(mascara1, mascara2)
+def _detectar_fogo_vermelho_imagem(imagem_bgr, imagem_path, pasta_cache=None, so_contagem=False):
+    mascara_fogo, acertos = _mascara_fogo(imagem_bgr, pasta_cache)
 
     total_fogo = cv2.countNonZero(mascara_fogo)
 
     # Destacar os focos
-    resultado = cv2.bitwise_and(imagem_bgr, imagem_bgr, mask=mascara_fogo)
+    if not so_contagem:
+        resultado = cv2.bitwise_and(imagem_bgr, imagem_bgr, mask=mascara_fogo)
+        gravar_resultado(imagem_path, resultado)
+
+    print(f"[INFO] {os.path.basename(imagem_path)}: {total_fogo} focos de incêndio detectados.")
+    return total_fogo, acertos
+
+# Grava num temporário (mesma extensão, para o cv2 escolher o formato) e renomeia: quem
+# observa PASTA_RESULTADOS nunca vê um resultado pela metade
+def gravar_resultado(imagem_path, resultado):
     nome_arquivo = os.path.basename(imagem_path)
     caminho_saida = os.path.join(PASTA_RESULTADOS, f"vermelho_{nome_arquivo}")
-    cv2.imwrite(caminho_saida, resultado)
+    temporario = os.path.join(PASTA_RESULTADOS, f".tmp_{os.getpid()}_vermelho_{nome_arquivo}")
+    if not cv2.imwrite(temporario, resultado):
+        raise OSError(f"Falha ao gravar {caminho_saida}")
+    os.replace(temporario, caminho_saida)
+    return caminho_saida
+
+# Modo anel: o processo principal decodifica cada imagem e os workers recebem só o
+# handle do slot de memória compartilhada (ver anel_memoria.py)
+def imagens_decodificadas(imagens):
+    for imagem_path in imagens:
+        imagem_bgr = cv2.imread(imagem_path)
+        if imagem_bgr is None:
+            print(f"[ERRO] Imagem inválida: {imagem_path}")
+            continue
+        yield (lambda destino, img=imagem_bgr: np.copyto(destino, img)), imagem_bgr.shape, imagem_bgr.dtype, imagem_path
+
+# ==== MODO POR TILES: FILA ÚNICA COM OS TILES DE TODAS AS IMAGENS ====
+# O processo principal decodifica cada imagem uma vez em memória compartilhada
+# (leitor_tiles) e enfileira os tiles dela; os workers leem só a janela do tile e devolvem
+# a contagem e a máscara em 1 bit por pixel. A máscara HSV (sem morfologia) é pixel a
+# pixel, então a soma dos tiles é exatamente a contagem da imagem inteira.
+_leitores = {}  # nome da memória compartilhada -> leitor aberto neste worker
+
+# em_voo: nomes das memórias das imagens ainda abertas no principal quando o tile foi
+# enfileirado. O worker desanexa as que não estão mais lá (concluídas, ou de um lote
+# anterior do serviço): sem isso, segmentos já liberados pelo principal continuariam
+# ocupando memória enquanto algum worker os mantivesse anexados
+def _leitor_imagem(descritor, em_voo):
+    for nome in [n for n in _leitores if n not in em_voo]:
+        leitor_tiles.fechar_leitor(_leitores.pop(nome))
+    leitor = _leitores.get(descritor["memoria"])
+    if leitor is None:
+        leitor = _leitores[descritor["memoria"]] = leitor_tiles.abrir_leitor(descritor)
+    return leitor
+
+# Maior múltiplo de 64 (entre TILE_LOTE_MINIMO e maximo) que ainda divide a imagem em
+# pelo menos num_workers tiles: imagens pequenas também ocupam todos os workers
+def tile_da_imagem(height, width, num_workers, maximo=TILE_LOTE):
+    lado = int(math.sqrt(height * width / num_workers)) // 64 * 64
+    return max(min(TILE_LOTE_MINIMO, maximo), min(maximo, lado))
+
+# Orçamento do modo por tiles: o principal segura as imagens abertas e as máscaras delas
+# (até a parte FRACAO_ORCAMENTO_IMAGENS do orçamento); cada worker, o interpretador, um
+# tile e o trabalho do kernel. O governador reduz workers e o maior tile para caber.
+def governar_lote(max_memoria, tile_size, num_workers):
+    orcamento = orcamento_memoria.interpretar_bytes(max_memoria)
+    imagens = min(MEMORIA_EM_VOO, int(orcamento * FRACAO_ORCAMENTO_IMAGENS))
+    governo = orcamento_memoria.governar(orcamento, imagens, "hsv", PARAMETROS_KERNEL, tile_size or TILE_LOTE, num_workers)
+    governo["imagens"] = imagens
+    if governo["ajustes"]:
+        print(f"🧮 Orçamento de memória {orcamento / 1024**2:.0f} MB: {', '.join(governo['ajustes'])}")
+    return governo
+
+# Retorna (x, y, pixels de fogo, máscara em bits ou None com so_contagem, acertos no cache, segundos)
+def detectar_fogo_tile(descritor, x, y, tile_size, pasta_cache=None, so_contagem=False, em_voo=None):
+    t0 = time.perf_counter()
+    leitor = _leitor_imagem(descritor, em_voo or {descritor["memoria"]})
+    height, width = descritor["shape"][:2]
+    tile = motor_deteccao.garantir_3_canais(
+        leitor_tiles.ler_janela(leitor, y, min(y + tile_size, height), x, min(x + tile_size, width))
+    )
+    mascara, acertos = _mascara_fogo(tile, pasta_cache)
+    bits = None if so_contagem else np.packbits(mascara > 0)
+    return x, y, cv2.countNonZero(mascara), bits, acertos, time.perf_counter() - t0
+
+# Imagem completa: junta a máscara dos tiles e grava o resultado como no modo por imagem;
+# com algum tile em erro só libera a memória
+def _concluir_imagem(estado):
+    try:
+        if estado["erro"] is None and estado["mascara"] is not None:
+            imagem_bgr = motor_deteccao.garantir_3_canais(estado["leitor"]["imagem"])
+            resultado = cv2.bitwise_and(imagem_bgr, imagem_bgr, mask=estado["mascara"])
+            gravar_resultado(estado["caminho"], resultado)
+            del imagem_bgr, resultado
+    finally:
+        leitor_tiles.fechar_leitor(estado["leitor"])
+        leitor_tiles.liberar_leitura(estado["memoria"])
+    if estado["erro"] is None:
+        print(f"[INFO] {os.path.basename(estado['caminho'])}: {estado['total']} focos de incêndio detectados.")
+
+def _tamanho_arquivo(caminho):
+    try:
+        return os.path.getsize(caminho)
+    except OSError:
+        return -1  # removido depois da varredura: vai para o fim e sai como erro na decodificação
 
-    print(f"[INFO] {nome_arquivo}: {total_fogo} focos de incêndio detectados.")
-    return total_fogo
+def _receber_tile(estado, resultado):
+    x, y, total, bits, acertos, segundos = resultado
+    if bits is not None:
+        h, w = min(estado["tile_size"], estado["height"] - y), min(estado["tile_size"], estado["width"] - x)
+        estado["mascara"][y:y + h, x:x + w] = np.unpackbits(bits, count=h * w).reshape(h, w) * np.uint8(255)
+    estado["total"] += total
+    estado["faltam"] -= 1
+    estado["acertos"].extend(acertos)
+    return segundos
 
-def main():
+# Retorna uma tupla (caminho, pixels de fogo ou None se inválida, acertos no cache,
+# consultas ao cache, time.time() da gravação) por imagem, na ordem em que terminam.
+# tile_size: None escolhe por imagem (tile_da_imagem)
+# executor: pool já aberto (serviço); None abre um só para este lote
+# so_contagem: os workers não devolvem a máscara e nenhuma imagem de resultado é gravada
+# max_memoria: orçamento do lote (ex.: "4GB", ver governar_lote); None = sem limite
+# Cada imagem é decodificada antes de entrar e só entra enquanto houver menos de
+# TILES_NA_FILA_POR_WORKER x workers tiles pendentes e as imagens abertas somadas a ela
+# couberem em MEMORIA_EM_VOO (uma imagem sozinha sempre entra, mesmo maior que o limite;
+# com max_memoria ela sai como erro, porque não caberia no orçamento)
+def processar_lote_por_tiles(imagens, tile_size=None, pasta_cache=None, num_workers=None, executor=None, so_contagem=False,
+                             max_memoria=None):
+    num_workers = num_workers or os.cpu_count() or 1
+    governo = None
+    limite, maior_tile = MEMORIA_EM_VOO, TILE_LOTE
+    if max_memoria is not None:
+        governo = governar_lote(max_memoria, tile_size, num_workers)
+        num_workers, limite, maior_tile = governo["workers"], governo["imagens"], governo["tile_size"]
+        if tile_size is not None:
+            tile_size = maior_tile
+    # Tamanho do arquivo como estimativa do tamanho da imagem: as maiores entram primeiro na fila
+    imagens = sorted(imagens, key=_tamanho_arquivo, reverse=True)
+    estados = {}    # futuro -> estado da imagem
+    abertas = []    # estados das imagens ainda com tiles pendentes
+    resultados = []
+    trabalho = 0.0
+    inicio = time.perf_counter()
+
+    # Um erro num tile (ou ao gravar) marca só a imagem dele; pool quebrado interrompe o lote
+    def receber(prontos):
+        nonlocal trabalho
+        for futuro in prontos:
+            estado = estados.pop(futuro)
+            try:
+                trabalho += _receber_tile(estado, futuro.result())
+            except BrokenProcessPool:
+                raise
+            except Exception as erro:
+                estado["faltam"] -= 1
+                estado["erro"] = estado["erro"] or erro
+            if estado["faltam"] == 0:
+                abertas.remove(estado)
+                try:
+                    _concluir_imagem(estado)
+                except Exception as erro:
+                    estado["erro"] = erro
+                if estado["erro"] is not None:
+                    print(f"[ERRO] {estado['caminho']}: {estado['erro']}")
+                    resultados.append((estado["caminho"], None, 0, 0, time.time()))
+                else:
+                    resultados.append((estado["caminho"], estado["total"], sum(estado["acertos"]),
+                                       len(estado["acertos"]), time.time()))
+
+    # Imagem decodificada mais a máscara que o principal monta para ela
+    def ocupacao(descritor):
+        height, width = descritor["shape"][:2]
+        return descritor["bytes_dados"] + (0 if so_contagem else height * width)
+
+    def cabe(descritor):
+        em_voo = sum(e["bytes"] for e in abertas)
+        return not abertas or (len(estados) < TILES_NA_FILA_POR_WORKER * num_workers
+                               and em_voo + ocupacao(descritor) <= limite)
+
+    proprio = executor is None
+    if proprio:
+        executor = ProcessPoolExecutor(max_workers=num_workers)
+    with contextlib.ExitStack() as pilha:
+        if proprio:
+            pilha.enter_context(executor)
+        try:
+            for imagem_path in imagens:
+                try:
+                    descritor, memoria = leitor_tiles.preparar_leitura(imagem_path, leitor_tiles.MODO_COMPARTILHADA)
+                except Exception as erro:
+                    print(f"[ERRO] Imagem inválida: {imagem_path} ({erro})")
+                    resultados.append((imagem_path, None, 0, 0, time.time()))
+                    continue
+                if governo is not None and ocupacao(descritor) > limite:
+                    leitor_tiles.liberar_leitura(memoria)
+                    print(f"[ERRO] {imagem_path}: {ocupacao(descritor) / 1024**2:.0f} MB não cabem nos "
+                          f"{limite / 1024**2:.0f} MB do orçamento reservados às imagens")
+                    resultados.append((imagem_path, None, 0, 0, time.time()))
+                    continue
+                try:
+                    while not cabe(descritor):
+                        prontos, _ = wait(list(estados), return_when=FIRST_COMPLETED)
+                        receber(prontos)
+                except BaseException:
+                    leitor_tiles.liberar_leitura(memoria)
+                    raise
+                height, width = descritor["shape"][:2]
+                lado = tile_size or tile_da_imagem(height, width, num_workers, maior_tile)
+                estado = {"caminho": imagem_path, "memoria": memoria, "leitor": leitor_tiles.abrir_leitor(descritor),
+                          "bytes": ocupacao(descritor), "height": height, "width": width, "tile_size": lado, "total": 0, "acertos": [],
+                          "erro": None, "mascara": None if so_contagem else np.zeros((height, width), dtype=np.uint8),
+                          "faltam": -(-height // lado) * -(-width // lado)}
+                abertas.append(estado)
+                em_voo = frozenset(e["memoria"].name for e in abertas)
+                for y in range(0, height, lado):
+                    for x in range(0, width, lado):
+                        estados[executor.submit(detectar_fogo_tile, descritor, x, y, lado, pasta_cache, so_contagem, em_voo)] = estado
+            while estados:
+                prontos, _ = wait(list(estados), return_when=FIRST_COMPLETED)
+                receber(prontos)
+        finally:
+            for estado in abertas:
+                leitor_tiles.fechar_leitor(estado["leitor"])
+                leitor_tiles.liberar_leitura(estado["memoria"])
+
+    decorrido = time.perf_counter() - inicio
+    ideal = trabalho / num_workers
+    print(f"⏱️ Lote por tiles: {decorrido:.2f}s | trabalho {trabalho:.2f}s / {num_workers} workers = "
+          f"{ideal:.2f}s ideal ({ideal / decorrido if decorrido > 0 else 1.0:.0%} de eficiência)")
+    if governo is not None:
+        print(orcamento_memoria.resumo_memoria(governo))
+    return resultados
+
+# ==== MODO SERVIÇO: PASTA OBSERVADA COM POOL QUENTE ====
+# Um processo de longa duração mantém o pool de workers aberto (imports do cv2/NumPy e
+# subida dos processos pagos uma vez) e varre a pasta de entrada a cada intervalo. Um
+# arquivo entra na fila quando tamanho e mtime ficam iguais entre duas varreduras (a
+# cópia terminou) e diferem do que o livro de estado registra como já processado; cada
+# lote novo vai para a fila única por tiles. O livro (JSON por arquivo: assinatura,
+# estado, focos, saída, latência) é regravado atomicamente a cada lote, então reiniciar
+# o serviço não reprocessa nada. A latência vai do mtime do arquivo (chegada) até a
+# gravação do resultado.
+def abrir_estado(caminho=ARQUIVO_ESTADO):
+    if not os.path.exists(caminho):
+        return {}
+    with open(caminho) as f:
+        return json.load(f)
+
+def salvar_estado(estado, caminho=ARQUIVO_ESTADO):
+    temporario = caminho + ".tmp"
+    with open(temporario, "w") as f:
+        json.dump(estado, f, indent=2)
+    os.replace(temporario, caminho)
+
+def _assinatura(caminho):
+    info = os.stat(caminho)
+    return [info.st_size, info.st_mtime_ns]
+
+# Arquivos estáveis desde a varredura anterior e ainda não processados com esta assinatura.
+# vistos: caminho -> assinatura da varredura anterior (atualizado aqui)
+def arquivos_prontos(pasta, estado, vistos):
+    prontos = []
+    atuais = {}
+    for f in sorted(os.listdir(pasta)):
+        if not f.lower().endswith(EXTENSOES_IMAGENS):
+            continue
+        caminho = os.path.join(pasta, f)
+        try:
+            assinatura = _assinatura(caminho)
+        except FileNotFoundError:
+            continue  # removido durante a varredura
+        atuais[caminho] = assinatura
+        registrado = estado.get(f)
+        if vistos.get(caminho) == assinatura and (registrado is None or registrado["assinatura"] != assinatura):
+            prontos.append(caminho)
+    vistos.clear()
+    vistos.update(atuais)
+    return prontos
+
+def _aquecer_worker(_):
+    motor_deteccao.calcular_mascara(np.zeros((8, 8, 3), dtype=np.uint8), "hsv", **PARAMETROS_KERNEL)
+    return os.getpid()
+
+def _abrir_pool(num_workers):
+    executor = ProcessPoolExecutor(max_workers=num_workers)
+    list(executor.map(_aquecer_worker, range(num_workers)))
+    return executor
+
+def _registrar(estado, caminho, assinatura, total, fim):
+    latencia = fim - assinatura[1] / 1e9
+    estado[os.path.basename(caminho)] = {
+        "assinatura": assinatura,
+        "estado": "erro" if total is None else "ok",
+        "focos": total,
+        "resultado": None if total is None else os.path.join(PASTA_RESULTADOS, f"vermelho_{os.path.basename(caminho)}"),
+        "processado_em": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(fim)),
+        "latencia_s": round(latencia, 3),
+    }
+    print(f"⏱️ {os.path.basename(caminho)}: latência {latencia:.2f}s da chegada ao resultado")
+
+# ciclos: número de varreduras (None = até Ctrl+C)
+# Um arquivo que falha (decodificação, worker, gravação) fica como "erro" no livro e só é
+# tentado de novo quando mudar. Se um worker morrer o pool é recriado e o lote, que não
+# chega ao livro, volta na varredura seguinte.
+# max_memoria: o pool já nasce com os workers que cabem no orçamento (governar_lote)
+def servico(pasta_entrada=PASTA_IMAGENS, intervalo=INTERVALO_SERVICO, tile_size=None, pasta_cache=PASTA_CACHE,
+            num_workers=None, caminho_estado=ARQUIVO_ESTADO, ciclos=None, max_memoria=None):
+    num_workers = num_workers or os.cpu_count() or 1
+    if max_memoria is not None:
+        num_workers = governar_lote(max_memoria, tile_size, num_workers)["workers"]
+    estado = abrir_estado(caminho_estado)
+    vistos = {}
+    executor = _abrir_pool(num_workers)
+    print(f"🛰️ Serviço: {num_workers} workers prontos, observando {pasta_entrada} a cada {intervalo:g}s "
+          f"({len(estado)} arquivos já no livro de estado)")
+    ciclo = 0
+    try:
+        while ciclos is None or ciclo < ciclos:
+            novos = arquivos_prontos(pasta_entrada, estado, vistos)
+            if novos:
+                print(f"📥 {len(novos)} arquivo(s) novo(s) ou alterado(s)")
+                try:
+                    for caminho, total, _, _, fim in processar_lote_por_tiles(novos, tile_size, pasta_cache, num_workers, executor,
+                                                                            max_memoria=max_memoria):
+                        _registrar(estado, caminho, vistos[caminho], total, fim)
+                except BrokenProcessPool as erro:
+                    print(f"⚠️ Pool de workers quebrado ({erro}); recriando")
+                    executor.shutdown(cancel_futures=True)
+                    executor = _abrir_pool(num_workers)
+                salvar_estado(estado, caminho_estado)
+                if pasta_cache is not None:
+                    cache_tiles.podar_cache(cache_tiles.abrir_cache(pasta_cache))
+            ciclo += 1
+            if ciclos is None or ciclo < ciclos:
+                time.sleep(intervalo)
+    except KeyboardInterrupt:
+        print("⏹️ Serviço encerrado")
+    finally:
+        executor.shutdown()
+    return estado
+
+# num_workers: processos do pool (None = os.cpu_count())
+# por_tiles: divide todas as imagens em tiles de tile_size (None = por imagem) numa fila única (maiores primeiro)
+# so_contagem: contagem exata sem montar nem gravar as imagens de resultado
+# max_memoria: orçamento de memória (ex.: "4GB"), só no modo por tiles. Nos outros modos a
+# unidade de trabalho é a imagem inteira decodificada pelo cv2.imread (no worker, ou no
+# principal para o anel): não há tile a encolher e o tamanho só se conhece depois de decodificar
+def main(usar_anel=False, pasta_cache=PASTA_CACHE, num_workers=None, por_tiles=False, tile_size=None, so_contagem=False,
+         max_memoria=None):
+    if usar_anel and por_tiles:
+        raise ValueError("usar_anel e por_tiles não se combinam: o modo por tiles já usa memória compartilhada")
+    if max_memoria is not None and not por_tiles:
+        raise ValueError("max_memoria só vale com por_tiles=True: os outros modos processam a imagem inteira de uma vez")
     imagens = [
         os.path.join(PASTA_IMAGENS, f)
         for f in os.listdir(PASTA_IMAGENS)
-        if f.lower().endswith(('.jpg', '.jpeg', '.png'))
+        if f.lower().endswith(EXTENSOES_IMAGENS)
     ]
 
-    with ProcessPoolExecutor() as executor:
-        resultados = list(executor.map(detectar_fogo_vermelho, imagens))
+    if por_tiles:
+        por_imagem = processar_lote_por_tiles(imagens, tile_size, pasta_cache, num_workers, so_contagem=so_contagem,
+                                              max_memoria=max_memoria)
+        resultados = [(total or 0, None) for _, total, _, _, _ in por_imagem]
+        acertos_lote = [(a, n) for _, _, a, n, _ in por_imagem]
+    elif usar_anel:
+        resultados = list(anel_memoria.processar_em_anel(
+            imagens_decodificadas(imagens), partial(_detectar_fogo_vermelho_imagem, pasta_cache=pasta_cache, so_contagem=so_contagem), num_workers or os.cpu_count() or 1
+        ))
+    else:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            resultados = list(executor.map(partial(_detectar_fogo_vermelho, pasta_cache=pasta_cache, so_contagem=so_contagem), imagens))
 
-    total_geral = sum(resultados)
+    total_geral = sum(total for total, _ in resultados)
     print(f"\n🔥 Total geral de focos de incêndio detectados aproximadamente: {total_geral}")
 
+    if pasta_cache is not None:
+        if por_tiles:
+            acertos, consultas = sum(a for a, _ in acertos_lote), sum(n for _, n in acertos_lote)
+        else:
+            acertos = [acerto for _, por_bloco in resultados for acerto in por_bloco]
+            acertos, consultas = sum(acertos), len(acertos)
+        removidas, tamanho = cache_tiles.podar_cache(cache_tiles.abrir_cache(pasta_cache))
+        print(f"🗃️ Cache: {cache_tiles.resumo_acertos(acertos, consultas)} | "
+              f"{tamanho / 1e6:.1f} MB em disco, {removidas} entradas podadas")
+    return total_geral
+
+# python main.py           -> processa a pasta uma vez
+# python main.py servico   -> observa PASTA_IMAGENS até Ctrl+C
 if __name__ == "__main__":
-    main()
+    if sys.argv[1:] == ["servico"]:
+        servico()
+    else:
+        main()
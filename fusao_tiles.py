@@ -0,0 +1,269 @@
+import numpy as np
+import cv2
+
+# ==== CONFIGURAÇÃO DO HALO ====
+# Borda extra lida em volta de cada tile. Com 4 px o resize cúbico (vizinhança 4x4),
+# o blur 5x5 e a abertura 3x3 enxergam exatamente os mesmos vizinhos que teriam
+# na cena inteira, então a máscara do núcleo do tile independe do corte.
+HALO_PADRAO = 4
+
+# ==== JANELA DO TILE COM HALO ====
+# Retorna (y0, y1, x0, x1, topo, esq, h, w): recorte com halo, deslocamento do
+# núcleo dentro do recorte e dimensões do núcleo
+def janela_com_halo(x, y, tile_size, height, width, halo):
+    h = min(tile_size, height - y)
+    w = min(tile_size, width - x)
+    y0 = max(0, y - halo)
+    x0 = max(0, x - halo)
+    y1 = min(height, y + h + halo)
+    x1 = min(width, x + w + halo)
+    return y0, y1, x0, x1, y - y0, x - x0, h, w
+
+# ==== BORDAS ESPARSAS (só os pixels rotulados) ====
+def _borda_esparsa(linha):
+    pos = np.flatnonzero(linha)
+    return pos.astype(np.int32), linha[pos].astype(np.int32)
+
+def _borda_densa(borda, tamanho):
+    linha = np.zeros(tamanho, dtype=np.int32)
+    pos, rotulos = borda
+    linha[pos] = rotulos
+    return linha
+
+# ==== SOMAS PONDERADAS PELA INTENSIDADE ====
+# Base do centro sub-pixel: para cada rótulo 1..n devolve (soma dos pesos, soma de
+# peso*x, soma de peso*y), olhando só os pixels rotulados
+def somas_ponderadas(rotulos, n, pesos):
+    idx = np.flatnonzero(rotulos)
+    lab = rotulos.ravel()[idx] - 1
+    ys, xs = np.divmod(idx, rotulos.shape[1])
+    w = np.ascontiguousarray(pesos).ravel()[idx].astype(np.float64)
+    peso = np.bincount(lab, weights=w, minlength=n)
+    soma_x = np.bincount(lab, weights=w * xs, minlength=n)
+    soma_y = np.bincount(lab, weights=w * ys, minlength=n)
+
+    # Componente sem intensidade nenhuma cai no centro geométrico
+    vazios = peso <= 0
+    if vazios.any():
+        area = np.bincount(lab, minlength=n).astype(np.float64)
+        peso[vazios] = area[vazios]
+        soma_x[vazios] = np.bincount(lab, weights=xs, minlength=n)[vazios]
+        soma_y[vazios] = np.bincount(lab, weights=ys, minlength=n)[vazios]
+    return peso, soma_x, soma_y
+
+# ==== COR MÉDIA POR RÓTULO ====
+# Rótulos da grade ampliada levados à grade original. interior=True: o pixel original só
+# conta se todo o bloco zoom x zoom está no foco (a borda do resize cúbico mistura o
+# fundo); interior=False: basta uma parte do bloco estar no foco.
+def reduzir_rotulos(rotulos, zoom, interior=True):
+    if zoom == 1:
+        return rotulos
+    h, w = rotulos.shape[0] // zoom, rotulos.shape[1] // zoom
+    blocos = rotulos[:h * zoom, :w * zoom].reshape(h, zoom, w, zoom)
+    maior = blocos.max(axis=(1, 3))
+    if not interior:
+        return maior
+    return np.where(blocos.min(axis=(1, 3)) == maior, maior, 0)
+
+def _somas_cor(rotulos, n, canais):
+    idx = np.flatnonzero(rotulos)
+    lab = rotulos.ravel()[idx] - 1
+    pixels = np.bincount(lab, minlength=n)
+    somas = np.stack([
+        np.bincount(lab, weights=np.ascontiguousarray(c).ravel()[idx], minlength=n) for c in canais
+    ], axis=1) if n else np.zeros((0, 3))
+    return pixels, somas
+
+# Para cada rótulo 1..n devolve (pixels originais, somas (n, 3) de R, G, B).
+# `canais` são as vistas (R, G, B) do tile na resolução original, já no recorte dos rótulos.
+# Focos sem nenhum pixel original inteiro (1-2 px) usam os pixels que tocam.
+def somas_cor(rotulos, n, canais, zoom=1):
+    pixels, somas = _somas_cor(reduzir_rotulos(rotulos, zoom), n, canais)
+    vazios = pixels == 0
+    if zoom != 1 and vazios.any():
+        pixels_borda, somas_borda = _somas_cor(reduzir_rotulos(rotulos, zoom, interior=False), n, canais)
+        pixels[vazios] = pixels_borda[vazios]
+        somas[vazios] = somas_borda[vazios]
+    return pixels, somas
+
+def cor_media(pixels, soma):
+    # Foco menor que um pixel original e encoberto pelo vizinho na redução: sem cor
+    if pixels == 0:
+        return None
+    return tuple(round(float(c) / pixels, 1) for c in soma)
+
+# ==== COMPONENTES CONEXOS DO NÚCLEO DE UM TILE ====
+# A máscara pode estar ampliada por `zoom`; as somas ficam na grade ampliada global
+# e só são reduzidas na fusão. Os rótulos das quatro bordas do núcleo são o que a
+# fusão usa para unir componentes vizinhos sem reprocessar pixels.
+# `pesos` (mesmo recorte da máscara, ex.: canal R) pondera os centros pela intensidade.
+# `cores` (vistas R, G, B do tile com halo, na resolução original) acumula a cor média.
+def componentes_tile(mascara, x, y, topo, esq, h, w, zoom=1, pesos=None, cores=None):
+    nucleo = mascara[topo * zoom:(topo + h) * zoom, esq * zoom:(esq + w) * zoom]
+    n, rotulos, stats, centroides = cv2.connectedComponentsWithStats(
+        (nucleo > 0).astype(np.uint8), connectivity=8, ltype=cv2.CV_32S
+    )
+
+    area = stats[1:, cv2.CC_STAT_AREA].astype(np.int64)
+    gx = x * zoom
+    gy = y * zoom
+    if pesos is None:
+        peso = area.astype(np.float64)
+        soma_x = (centroides[1:, 0] + gx) * area
+        soma_y = (centroides[1:, 1] + gy) * area
+    else:
+        pesos_nucleo = pesos[topo * zoom:(topo + h) * zoom, esq * zoom:(esq + w) * zoom]
+        peso, soma_x, soma_y = somas_ponderadas(rotulos, n - 1, pesos_nucleo)
+        soma_x = soma_x + gx * peso
+        soma_y = soma_y + gy * peso
+    componentes = {
+        "x": x,
+        "y": y,
+        "h": nucleo.shape[0],
+        "w": nucleo.shape[1],
+        "n": n - 1,
+        "area": area,
+        "peso": peso,
+        "soma_x": soma_x,
+        "soma_y": soma_y,
+        "x_min": stats[1:, cv2.CC_STAT_LEFT] + gx,
+        "y_min": stats[1:, cv2.CC_STAT_TOP] + gy,
+        "x_max": stats[1:, cv2.CC_STAT_LEFT] + stats[1:, cv2.CC_STAT_WIDTH] + gx,
+        "y_max": stats[1:, cv2.CC_STAT_TOP] + stats[1:, cv2.CC_STAT_HEIGHT] + gy,
+        "bordas": {
+            "topo": _borda_esparsa(rotulos[0, :]),
+            "base": _borda_esparsa(rotulos[-1, :]),
+            "esq": _borda_esparsa(rotulos[:, 0]),
+            "dir": _borda_esparsa(rotulos[:, -1]),
+        },
+    }
+    if cores is not None:
+        canais = [c[topo:topo + h, esq:esq + w] for c in cores]
+        componentes["pixels_cor"], componentes["soma_cor"] = somas_cor(rotulos, n - 1, canais, zoom)
+    return componentes
+
+# ==== UNION-FIND ====
+def _raiz(pai, i):
+    while pai[i] != i:
+        pai[i] = pai[pai[i]]
+        i = pai[i]
+    return i
+
+def _unir(pai, a, b):
+    ra, rb = _raiz(pai, a), _raiz(pai, b)
+    if ra != rb:
+        pai[max(ra, rb)] = min(ra, rb)
+
+# Pares (rótulo em A, rótulo em B) de pixels 8-vizinhos através de uma borda
+def _pares_borda(borda_a, borda_b, tamanho):
+    a = _borda_densa(borda_a, tamanho)
+    b = _borda_densa(borda_b, tamanho)
+    pares = []
+    for d in (-1, 0, 1):
+        aa = a[max(0, -d):tamanho - max(0, d)]
+        bb = b[max(0, d):tamanho - max(0, -d)]
+        ligados = (aa > 0) & (bb > 0)
+        if ligados.any():
+            pares.append(np.stack([aa[ligados], bb[ligados]], axis=1))
+    if not pares:
+        return np.empty((0, 2), dtype=np.int32)
+    return np.unique(np.concatenate(pares), axis=0)
+
+# ==== FUSÃO DOS COMPONENTES EM FOCOS GLOBAIS ====
+# Componentes que se tocam através da borda de dois tiles (inclusive na diagonal e
+# nos cantos) viram um único foco. A área mínima é aplicada à área em pixels da
+# máscara (grade ampliada) depois da fusão, então a contagem não depende do tamanho
+# do tile nem da ordem em que os tiles terminaram.
+# Retorna dicts com x, y (centro na resolução original), area (em pixels da resolução
+# original) e bbox (x, y, w, h).
+# Com subpixel=True o centro é devolvido em float em vez de truncado como no detector original.
+# Se os tiles trouxerem as somas de cor (componentes_tile com `cores`), cada foco ganha "rgb".
+def fundir_componentes(resultados, tile_size, zoom=1, area_minima=1, subpixel=False):
+    resultados = [r for r in resultados if r is not None]
+    por_posicao = {(r["x"], r["y"]): r for r in resultados}
+
+    base = {}
+    total = 0
+    for r in resultados:
+        base[(r["x"], r["y"])] = total - 1  # rótulo local 1 -> índice global `total`
+        total += r["n"]
+    if total == 0:
+        return []
+
+    pai = np.arange(total)
+
+    def unir_pares(ra, rb, pares):
+        for la, lb in pares:
+            _unir(pai, base[(ra["x"], ra["y"])] + int(la), base[(rb["x"], rb["y"])] + int(lb))
+
+    for r in resultados:
+        x, y = r["x"], r["y"]
+        direita = por_posicao.get((x + tile_size, y))
+        if direita is not None:
+            unir_pares(r, direita, _pares_borda(r["bordas"]["dir"], direita["bordas"]["esq"], r["h"]))
+
+        abaixo = por_posicao.get((x, y + tile_size))
+        if abaixo is not None:
+            unir_pares(r, abaixo, _pares_borda(r["bordas"]["base"], abaixo["bordas"]["topo"], r["w"]))
+
+        # Cantos: pixel inferior-direito/inferior-esquerdo com o tile na diagonal
+        base_r = _borda_densa(r["bordas"]["base"], r["w"])
+        diag_dir = por_posicao.get((x + tile_size, y + tile_size))
+        if diag_dir is not None:
+            topo_d = _borda_densa(diag_dir["bordas"]["topo"], diag_dir["w"])
+            if base_r[-1] > 0 and topo_d[0] > 0:
+                unir_pares(r, diag_dir, [(base_r[-1], topo_d[0])])
+
+        diag_esq = por_posicao.get((x - tile_size, y + tile_size))
+        if diag_esq is not None:
+            topo_e = _borda_densa(diag_esq["bordas"]["topo"], diag_esq["w"])
+            if base_r[0] > 0 and topo_e[-1] > 0:
+                unir_pares(r, diag_esq, [(base_r[0], topo_e[-1])])
+
+    raizes = np.array([_raiz(pai, i) for i in range(total)])
+
+    def juntar(chave):
+        return np.concatenate([r[chave] for r in resultados])
+
+    area = np.bincount(raizes, weights=juntar("area"), minlength=total)
+    peso = np.bincount(raizes, weights=juntar("peso"), minlength=total)
+    soma_x = np.bincount(raizes, weights=juntar("soma_x"), minlength=total)
+    soma_y = np.bincount(raizes, weights=juntar("soma_y"), minlength=total)
+    x_min = np.full(total, np.iinfo(np.int64).max)
+    y_min = np.full(total, np.iinfo(np.int64).max)
+    x_max = np.zeros(total, dtype=np.int64)
+    y_max = np.zeros(total, dtype=np.int64)
+    np.minimum.at(x_min, raizes, juntar("x_min"))
+    np.minimum.at(y_min, raizes, juntar("y_min"))
+    np.maximum.at(x_max, raizes, juntar("x_max"))
+    np.maximum.at(y_max, raizes, juntar("y_max"))
+    com_cor = all("soma_cor" in r for r in resultados)
+    if com_cor:
+        pixels_cor = np.bincount(raizes, weights=juntar("pixels_cor"), minlength=total)
+        soma_cor = juntar("soma_cor")
+        soma_cor = np.stack([np.bincount(raizes, weights=soma_cor[:, c], minlength=total) for c in range(3)], axis=1)
+
+    focos = []
+    for i in np.flatnonzero((raizes == np.arange(total)) & (area >= area_minima)):
+        if subpixel:
+            # centro do pixel ampliado j corresponde a (j + 0.5) / zoom - 0.5 na grade original
+            cx = (soma_x[i] / peso[i] + 0.5) / zoom - 0.5
+            cy = (soma_y[i] / peso[i] + 0.5) / zoom - 0.5
+        else:
+            cx = int(soma_x[i] / peso[i]) // zoom
+            cy = int(soma_y[i] / peso[i]) // zoom
+        foco = {
+            "x": cx,
+            "y": cy,
+            "area": float(area[i]) / zoom ** 2,
+            "bbox": (
+                int(x_min[i]) // zoom,
+                int(y_min[i]) // zoom,
+                -(-int(x_max[i]) // zoom) - int(x_min[i]) // zoom,
+                -(-int(y_max[i]) // zoom) - int(y_min[i]) // zoom,
+            ),
+        }
+        if com_cor:
+            foco["rgb"] = cor_media(int(pixels_cor[i]), soma_cor[i])
+        focos.append(foco)
+    return focos
@@ -0,0 +1,210 @@
+import numpy as np
+import tifffile as tiff
+import cv2
+import os
+from collections import OrderedDict
+from multiprocessing import shared_memory
+
+# ==== MODOS DE LEITURA ====
+# memmap: TIFF sem compressão e contíguo; o tile é uma fatia do arquivo mapeado
+# segmentos: TIFF em tiles ou strips (LZW, Deflate, JPEG...); cada janela decodifica só
+#   os segmentos internos do arquivo que ela cobre
+# compartilhada: formatos que só decodificam inteiros (JPG, PNG, TIFF planar separado);
+#   o processo principal decodifica uma vez e os workers leem da memória compartilhada
+MODO_MEMMAP = "memmap"
+MODO_SEGMENTOS = "segmentos"
+MODO_COMPARTILHADA = "compartilhada"
+MODOS_LEITURA = (MODO_MEMMAP, MODO_SEGMENTOS, MODO_COMPARTILHADA)
+
+EXTENSOES_TIFF = (".tif", ".tiff")
+
+# Segmentos decodificados mantidos por worker (LRU): cobre a faixa de tiles anterior,
+# para que o halo e os tiles vizinhos não decodifiquem o mesmo segmento de novo
+CACHE_SEGMENTOS_BYTES = 64 * 1024 * 1024
+
+# ==== ESCOLHA DO MODO PELO LAYOUT DA PÁGINA ====
+def _pagina_segmentada(page):
+    # Decodificação parcial só para uma amostra por pixel intercalada (RGB contíguo)
+    # e uma única imagem (sem profundidade de volume)
+    return page.planarconfig == 1 and page.imagedepth == 1 and len(page.dataoffsets) > 0
+
+def modo_leitura(caminho):
+    if os.path.splitext(caminho)[1].lower() not in EXTENSOES_TIFF:
+        return MODO_COMPARTILHADA
+    with tiff.TiffFile(caminho) as tif:
+        page = tif.pages[0]
+        if page.is_memmappable:
+            return MODO_MEMMAP
+        if _pagina_segmentada(page):
+            return MODO_SEGMENTOS
+    return MODO_COMPARTILHADA
+
+# ==== DECODIFICAÇÃO INTEIRA (fallback) ====
+# Devolve (imagem, ordem dos canais): tifffile entrega RGB, cv2.imread entrega BGR
+def decodificar_inteira(caminho):
+    if os.path.splitext(caminho)[1].lower() in EXTENSOES_TIFF:
+        with tiff.TiffFile(caminho) as tif:
+            page = tif.pages[0]
+            img = page.asarray()
+            if page.planarconfig == 2 and img.ndim == 3:
+                img = np.ascontiguousarray(np.moveaxis(img, 0, -1))  # planos separados -> H x W x C
+        return img, "RGB"
+    img = cv2.imread(caminho, cv2.IMREAD_UNCHANGED)
+    if img is None:
+        raise FileNotFoundError(f"Imagem não encontrada: {caminho}")
+    return img, "BGR"
+
+# ==== PREPARAÇÃO NO PROCESSO PRINCIPAL ====
+# Retorna (descritor, memoria). O descritor é um dict serializável que vai para os
+# workers; memoria é o SharedMemory do modo "compartilhada" (None nos outros), que o
+# processo principal precisa liberar com liberar_leitura ao final.
+def preparar_leitura(caminho, modo=None):
+    if not os.path.exists(caminho):
+        raise FileNotFoundError(f"Imagem não encontrada: {caminho}")
+    modo = modo_leitura(caminho) if modo is None else modo
+    if modo not in MODOS_LEITURA:
+        raise ValueError(f"Modo de leitura inválido: {modo} (use um de {MODOS_LEITURA})")
+
+    if modo != MODO_COMPARTILHADA:
+        with tiff.TiffFile(caminho) as tif:
+            page = tif.pages[0]
+            descritor = {"caminho": caminho, "modo": modo, "shape": page.shape,
+                         "dtype": page.dtype.str, "ordem": "RGB", "memoria": None,
+                         "bytes_dados": int(sum(page.databytecounts))}
+        return descritor, None
+
+    img, ordem = decodificar_inteira(caminho)
+    memoria = shared_memory.SharedMemory(create=True, size=max(img.nbytes, 1))
+    np.ndarray(img.shape, dtype=img.dtype, buffer=memoria.buf)[...] = img
+    descritor = {"caminho": caminho, "modo": modo, "shape": img.shape,
+                 "dtype": img.dtype.str, "ordem": ordem, "memoria": memoria.name,
+                 "bytes_dados": img.nbytes}
+    return descritor, memoria
+
+def liberar_leitura(memoria):
+    if memoria is not None:
+        memoria.close()
+        memoria.unlink()
+
+# ==== LAYOUT FÍSICO DA PÁGINA (tiles ou strips internos do TIFF) ====
+# Só o modo "segmentos" decodifica por segmento; memmap e memória compartilhada
+# leem qualquer fatia sem custo extra e devolvem None
+def layout_arquivo(descritor):
+    if descritor["modo"] != MODO_SEGMENTOS:
+        return None
+    with tiff.TiffFile(descritor["caminho"]) as tif:
+        page = tif.pages[0]
+        return {
+            "tipo": "tiles" if page.is_tiled else "strips",
+            "segmento": tuple(page.chunks[:2]),             # (altura, largura) de um tile/strip
+            "grade": (page.chunked[0], page.chunked[1]),  # segmentos por coluna e por linha
+            "offsets": np.asarray(page.dataoffsets, dtype=np.int64),
+            "bytes": np.asarray(page.databytecounts, dtype=np.int64),
+        }
+
+# ==== ABERTURA EM CADA WORKER ====
+# O leitor é um dict com o estado aberto no processo (arquivo, mapa ou memória).
+# "bytes_lidos" acumula os bytes lidos do arquivo (segmentos) ou do mapa/memória (fatias).
+def abrir_leitor(descritor):
+    modo = descritor["modo"]
+    leitor = {"modo": modo, "shape": tuple(descritor["shape"]), "ordem": descritor["ordem"], "bytes_lidos": 0}
+    if modo == MODO_MEMMAP:
+        leitor["imagem"] = tiff.memmap(descritor["caminho"])
+    elif modo == MODO_SEGMENTOS:
+        tif = tiff.TiffFile(descritor["caminho"])
+        page = tif.pages[0]
+        leitor.update({
+            "tif": tif,
+            "page": page,
+            "segmento": page.chunks[:2],                    # (altura, largura) de um tile/strip
+            "grade": (page.chunked[0], page.chunked[1]),  # segmentos por coluna e por linha
+            "cache": OrderedDict(),                        # segmentos decodificados (LRU)
+            "bytes_cache": 0,
+        })
+    else:
+        memoria = shared_memory.SharedMemory(name=descritor["memoria"])
+        leitor["memoria"] = memoria
+        leitor["imagem"] = np.ndarray(descritor["shape"], dtype=np.dtype(descritor["dtype"]), buffer=memoria.buf)
+    return leitor
+
+# Leitor para outra thread do mesmo processo: memmap e memória compartilhada são os
+# mesmos (só o contador é próprio); o arquivo segmentado precisa de handle e cache próprios
+def clonar_leitor(leitor, descritor):
+    if leitor["modo"] == MODO_SEGMENTOS:
+        return abrir_leitor(descritor)
+    return dict(leitor, bytes_lidos=0)
+
+# Leitor para uso só no próprio processo (ferramentas de inspeção): o que precisa ser
+# decodificado inteiro fica num array comum, sem memória compartilhada
+def abrir_leitor_local(caminho):
+    modo = modo_leitura(caminho)
+    if modo != MODO_COMPARTILHADA:
+        descritor, _ = preparar_leitura(caminho, modo)
+        return abrir_leitor(descritor)
+    img, ordem = decodificar_inteira(caminho)
+    return {"modo": modo, "shape": img.shape, "ordem": ordem, "bytes_lidos": 0, "imagem": img, "memoria": None}
+
+def fechar_leitor(leitor):
+    if leitor["modo"] == MODO_SEGMENTOS:
+        leitor["tif"].close()
+    elif leitor["modo"] == MODO_COMPARTILHADA:
+        leitor.pop("imagem")
+        if leitor["memoria"] is not None:
+            leitor["memoria"].close()
+
+# ==== DECODIFICAÇÃO DOS SEGMENTOS QUE A JANELA COBRE ====
+def _ler_segmento(leitor, indice):
+    page = leitor["page"]
+    offset = page.dataoffsets[indice]
+    n_bytes = page.databytecounts[indice]
+    if offset == 0 or n_bytes == 0:
+        return None  # segmento ausente (TIFF esparso): fica com zeros
+    fh = leitor["tif"].filehandle
+    fh.seek(offset)
+    bruto = fh.read(n_bytes)  # antes de page.decode, que pode ler tags e mover o arquivo
+    leitor["bytes_lidos"] += n_bytes
+    dados, _, _ = page.decode(bruto, indice, jpegtables=page.jpegtables)
+    return dados[0]  # (altura, largura, amostras) do segmento, sem o eixo de profundidade
+
+def _ler_segmentos(leitor, y0, y1, x0, x1):
+    page = leitor["page"]
+    sh, sw = leitor["segmento"]
+    linhas, colunas = leitor["grade"]
+    janela = np.zeros((y1 - y0, x1 - x0) + tuple(page.shape[2:]), dtype=page.dtype)
+
+    cache = leitor["cache"]
+    for lin in range(y0 // sh, min(linhas, -(-y1 // sh))):
+        for col in range(x0 // sw, min(colunas, -(-x1 // sw))):
+            indice = lin * colunas + col
+            if indice in cache:
+                cache.move_to_end(indice)
+                segmento = cache[indice]
+            else:
+                segmento = _ler_segmento(leitor, indice)
+                _guardar_segmento(leitor, indice, segmento)
+            if segmento is None:
+                continue
+
+            sy, sx = lin * sh, col * sw
+            a0, a1 = max(y0, sy), min(y1, sy + segmento.shape[0], page.shape[0])
+            b0, b1 = max(x0, sx), min(x1, sx + segmento.shape[1], page.shape[1])
+            if a0 < a1 and b0 < b1:
+                janela[a0 - y0:a1 - y0, b0 - x0:b1 - x0] = \
+                    segmento[a0 - sy:a1 - sy, b0 - sx:b1 - sx].reshape((a1 - a0, b1 - b0) + tuple(page.shape[2:]))
+    return janela
+
+def _guardar_segmento(leitor, indice, segmento):
+    cache = leitor["cache"]
+    cache[indice] = segmento
+    leitor["bytes_cache"] += 0 if segmento is None else segmento.nbytes
+    while leitor["bytes_cache"] > CACHE_SEGMENTOS_BYTES and len(cache) > 1:
+        _, antigo = cache.popitem(last=False)
+        leitor["bytes_cache"] -= 0 if antigo is None else antigo.nbytes
+
+# ==== LEITURA DE UMA JANELA [y0:y1, x0:x1] ====
+def ler_janela(leitor, y0, y1, x0, x1):
+    if leitor["modo"] == MODO_SEGMENTOS:
+        return _ler_segmentos(leitor, y0, y1, x0, x1)
+    janela = leitor["imagem"][y0:y1, x0:x1]
+    leitor["bytes_lidos"] += janela.nbytes
+    return janela
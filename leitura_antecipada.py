@@ -0,0 +1,87 @@
+import queue
+import threading
+import time
+
+# ==== LEITURA ANTECIPADA (read-ahead) ====
+# Uma thread leitora percorre a fonte de tiles (um gerador que lê cada janela) e deixa até
+# `profundidade` tiles prontos numa fila limitada enquanto o laço principal detecta o
+# atual. A leitura (read/pread, decodificação zlib/JPEG do tifffile, GDAL no rasterio,
+# cópia do memmap) solta o GIL, então disco e CPU trabalham ao mesmo tempo.
+# As esperas dos dois lados dizem quem limita a execução:
+#   espera_deteccao: o laço parado esperando um tile que ainda não foi lido (I/O)
+#   espera_leitura: a leitora parada com a fila cheia, esperando a detecção (CPU)
+
+PROFUNDIDADE_PADRAO = 2
+INTERVALO_PARADA = 0.1  # segundos entre as checagens da leitora quando a fila está cheia
+
+_FIM = object()
+
+def nova_estatistica(profundidade):
+    return {"profundidade": profundidade, "tiles": 0, "leitura": 0.0, "espera_deteccao": 0.0, "espera_leitura": 0.0}
+
+# Gera os itens de fonte na mesma ordem, lidos com até `profundidade` de antecedência.
+# profundidade 0 devolve a fonte como está (leitura no próprio laço). Um erro na leitura
+# é relançado no laço; se o laço parar antes do fim, a leitora é encerrada.
+def antecipar(fonte, profundidade=PROFUNDIDADE_PADRAO, estatisticas=None):
+    if profundidade < 1:
+        yield from fonte
+        return
+    estatisticas = nova_estatistica(profundidade) if estatisticas is None else estatisticas
+    fila = queue.Queue(maxsize=profundidade)
+    parar = threading.Event()
+    falha = []
+
+    def entregar(item):
+        t0 = time.perf_counter()
+        while not parar.is_set():
+            try:
+                fila.put(item, timeout=INTERVALO_PARADA)
+                break
+            except queue.Full:
+                continue
+        estatisticas["espera_leitura"] += time.perf_counter() - t0
+
+    def ler():
+        try:
+            itens = iter(fonte)
+            while not parar.is_set():
+                t0 = time.perf_counter()
+                try:
+                    item = next(itens)
+                except StopIteration:
+                    break
+                estatisticas["leitura"] += time.perf_counter() - t0
+                entregar(item)
+        except BaseException as erro:
+            falha.append(erro)
+        finally:
+            entregar(_FIM)
+
+    leitora = threading.Thread(target=ler, name="leitura-antecipada", daemon=True)
+    leitora.start()
+    try:
+        while True:
+            t0 = time.perf_counter()
+            item = fila.get()
+            estatisticas["espera_deteccao"] += time.perf_counter() - t0
+            if item is _FIM:
+                break
+            estatisticas["tiles"] += 1
+            yield item
+        if falha:
+            raise falha[0]
+    finally:
+        parar.set()
+        while leitora.is_alive():
+            try:
+                fila.get(timeout=INTERVALO_PARADA)  # libera a leitora presa na fila cheia
+            except queue.Empty:
+                pass
+        leitora.join()
+
+def resumo_antecipacao(estatisticas):
+    deteccao, leitura = estatisticas["espera_deteccao"], estatisticas["espera_leitura"]
+    limite = "leitura (I/O)" if deteccao > leitura else "detecção (CPU)"
+    return (f"🔭 Leitura antecipada (profundidade {estatisticas['profundidade']}): {estatisticas['tiles']} tiles, "
+            f"leitura {estatisticas['leitura']:.2f}s | detecção esperou a leitura {deteccao:.2f}s | "
+            f"leitura esperou a detecção {leitura:.2f}s -> limitado por {limite}")
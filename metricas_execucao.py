@@ -0,0 +1,217 @@
+import contextlib
+import json
+import os
+import threading
+import time
+
+# ==== MÉTRICAS POR ETAPA (opcional) ====
+# Com métricas ligadas cada tile mede quanto tempo passou em cada etapa do caminho
+# quente (leitura, canais, pré-filtro, resize, limiar, morfologia, contornos ou
+# componentes, momentos, cores) e o worker informa quanto esperou na fila antes dele.
+# O processo principal junta tudo em histogramas (tempo por tile em cada etapa), mede
+# as etapas que são só dele (espera pelos resultados, fusão, registros, overlay) e o
+# tempo ocupado/ocioso de cada worker, e exporta em JSON ou no formato texto do
+# Prometheus (node_exporter --collector.textfile).
+# Desligadas, cada etapa custa só a consulta a uma variável por thread.
+
+FORMATOS_METRICAS = {".json": "json", ".prom": "prometheus", ".txt": "prometheus"}
+# Limites superiores (segundos) dos baldes dos histogramas, como os do Prometheus
+BALDES = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ETAPAS_LEITURA = ("leitura",)
+ETAPAS_PRINCIPAL = ("espera_resultados", "fusao", "registros", "overlay")
+PREFIXO_PROMETHEUS = "detector_incendio"
+
+_local = threading.local()
+_NADA = contextlib.nullcontext()
+
+# ==== NO WORKER: MEDIDAS DE UM TILE ====
+# As medidas ficam na thread atual (threads e processos têm cada um as suas)
+def iniciar_tile():
+    agora = time.perf_counter()
+    anterior = getattr(_local, "ultimo_fim", None)
+    _local.tile = {
+        "worker": f"{os.getpid()}-{threading.current_thread().name}",
+        "inicio": agora,
+        "espera": None if anterior is None else agora - anterior,  # fila entre um tile e o próximo
+        "etapas": {},
+    }
+    return _local.tile
+
+def encerrar_tile():
+    medidas = _local.tile
+    _local.tile = None
+    medidas["fim"] = _local.ultimo_fim = time.perf_counter()
+    return medidas
+
+@contextlib.contextmanager
+def _medir(etapas, nome):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        etapas[nome] = etapas.get(nome, 0.0) + time.perf_counter() - t0
+
+# with etapa("resize"): ... — mede só se o tile atual estiver sendo medido
+def etapa(nome):
+    medidas = getattr(_local, "tile", None)
+    return _NADA if medidas is None else _medir(medidas["etapas"], nome)
+
+# ==== NO PROCESSO PRINCIPAL: AGREGAÇÃO ====
+def novo_coletor():
+    return {"etapas": {}, "workers": {}, "tiles": 0, "inicio": time.perf_counter(), "janela_workers": None}
+
+def _histograma():
+    return {"baldes": [0] * len(BALDES), "n": 0, "soma": 0.0, "max": 0.0}
+
+def observar(coletor, nome, segundos):
+    h = coletor["etapas"].get(nome)
+    if h is None:
+        h = coletor["etapas"][nome] = _histograma()
+    for i, limite in enumerate(BALDES):
+        if segundos <= limite:
+            h["baldes"][i] += 1
+            break
+    h["n"] += 1
+    h["soma"] += segundos
+    h["max"] = max(h["max"], segundos)
+
+# Etapa do próprio processo principal; coletor None não mede
+def medindo(coletor, nome):
+    return _NADA if coletor is None else _medir_principal(coletor, nome)
+
+@contextlib.contextmanager
+def _medir_principal(coletor, nome):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observar(coletor, nome, time.perf_counter() - t0)
+
+# Repassa os itens de uma fonte medindo quanto o principal esperou por cada um
+def cronometrando(coletor, nome, fonte):
+    fonte = iter(fonte)
+    while True:
+        t0 = time.perf_counter()
+        try:
+            item = next(fonte)
+        except StopIteration:
+            return
+        observar(coletor, nome, time.perf_counter() - t0)
+        yield item
+
+def acrescentar_tile(coletor, medidas):
+    coletor["tiles"] += 1
+    for nome, segundos in medidas["etapas"].items():
+        observar(coletor, nome, segundos)
+    if medidas["espera"] is not None:
+        observar(coletor, "espera_fila", medidas["espera"])
+    w = coletor["workers"].setdefault(medidas["worker"], {"tiles": 0, "ocupado": 0.0, "espera_fila": 0.0})
+    w["tiles"] += 1
+    w["ocupado"] += medidas["fim"] - medidas["inicio"]
+    w["espera_fila"] += medidas["espera"] or 0.0
+
+# janela: segundos em que os workers estavam de pé (do início do pool ao último resultado);
+# o ocioso de cada worker é o que sobra dela fora dos tiles
+def encerrar_coletor(coletor, janela_workers):
+    coletor["janela_workers"] = janela_workers
+    coletor["total"] = time.perf_counter() - coletor["inicio"]
+    for w in coletor["workers"].values():
+        w["ocioso"] = max(0.0, janela_workers - w["ocupado"])
+    return coletor
+
+# ==== RESUMO: LEITURA OU CÁLCULO? ====
+def tempos_workers(coletor):
+    leitura = sum(coletor["etapas"][n]["soma"] for n in ETAPAS_LEITURA if n in coletor["etapas"])
+    calculo = sum(h["soma"] for n, h in coletor["etapas"].items()
+                  if n not in ETAPAS_LEITURA and n not in ETAPAS_PRINCIPAL and n != "espera_fila")
+    ocupado = sum(w["ocupado"] for w in coletor["workers"].values())
+    ocioso = sum(w.get("ocioso", 0.0) for w in coletor["workers"].values())
+    return leitura, calculo, ocupado, ocioso
+
+def resumo_metricas(coletor):
+    leitura, calculo, ocupado, ocioso = tempos_workers(coletor)
+    medido = leitura + calculo
+    etapas = sorted(((h["soma"], n) for n, h in coletor["etapas"].items()
+                     if n not in ETAPAS_PRINCIPAL and n != "espera_fila"), reverse=True)
+    linhas = ["📊 Etapas (soma nos workers): " + " | ".join(
+        f"{n} {s:.2f}s ({s / medido:.0%})" if medido > 0 else f"{n} {s:.2f}s" for s, n in etapas)]
+    principal = [(n, coletor["etapas"][n]["soma"]) for n in ETAPAS_PRINCIPAL if n in coletor["etapas"]]
+    if principal:
+        linhas.append("📊 Processo principal: " + " | ".join(f"{n} {s:.2f}s" for n, s in principal))
+    if coletor["workers"]:
+        total = ocupado + ocioso
+        linhas.append(f"👷 {len(coletor['workers'])} workers: ocupados {ocupado:.2f}s, ociosos {ocioso:.2f}s"
+                      + (f" ({ocioso / total:.0%} ocioso)" if total > 0 else ""))
+    if medido > 0:
+        limite = "leitura (I/O)" if leitura >= calculo else "cálculo (CPU)"
+        linhas.append(f"⚖️ Leitura {leitura / medido:.0%} x cálculo {calculo / medido:.0%} do tempo dos tiles -> limitado por {limite}")
+    return "\n".join(linhas)
+
+# ==== EXPORTAÇÃO ====
+def formato_metricas(caminho):
+    formato = FORMATOS_METRICAS.get(os.path.splitext(caminho)[1].lower())
+    if formato is None:
+        raise ValueError(f"Formato de métricas inválido para {caminho} (use uma das extensões {sorted(FORMATOS_METRICAS)})")
+    return formato
+
+def _json(coletor):
+    leitura, calculo, ocupado, ocioso = tempos_workers(coletor)
+    return {
+        "tiles": coletor["tiles"],
+        "total_s": coletor.get("total"),
+        "janela_workers_s": coletor["janela_workers"],
+        "baldes_s": list(BALDES),
+        "etapas": coletor["etapas"],
+        "workers": coletor["workers"],
+        "leitura_s": leitura,
+        "calculo_s": calculo,
+        "ocupado_s": ocupado,
+        "ocioso_s": ocioso,
+    }
+
+def _rotulo(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"')
+
+def _prometheus(coletor):
+    p = PREFIXO_PROMETHEUS
+    linhas = [f"# HELP {p}_etapa_segundos Tempo por tile (ou por evento do processo principal) em cada etapa",
+              f"# TYPE {p}_etapa_segundos histogram"]
+    for nome in sorted(coletor["etapas"]):
+        h = coletor["etapas"][nome]
+        acumulado = 0
+        for limite, n in zip(BALDES, h["baldes"]):
+            acumulado += n
+            linhas.append(f'{p}_etapa_segundos_bucket{{etapa="{_rotulo(nome)}",le="{limite}"}} {acumulado}')
+        linhas.append(f'{p}_etapa_segundos_bucket{{etapa="{_rotulo(nome)}",le="+Inf"}} {h["n"]}')
+        linhas.append(f'{p}_etapa_segundos_sum{{etapa="{_rotulo(nome)}"}} {h["soma"]}')
+        linhas.append(f'{p}_etapa_segundos_count{{etapa="{_rotulo(nome)}"}} {h["n"]}')
+
+    for campo, descricao in (("ocupado", "Tempo processando tiles"), ("ocioso", "Tempo sem tile na janela dos workers"),
+                             ("espera_fila", "Tempo entre um tile e o próximo")):
+        linhas.append(f"# HELP {p}_worker_{campo}_segundos {descricao}")
+        linhas.append(f"# TYPE {p}_worker_{campo}_segundos gauge")
+        for worker in sorted(coletor["workers"]):
+            linhas.append(f'{p}_worker_{campo}_segundos{{worker="{_rotulo(worker)}"}} {coletor["workers"][worker].get(campo, 0.0)}')
+
+    linhas += [f"# HELP {p}_tiles Tiles medidos", f"# TYPE {p}_tiles gauge", f"{p}_tiles {coletor['tiles']}"]
+    if coletor.get("total") is not None:
+        linhas += [f"# HELP {p}_execucao_segundos Duração da execução", f"# TYPE {p}_execucao_segundos gauge",
+                   f"{p}_execucao_segundos {coletor['total']}"]
+    return "\n".join(linhas) + "\n"
+
+# O formato sai da extensão (.json ou .prom/.txt); grava num temporário e renomeia,
+# para o coletor de textfile do Prometheus nunca ler um arquivo pela metade
+def salvar_metricas(coletor, caminho):
+    formato = formato_metricas(caminho)
+    pasta = os.path.dirname(caminho)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+    temporario = caminho + ".tmp"
+    with open(temporario, "w") as f:
+        if formato == "json":
+            json.dump(_json(coletor), f, indent=2)
+        else:
+            f.write(_prometheus(coletor))
+    os.replace(temporario, caminho)
+    return caminho
+
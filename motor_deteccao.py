@@ -0,0 +1,346 @@
+import numpy as np
+import cv2
+from fusao_tiles import componentes_tile, fundir_componentes, somas_ponderadas, somas_cor, cor_media
+import classificador_lut
+from metricas_execucao import etapa
+
+# ==== MOTOR DE DETECÇÃO ====
+# Todos os executores (sequencial, Pool, ProcessPoolExecutor, MPI) chamam este módulo.
+# Cada kernel só sabe gerar a máscara binária de um tile; a extração dos focos
+# (contornos ou componentes conexos), o pré-filtro e a fusão com halo são comuns.
+#
+# Interface: tile (H x W x 3, uint8) -> lista de focos, cada um um dict
+#   {"x", "y", "area", "bbox": (x, y, largura, altura)}
+# em coordenadas do tile na resolução original; area em pixels da resolução original.
+# Com cores=True cada foco traz também "rgb": (R, G, B) médio dos pixels originais do foco.
+# As etapas (resize, limiar, morfologia, contornos...) são medidas por metricas_execucao
+# quando o executor liga as métricas do tile.
+
+KERNELS = {}
+
+def registrar_kernel(nome, mascara, prefiltro=None, **padroes):
+    KERNELS[nome] = {"mascara": mascara, "prefiltro": prefiltro, "padroes": padroes}
+
+# Parâmetros comuns a todos os kernels
+PADROES_COMUNS = {
+    "ordem": "RGB",           # ordem dos canais do tile: "RGB" (tifffile/rasterio) ou "BGR" (cv2.imread)
+    "zoom": 1,                # fator de ampliação da máscara (o kernel decide se amplia)
+    "area_minima": 1,         # contornos: cv2.contourArea na grade da máscara; componentes: pixels
+    "extracao": "contornos",  # "contornos" (findContours + momentos) ou "componentes" (connectedComponents)
+    "subpixel": False,        # componentes: centro ponderado pelo canal R e devolvido em float
+    "classificador": "direto",  # "direto" (regra pixel a pixel) ou "lut" (tabela das 2^24 cores)
+    "cores": False,           # acrescenta a cor média ("rgb") de cada foco (registros_deteccoes)
+}
+
+def parametros_kernel(kernel, **params):
+    if kernel not in KERNELS:
+        raise ValueError(f"Kernel de detecção desconhecido: {kernel} (disponíveis: {sorted(KERNELS)})")
+    p = dict(PADROES_COMUNS)
+    p.update(KERNELS[kernel]["padroes"])
+    desconhecidos = set(params) - set(p)
+    if desconhecidos:
+        raise ValueError(f"Parâmetros inválidos para o kernel {kernel}: {sorted(desconhecidos)}")
+    p.update(params)
+    return p
+
+def _canais(tile, ordem):
+    # Devolve as vistas (R, G, B) sem copiar, na ordem certa
+    if ordem == "RGB":
+        return tile[:, :, 0], tile[:, :, 1], tile[:, :, 2]
+    if ordem == "BGR":
+        return tile[:, :, 2], tile[:, :, 1], tile[:, :, 0]
+    raise ValueError(f"Ordem de canais inválida: {ordem} (use 'RGB' ou 'BGR')")
+
+def _abrir(mascara):
+    with etapa("morfologia"):
+        return cv2.morphologyEx(mascara, cv2.MORPH_OPEN, np.ones((3, 3), np.uint8))
+
+# Aplica a regra de cor do kernel (função só dos 3 bytes do pixel) direto ou pela
+# tabela compilada em classificador_lut; as duas dão a mesma máscara bit a bit
+def _classificar(tile, p, regra, *chaves):
+    args = tuple(p[c] for c in chaves)
+    if p["classificador"] == "direto":
+        with etapa("limiar"):
+            return regra(tile, *args)
+    if p["classificador"] == "lut":
+        with etapa("limiar"):
+            return classificador_lut.classificar(tile, regra, *args)
+    raise ValueError(f"Classificador inválido: {p['classificador']} (use 'direto' ou 'lut')")
+
+# ==== KERNEL "rgb": LIMIAR R/G/B (detectorparalelo2.0 / detectorsequencial) ====
+def regra_rgb(tile, ordem, r_min, g_max, b_max):
+    R, G, B = _canais(tile, ordem)
+    mascara = (R > r_min) & (G < g_max) & (B < b_max)
+    return mascara.astype(np.uint8) * 255
+
+def mascara_rgb(tile, p):
+    if p["zoom"] != 1:
+        with etapa("resize"):
+            tile = cv2.resize(tile, None, fx=p["zoom"], fy=p["zoom"], interpolation=cv2.INTER_CUBIC)
+    mascara = _classificar(tile, p, regra_rgb, "ordem", "r_min", "g_max", "b_max")
+    return _abrir(mascara) if p["abrir"] else mascara
+
+# O resize cúbico pode passar do máximo dos vizinhos: no 2D a soma dos pesos negativos
+# do kernel do OpenCV é ~0.32, então o valor ampliado fica dentro de
+# [min - 0.33*(max-min), max + 0.33*(max-min)]. O teste usa só máximo/mínimo de cada
+# canal (o R primeiro, que elimina quase tudo) e nunca descarta um tile em que a
+# detecção completa acharia algo.
+FATOR_OVERSHOOT_CUBICO = 0.33
+
+def prefiltro_rgb(tile, p):
+    folga = FATOR_OVERSHOOT_CUBICO if p["zoom"] != 1 else 0.0
+    R, G, B = _canais(tile, p["ordem"])
+
+    r_max = int(R.max())
+    if r_max + folga * (r_max - int(R.min())) <= p["r_min"]:
+        return False
+    for canal, limite in ((G, p["g_max"]), (B, p["b_max"])):
+        c_min = int(canal.min())
+        if c_min - folga * (int(canal.max()) - c_min) >= limite:
+            return False
+    return True
+
+registrar_kernel(
+    "rgb", mascara_rgb, prefiltro_rgb,
+    r_min=150, g_max=100, b_max=100, zoom=2, abrir=True, area_minima=1,
+)
+
+# Mesma regra na resolução nativa, sem o resize 2x, com centro sub-pixel ponderado pelo R.
+# Sem abertura: o 3x3 na grade 2x equivale a menos de um pixel nativo, e um 3x3 aqui
+# apagaria focos de 1-2 px que o caminho com zoom mantém.
+registrar_kernel(
+    "rgb_subpixel", mascara_rgb, prefiltro_rgb,
+    r_min=150, g_max=100, b_max=100, zoom=1, abrir=False,
+    extracao="componentes", subpixel=True,
+)
+
+# ==== KERNEL "hsv": DUAS FAIXAS DE VERMELHO EM HSV ====
+# (detectar_img_padrao_sequencial, fire_detector/main.py e version 1.0/main.py)
+CONVERSAO_HSV = {"RGB": cv2.COLOR_RGB2HSV, "BGR": cv2.COLOR_BGR2HSV}
+
+def _faixas_hsv(hsv, baixo1, alto1, baixo2, alto2):
+    mascara1 = cv2.inRange(hsv, baixo1, alto1)
+    mascara2 = cv2.inRange(hsv, baixo2, alto2)
+    return cv2.bitwise_or(mascara1, mascara2)
+
+def regra_hsv(tile, ordem, baixo1, alto1, baixo2, alto2):
+    if ordem not in CONVERSAO_HSV:
+        raise ValueError(f"Ordem de canais inválida: {ordem} (use 'RGB' ou 'BGR')")
+    return _faixas_hsv(cv2.cvtColor(tile, CONVERSAO_HSV[ordem]), baixo1, alto1, baixo2, alto2)
+
+def mascara_hsv(tile, p):
+    if p["blur"]:
+        # O blur mistura vizinhos depois da conversão: a regra deixa de ser por pixel
+        if p["classificador"] == "lut":
+            raise ValueError("O classificador 'lut' não se aplica ao kernel hsv com blur")
+        if p["ordem"] not in CONVERSAO_HSV:
+            raise ValueError(f"Ordem de canais inválida: {p['ordem']} (use 'RGB' ou 'BGR')")
+        with etapa("limiar"):
+            hsv = cv2.cvtColor(tile, CONVERSAO_HSV[p["ordem"]])
+            hsv = cv2.GaussianBlur(hsv, (p["blur"], p["blur"]), 0)
+            mascara = _faixas_hsv(hsv, p["baixo1"], p["alto1"], p["baixo2"], p["alto2"])
+    else:
+        mascara = _classificar(tile, p, regra_hsv, "ordem", "baixo1", "alto1", "baixo2", "alto2")
+    return _abrir(mascara) if p["abrir"] else mascara
+
+# Sem blur, matiz vermelha (0-30 ou 150-180) implica R = max(R, G, B) = V, então
+# V >= V mínimo exige R >= V mínimo. Com blur o matiz pode "dar a volta", mas o V
+# borrado nunca passa do maior valor do tile em qualquer canal.
+def prefiltro_hsv(tile, p):
+    v_min = min(int(p["baixo1"][2]), int(p["baixo2"][2]))
+    if p["blur"]:
+        return int(tile.max()) >= v_min
+    R, _, _ = _canais(tile, p["ordem"])
+    return int(R.max()) >= v_min
+
+registrar_kernel(
+    "hsv", mascara_hsv, prefiltro_hsv,
+    ordem="BGR",
+    baixo1=np.array([0, 120, 120]), alto1=np.array([10, 255, 255]),
+    baixo2=np.array([160, 120, 120]), alto2=np.array([180, 255, 255]),
+    blur=0, abrir=True, area_minima=5,
+)
+
+# ==== KERNEL "vermelho_v1": DOMINÂNCIA DO VERMELHO (version 1.0/detectorparalelo.py) ====
+def regra_vermelho_v1(tile, ordem, r_min, dominancia):
+    R, G, B = _canais(tile, ordem)
+    r = R.astype(np.int16)
+    g = G.astype(np.int16)
+    b = B.astype(np.int16)
+
+    red_mask = (r > r_min) & ((r - g) > dominancia) & ((r - b) > dominancia)
+    return red_mask.astype(np.uint8) * 255
+
+def mascara_vermelho_v1(tile, p):
+    binary = _classificar(tile, p, regra_vermelho_v1, "ordem", "r_min", "dominancia")
+    kernel = np.ones((3, 3), np.uint8)
+    with etapa("morfologia"):
+        binary = cv2.morphologyEx(binary, cv2.MORPH_OPEN, kernel)
+        return cv2.dilate(binary, kernel, iterations=1)
+
+def prefiltro_vermelho_v1(tile, p):
+    R, _, _ = _canais(tile, p["ordem"])
+    return int(R.max()) > p["r_min"]
+
+registrar_kernel(
+    "vermelho_v1", mascara_vermelho_v1, prefiltro_vermelho_v1,
+    ordem="BGR", r_min=180, dominancia=80, area_minima=10, extracao="componentes",
+)
+
+# ==== NORMALIZAÇÃO DE CANAIS ====
+# Cinza vira 3 canais e o alfa é descartado, sem mudar a ordem dos canais de cor
+def garantir_3_canais(tile):
+    if tile.ndim == 2:
+        return cv2.cvtColor(tile, cv2.COLOR_GRAY2BGR)
+    if tile.shape[2] == 4:
+        return cv2.cvtColor(tile, cv2.COLOR_BGRA2BGR)
+    return tile
+
+# ==== MÁSCARA E PRÉ-FILTRO ====
+def calcular_mascara(tile, kernel="rgb", **params):
+    p = parametros_kernel(kernel, **params)
+    return KERNELS[kernel]["mascara"](tile, p)
+
+def tile_pode_ter_fogo(tile, kernel="rgb", **params):
+    p = parametros_kernel(kernel, **params)
+    prefiltro = KERNELS[kernel]["prefiltro"]
+    return True if prefiltro is None else prefiltro(tile, p)
+
+def contar_pixels(tile, kernel="hsv", **params):
+    return cv2.countNonZero(calcular_mascara(tile, kernel, **params))
+
+# ==== EXTRAÇÃO DOS FOCOS ====
+# Cor média dos focos a partir dos rótulos na grade da máscara (1..n, na ordem dos focos)
+def _acrescentar_cores(focos, rotulos, tile, p):
+    pixels, somas = somas_cor(rotulos, len(focos), _canais(tile, p["ordem"]), p["zoom"])
+    for i, foco in enumerate(focos):
+        foco["rgb"] = cor_media(int(pixels[i]), somas[i])
+    return focos
+
+def _momentos_contornos(contornos, zoom, area_minima, retornar_contornos):
+    focos = []
+    aceitos = []
+    for contorno in contornos:
+        area = cv2.contourArea(contorno)
+        if area >= area_minima:
+            M = cv2.moments(contorno)
+            if M["m00"] != 0:
+                bx, by, bw, bh = cv2.boundingRect(contorno)
+                foco = {
+                    "x": int(M["m10"] / M["m00"]) // zoom,
+                    "y": int(M["m01"] / M["m00"]) // zoom,
+                    "area": area / zoom ** 2,
+                    "bbox": (bx // zoom, by // zoom, -(-bw // zoom), -(-bh // zoom)),
+                }
+                if retornar_contornos:
+                    foco["contorno"] = contorno
+                focos.append(foco)
+                aceitos.append(contorno)
+    return focos, aceitos
+
+def _extrair_contornos(mascara, tile, p, retornar_contornos):
+    zoom = p["zoom"]
+    with etapa("contornos"):
+        contornos, _ = cv2.findContours(mascara, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    with etapa("momentos"):
+        focos, aceitos = _momentos_contornos(contornos, zoom, p["area_minima"], retornar_contornos)
+
+    if p["cores"] and focos:
+        with etapa("cores"):
+            # Contorno preenchido com o número do foco, restrito aos pixels da máscara
+            rotulos = np.zeros(mascara.shape, dtype=np.int32)
+            for i, contorno in enumerate(aceitos):
+                cv2.drawContours(rotulos, [contorno], -1, i + 1, -1)
+            rotulos[mascara == 0] = 0
+            _acrescentar_cores(focos, rotulos, tile, p)
+    return focos
+
+def _extrair_componentes(mascara, tile, p):
+    with etapa("componentes"):
+        n, rotulos, stats, centroides = cv2.connectedComponentsWithStats(
+            (mascara > 0).astype(np.uint8), connectivity=8, ltype=cv2.CV_32S
+        )
+    with etapa("momentos"):
+        focos, aceitos = _momentos_componentes(n, rotulos, stats, centroides, tile, p)
+
+    if p["cores"] and focos:
+        with etapa("cores"):
+            # Renumera os componentes aceitos como 1..len(focos); os descartados viram fundo
+            novos = np.zeros(n, dtype=np.int32)
+            novos[aceitos] = np.arange(1, len(aceitos) + 1, dtype=np.int32)
+            _acrescentar_cores(focos, novos[rotulos], tile, p)
+    return focos
+
+def _momentos_componentes(n, rotulos, stats, centroides, tile, p):
+    zoom = p["zoom"]
+    if p["subpixel"]:
+        R, _, _ = _canais(tile, p["ordem"])
+        if zoom != 1:
+            R = cv2.resize(R, None, fx=zoom, fy=zoom, interpolation=cv2.INTER_CUBIC)
+        peso, soma_x, soma_y = somas_ponderadas(rotulos, n - 1, R)
+        centros = np.stack([soma_x / peso, soma_y / peso], axis=1)
+    else:
+        centros = centroides[1:]
+
+    focos = []
+    aceitos = []
+    for i in range(n - 1):
+        area = stats[i + 1, cv2.CC_STAT_AREA]
+        if area >= p["area_minima"]:
+            bx, by, bw, bh = stats[i + 1, :4]
+            aceitos.append(i + 1)
+            focos.append({
+                # centro do pixel ampliado j corresponde a (j + 0.5) / zoom - 0.5 na grade original
+                "x": float((centros[i, 0] + 0.5) / zoom - 0.5),
+                "y": float((centros[i, 1] + 0.5) / zoom - 0.5),
+                "area": area / zoom ** 2,
+                "bbox": (int(bx) // zoom, int(by) // zoom, -(-int(bw) // zoom), -(-int(bh) // zoom)),
+            })
+    return focos, aceitos
+
+# ==== DETECÇÃO COMPLETA DE UM TILE ====
+# retornar_contornos: no modo "contornos" inclui o contorno (na grade da máscara) em cada foco
+def detectar(tile, kernel="rgb", retornar_contornos=False, **params):
+    p = parametros_kernel(kernel, **params)
+    mascara = KERNELS[kernel]["mascara"](tile, p)
+    if p["extracao"] == "contornos":
+        return _extrair_contornos(mascara, tile, p, retornar_contornos)
+    if p["extracao"] == "componentes":
+        return _extrair_componentes(mascara, tile, p)
+    raise ValueError(f"Extração inválida: {p['extracao']} (use 'contornos' ou 'componentes')")
+
+# ==== MODO HALO: COMPONENTES DO NÚCLEO E FUSÃO ENTRE TILES ====
+# O tile recebido inclui o halo; (topo, esq, h, w) localizam o núcleo dentro dele
+def detectar_componentes(tile, x, y, topo, esq, h, w, kernel="rgb", **params):
+    p = parametros_kernel(kernel, **params)
+    mascara = KERNELS[kernel]["mascara"](tile, p)
+    pesos = None
+    if p["subpixel"]:
+        pesos, _, _ = _canais(tile, p["ordem"])
+        if p["zoom"] != 1:
+            with etapa("resize"):
+                pesos = cv2.resize(pesos, None, fx=p["zoom"], fy=p["zoom"], interpolation=cv2.INTER_CUBIC)
+    cores = _canais(tile, p["ordem"]) if p["cores"] else None
+    with etapa("componentes"):
+        return componentes_tile(mascara, x, y, topo, esq, h, w, p["zoom"], pesos=pesos, cores=cores)
+
+# A área mínima da fusão é comparada à área em pixels da máscara depois de juntar os pedaços
+def fundir(componentes, tile_size, kernel="rgb", **params):
+    p = parametros_kernel(kernel, **params)
+    return fundir_componentes(componentes, tile_size, p["zoom"], p["area_minima"], p["subpixel"])
+
+# ==== PASSO COMPLETO DE UM TILE (usado pelos executores) ====
+# nucleo=None: devolve a lista de focos do tile.
+# nucleo=(x, y, topo, esq, h, w): modo halo, devolve os componentes do núcleo (ou None).
+# Retorna (resultado, descartado_pelo_prefiltro).
+def processar_tile(tile, nucleo=None, kernel="rgb", prefiltro=True, **params):
+    with etapa("canais"):
+        tile = garantir_3_canais(tile)
+    if prefiltro:
+        with etapa("prefiltro"):
+            pode_ter_fogo = tile_pode_ter_fogo(tile, kernel, **params)
+        if not pode_ter_fogo:
+            return ([] if nucleo is None else None), True
+    if nucleo is None:
+        return detectar(tile, kernel, **params), False
+    return detectar_componentes(tile, *nucleo, kernel, **params), False
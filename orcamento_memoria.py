@@ -0,0 +1,150 @@
+import re
+import sys
+import tracemalloc
+import numpy as np
+import motor_deteccao
+from agendador_tiles import MEMORIA_BASE_PROCESSO
+
+# ==== ORÇAMENTO DE MEMÓRIA (max_memoria) ====
+# Estima o pico de memória de uma execução e ajusta workers, tiles em voo e tile_size
+# para que ele caiba no orçamento. O pico é:
+#   parte fixa (interpretador do principal, canvas raster, cena decodificada em memória
+#   compartilhada) + workers x (interpretador do worker + tiles em voo + trabalho do kernel)
+# O trabalho do kernel por pixel (tile ampliado, canais separados, máscaras, rótulos)
+# é medido uma vez por kernel/parâmetros com tracemalloc num tile sintético: os arrays do
+# NumPy e os devolvidos pelo OpenCV passam pelo alocador que o tracemalloc acompanha, e
+# o custo por pixel é praticamente constante com o tamanho do tile.
+
+LADO_CALIBRACAO = 256
+MARGEM_ESTIMATIVA = 1.25      # buffers internos do OpenCV que o tracemalloc não vê
+TILE_MINIMO = 256             # abaixo disso o governador desiste em vez de encolher mais
+UNIDADES = {"": 1, "b": 1, "k": 1024, "kb": 1024, "kib": 1024, "m": 1024**2, "mb": 1024**2, "mib": 1024**2,
+            "g": 1024**3, "gb": 1024**3, "gib": 1024**3, "t": 1024**4, "tb": 1024**4, "tib": 1024**4}
+
+_calibrados = {}  # (kernel, parâmetros, halo) -> bytes por pixel do tile de entrada
+
+# "8GB", "512 MiB", 2e9 -> bytes (as unidades são potências de 1024)
+def interpretar_bytes(valor):
+    if isinstance(valor, (int, float)):
+        return int(valor)
+    m = re.fullmatch(r"\s*([\d.]+)\s*([a-zA-Z]*)\s*", str(valor))
+    if m is None or m.group(2).lower() not in UNIDADES:
+        raise ValueError(f"Tamanho de memória inválido: {valor} (ex.: 8GB, 512MB ou bytes)")
+    return int(float(m.group(1)) * UNIDADES[m.group(2).lower()])
+
+# ==== CALIBRAÇÃO DO KERNEL ====
+# Tile com uma grade de focos (pior caso para contornos, rótulos e cores), sem pré-filtro
+def _tile_calibracao(ordem):
+    tile = np.full((LADO_CALIBRACAO, LADO_CALIBRACAO, 3), 60, dtype=np.uint8)
+    fogo = (230, 40, 30) if ordem == "RGB" else (30, 40, 230)
+    for y in range(8, LADO_CALIBRACAO, 24):
+        for x in range(8, LADO_CALIBRACAO, 24):
+            tile[y:y + 8, x:x + 8] = fogo
+    return tile
+
+def bytes_por_pixel(kernel, parametros, halo=False):
+    chave = (kernel, repr(sorted(parametros.items())), halo)
+    if chave not in _calibrados:
+        p = motor_deteccao.parametros_kernel(kernel, **parametros)
+        tile = _tile_calibracao(p["ordem"])
+        nucleo = (0, 0, 0, 0, LADO_CALIBRACAO, LADO_CALIBRACAO) if halo else None
+        motor_deteccao.processar_tile(tile, nucleo, kernel, False, **parametros)  # aquecimento (caches, LUT)
+        ja_ativo = tracemalloc.is_tracing()
+        if not ja_ativo:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        try:
+            motor_deteccao.processar_tile(tile, nucleo, kernel, False, **parametros)
+            pico = tracemalloc.get_traced_memory()[1] - base
+        finally:
+            if not ja_ativo:
+                tracemalloc.stop()
+        _calibrados[chave] = MARGEM_ESTIMATIVA * pico / LADO_CALIBRACAO ** 2
+    return _calibrados[chave]
+
+# Bytes de trabalho para detectar um tile altura x largura (entrada não incluída)
+def memoria_kernel(kernel, parametros, altura, largura, halo=False):
+    return int(bytes_por_pixel(kernel, parametros, halo) * altura * largura)
+
+# ==== GOVERNADOR ====
+# orcamento: bytes; fixo: bytes que não dependem dos workers (o governador soma o
+# interpretador do principal). extra_worker: bytes por worker além do tile (cache de
+# segmentos...). em_voo: tiles de entrada que cada worker segura de uma vez (chunk do
+# pickle, slots do anel); em_voo_minimo é até onde ele pode ser reduzido.
+# passo: o tile encolhido continua múltiplo dele (segmentos do TIFF).
+# Retorna {"tile_size", "workers", "em_voo", "fixo", "por_worker", "ajustes", ...}; ValueError se
+# nem um worker com o menor tile cabe.
+def governar(orcamento, fixo, kernel, parametros, tile_size, workers, canais=3, halo=None,
+             processos=True, extra_worker=0, em_voo=1, em_voo_minimo=1, passo=1):
+    fixo += MEMORIA_BASE_PROCESSO
+    livre = orcamento - fixo
+    if livre <= 0:
+        raise ValueError(f"O orçamento de {orcamento / 1024**2:.0f} MB não cobre nem a parte fixa da execução "
+                         f"({fixo / 1024**2:.0f} MB: principal, canvas ou cena em memória)")
+    ajustes = []
+    base = (MEMORIA_BASE_PROCESSO if processos else 0) + extra_worker
+
+    def por_worker(lado_tile, n_em_voo):
+        lado = lado_tile + 2 * (halo or 0)
+        return base + memoria_kernel(kernel, parametros, lado, lado, halo is not None) + n_em_voo * lado * lado * canais
+
+    pedido_tile, pedido_workers, pedido_em_voo = tile_size, workers, em_voo
+    while True:
+        if livre // por_worker(tile_size, em_voo) >= workers:
+            break
+        # 1º menos tiles em voo por worker, 2º menos workers, 3º tiles menores
+        cabe_em_voo = em_voo
+        while cabe_em_voo > em_voo_minimo and livre // por_worker(tile_size, cabe_em_voo) < workers:
+            cabe_em_voo -= 1
+        if livre // por_worker(tile_size, cabe_em_voo) >= workers:
+            em_voo = cabe_em_voo
+            break
+        em_voo = em_voo_minimo
+        cabem = int(livre // por_worker(tile_size, em_voo))
+        if cabem >= 1:
+            workers = cabem
+            break
+        menor = max(passo, tile_size // 2 // passo * passo)
+        if menor >= tile_size or menor < min(TILE_MINIMO, pedido_tile):
+            raise ValueError(f"O orçamento de {orcamento / 1024**2:.0f} MB não comporta nem um worker com tiles de "
+                             f"{tile_size}px ({por_worker(tile_size, em_voo) / 1024**2:.0f} MB por worker, "
+                             f"{livre / 1024**2:.0f} MB livres)")
+        tile_size = menor
+
+    if em_voo != pedido_em_voo:
+        ajustes.append(f"tiles em voo por worker {pedido_em_voo} -> {em_voo}")
+    if workers != pedido_workers:
+        ajustes.append(f"workers {pedido_workers} -> {workers}")
+    if tile_size != pedido_tile:
+        ajustes.append(f"tile {pedido_tile} -> {tile_size}")
+    return {"tile_size": tile_size, "workers": workers, "em_voo": em_voo, "orcamento": orcamento,
+            "fixo": fixo, "por_worker": por_worker(tile_size, em_voo), "ajustes": ajustes}
+
+# ==== PICO MEDIDO ====
+# (principal, maior worker já encerrado) em bytes, pelo getrusage; None sem o módulo
+# resource (Windows). ru_maxrss vem em KB no Linux e em bytes no macOS. Os dois são
+# máximos desde o início do interpretador e não voltam a zero: com várias execuções no
+# mesmo processo valem para todas juntas, não só para a última.
+def pico_medido():
+    try:
+        import resource
+    except ImportError:
+        return None
+    escala = 1 if sys.platform == "darwin" else 1024
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * escala,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * escala)
+
+# workers: os que de fato rodaram (o autoajuste pode ter escolhido menos que o governador)
+def resumo_memoria(governo, workers=None):
+    workers = governo["workers"] if workers is None else workers
+    pico = governo["fixo"] + workers * governo["por_worker"]
+    texto = (f"🧮 Memória: pico estimado {pico / 1024**2:.0f} MB "
+             f"de {governo['orcamento'] / 1024**2:.0f} MB ({workers} workers, tile {governo['tile_size']})")
+    medido = pico_medido()
+    if medido is not None:
+        principal, worker = medido
+        texto += f" | RSS máximo desde o início do processo: principal {principal / 1024**2:.0f} MB"
+        if worker:
+            texto += f", maior worker encerrado {worker / 1024**2:.0f} MB"
+    return texto
@@ -0,0 +1,191 @@
+import csv
+import json
+import os
+import numpy as np
+import tifffile as tiff
+
+# ==== REGISTROS DAS DETECÇÕES (CSV / Parquet / GeoJSON) ====
+# Um registro compacto por foco, gravado à medida que os tiles terminam: nada da cena
+# fica em memória, então o overlay raster passa a ser opcional (saida_tiles.MODO_NENHUM).
+# Colunas: cena, tile_x, tile_y (origem do tile que achou o foco), x, y
+# (centro global em pixels), area, bbox_x, bbox_y, bbox_w, bbox_h, r, g, b (cor média,
+# exige o parâmetro cores=True do motor_deteccao) e, em GeoTIFFs, mapa_x, mapa_y no
+# sistema de coordenadas da cena.
+
+FORMATOS_REGISTRO = {".csv": "csv", ".parquet": "parquet", ".geojson": "geojson", ".json": "geojson"}
+CAMPOS = ("cena", "tile_x", "tile_y", "x", "y", "area", "bbox_x", "bbox_y", "bbox_w", "bbox_h", "r", "g", "b")
+CAMPOS_MAPA = ("mapa_x", "mapa_y")
+LOTE_PARQUET = 65536  # linhas por row group do Parquet
+TIPOS_PARQUET = {"cena": "string", "tile_x": "int64", "tile_y": "int64", "bbox_x": "int64", "bbox_y": "int64",
+                 "bbox_w": "int64", "bbox_h": "int64"}  # demais colunas: float64
+
+# Tags GeoTIFF usadas quando o rasterio não está instalado
+TAG_ESCALA = 33550          # ModelPixelScaleTag
+TAG_PONTO_AMARRACAO = 33922  # ModelTiepointTag
+TAG_TRANSFORMACAO = 34264   # ModelTransformationTag
+
+# ==== GEORREFERÊNCIA DA CENA ====
+# Retorna {"transformacao": (a, b, c, d, e, f), "crs": texto ou None} ou None se a cena
+# não for georreferenciada. Pixel (col, lin) -> mapa (a*col + b*lin + c, d*col + e*lin + f),
+# com (0, 0) no canto superior esquerdo do primeiro pixel, como no rasterio.
+def georreferencia(caminho):
+    if os.path.splitext(caminho)[1].lower() not in (".tif", ".tiff"):
+        return None
+    try:
+        import rasterio
+    except ImportError:
+        return _georreferencia_tags(caminho)
+
+    import warnings
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", rasterio.errors.NotGeoreferencedWarning)
+        with rasterio.open(caminho) as src:
+            return georreferencia_rasterio(src)
+
+def georreferencia_rasterio(src):
+    t = src.transform
+    transformacao = (t.a, t.b, t.c, t.d, t.e, t.f)
+    if transformacao == (1.0, 0.0, 0.0, 0.0, 1.0, 0.0) and src.crs is None:
+        return None  # sem georreferência o rasterio devolve a identidade
+    return {"transformacao": transformacao, "crs": src.crs.to_string() if src.crs else None}
+
+def _georreferencia_tags(caminho):
+    with tiff.TiffFile(caminho) as tif:
+        tags = tif.pages[0].tags
+        if TAG_TRANSFORMACAO in tags:
+            m = tags[TAG_TRANSFORMACAO].value
+            return {"transformacao": (m[0], m[1], m[3], m[4], m[5], m[7]), "crs": None}
+        if TAG_ESCALA in tags and TAG_PONTO_AMARRACAO in tags:
+            sx, sy = tags[TAG_ESCALA].value[:2]
+            i, j, _, px, py = tags[TAG_PONTO_AMARRACAO].value[:5]
+            return {"transformacao": (sx, 0.0, px - i * sx, 0.0, -sy, py + j * sy), "crs": None}
+    return None
+
+# Centro do pixel: (x + 0.5, y + 0.5) vale para os centros inteiros e para os sub-pixel
+def pixel_para_mapa(georef, x, y):
+    a, b, c, d, e, f = georef["transformacao"]
+    col = np.asarray(x, dtype=np.float64) + 0.5
+    lin = np.asarray(y, dtype=np.float64) + 0.5
+    return a * col + b * lin + c, d * col + e * lin + f
+
+# ==== FOCOS DO TILE EM COORDENADAS GLOBAIS ====
+# "tile" guarda a origem (x, y) do tile de onde o foco saiu
+def focos_globais(focos, x, y):
+    globais = []
+    for f in focos:
+        bx, by, bw, bh = f["bbox"]
+        g = dict(f, x=f["x"] + x, y=f["y"] + y, bbox=(bx + x, by + y, bw, bh), tile=(x, y))
+        g.pop("contorno", None)
+        globais.append(g)
+    return globais
+
+# Focos da fusão com halo (já globais) podem cruzar tiles: fica o tile que contém o centro
+def atribuir_tiles(focos, tile_size):
+    for f in focos:
+        f["tile"] = (int(f["x"]) // tile_size * tile_size, int(f["y"]) // tile_size * tile_size)
+    return focos
+
+# Identificador da cena: nome do arquivo sem a extensão
+def cena_da_imagem(caminho):
+    return os.path.splitext(os.path.basename(caminho))[0]
+
+# ==== ABERTURA, ESCRITA E FECHAMENTO ====
+# O escritor é um dict com o arquivo aberto; o formato sai da extensão do caminho.
+# georef: resultado de georreferencia() (None grava só as coordenadas em pixels).
+def abrir_registros(caminho, cena, georef=None, formato=None):
+    if formato is None:
+        formato = FORMATOS_REGISTRO.get(os.path.splitext(caminho)[1].lower())
+    if formato not in FORMATOS_REGISTRO.values():
+        raise ValueError(f"Formato de registros inválido para {caminho} (use uma das extensões {sorted(FORMATOS_REGISTRO)})")
+    pasta = os.path.dirname(caminho)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+
+    campos = CAMPOS + (CAMPOS_MAPA if georef is not None else ())
+    registros = {"caminho": caminho, "formato": formato, "cena": cena, "georef": georef, "campos": campos, "n": 0}
+    if formato == "csv":
+        registros["arquivo"] = open(caminho, "w", newline="")
+        registros["csv"] = csv.writer(registros["arquivo"])
+        registros["csv"].writerow(campos)
+    elif formato == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError("Registros em Parquet exigem o pacote pyarrow (pip install pyarrow); use .csv ou .geojson")
+        registros["lote"] = []
+        registros["parquet"] = None
+    else:
+        registros["arquivo"] = open(caminho, "w")
+        cabecalho = {"type": "FeatureCollection", "name": cena}
+        if georef is not None and georef["crs"] is not None:
+            # Geometria no CRS da cena (coordenadas mapa_x, mapa_y), como no GeoJSON de 2008
+            cabecalho["crs"] = {"type": "name", "properties": {"name": georef["crs"]}}
+        registros["arquivo"].write(json.dumps(cabecalho)[:-1] + ', "features": [\n')
+    return registros
+
+def _numero(v):
+    return v.item() if isinstance(v, np.generic) else v
+
+def _linhas(registros, focos):
+    if registros["georef"] is not None:
+        mx, my = pixel_para_mapa(registros["georef"], [f["x"] for f in focos], [f["y"] for f in focos])
+    for i, f in enumerate(focos):
+        bx, by, bw, bh = f["bbox"]
+        r, g, b = f.get("rgb") or (None, None, None)
+        tx, ty = f["tile"]
+        linha = [registros["cena"], int(tx), int(ty),
+                 _numero(f["x"]), _numero(f["y"]), float(f["area"]), int(bx), int(by), int(bw), int(bh), r, g, b]
+        if registros["georef"] is not None:
+            linha += [float(mx[i]), float(my[i])]
+        yield linha
+
+# focos: dicts do motor_deteccao em coordenadas globais, com "tile" (focos_globais ou atribuir_tiles)
+def escrever_registros(registros, focos):
+    if not focos:
+        return
+    formato = registros["formato"]
+    if formato == "csv":
+        registros["csv"].writerows(_linhas(registros, focos))
+    elif formato == "parquet":
+        registros["lote"].extend(_linhas(registros, focos))
+        if len(registros["lote"]) >= LOTE_PARQUET:
+            _gravar_lote_parquet(registros)
+    else:
+        georreferenciado = registros["georef"] is not None
+        features = []
+        for linha in _linhas(registros, focos):
+            propriedades = dict(zip(registros["campos"], linha))
+            ponto = [propriedades["mapa_x"], propriedades["mapa_y"]] if georreferenciado else [propriedades["x"], propriedades["y"]]
+            features.append(json.dumps({"type": "Feature", "geometry": {"type": "Point", "coordinates": ponto},
+                                        "properties": propriedades}))
+        registros["arquivo"].write(("" if registros["n"] == 0 else ",\n") + ",\n".join(features))
+    registros["n"] += len(focos)
+
+def _gravar_lote_parquet(registros):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    esquema = pa.schema([(nome, TIPOS_PARQUET.get(nome, "float64")) for nome in registros["campos"]])
+    colunas = list(zip(*registros["lote"])) if registros["lote"] else [() for _ in registros["campos"]]
+    tabela = pa.table({nome: list(valores) for nome, valores in zip(registros["campos"], colunas)}, schema=esquema)
+    if registros["parquet"] is None:
+        registros["parquet"] = pq.ParquetWriter(registros["caminho"], esquema)
+    registros["parquet"].write_table(tabela)
+    registros["lote"] = []
+
+# Retorna o número de registros gravados
+def fechar_registros(registros):
+    formato = registros["formato"]
+    if formato == "parquet":
+        if registros["lote"] or registros["parquet"] is None:
+            _gravar_lote_parquet(registros)
+        registros["parquet"].close()
+    else:
+        if formato == "geojson":
+            registros["arquivo"].write("\n]}\n")
+        registros["arquivo"].close()
+    return registros["n"]
+
+# ==== LEITURA DE VOLTA (CSV) ====
+def carregar_registros_csv(caminho):
+    with open(caminho, newline="") as f:
+        return list(csv.DictReader(f))
@@ -0,0 +1,101 @@
+import numpy as np
+import tifffile as tiff
+import cv2
+import os
+
+# ==== CONFIGURAÇÕES DO OVERLAY ====
+RAIO_CIRCULO = 6
+ESPESSURA_CIRCULO = 2
+COR_CIRCULO_RGB = (255, 0, 0)  # tifffile grava os canais como estão (RGB)
+TILE_SAIDA = 512               # tamanho do tile interno do BigTIFF (múltiplo de 16)
+
+# Modos de saída aceitos pelos detectores
+MODO_RASTER = "raster"          # canvas np.zeros do tamanho da cena (comportamento original)
+MODO_TIFF = "tiff"              # overlay gravado tile a tile em BigTIFF
+MODO_DETECCOES = "deteccoes"    # apenas a lista de focos; overlay desenhado sob demanda
+MODO_NENHUM = "nenhum"          # nenhum arquivo de saída além dos registros (registros_deteccoes)
+MODOS_SAIDA = (MODO_RASTER, MODO_TIFF, MODO_DETECCOES, MODO_NENHUM)
+
+# ==== AGRUPA OS FOCOS POR CÉLULA PARA BUSCA RÁPIDA ====
+def agrupar_deteccoes_por_celula(deteccoes, tamanho_celula):
+    celulas = {}
+    for cx, cy in deteccoes:
+        celulas.setdefault((int(cx) // tamanho_celula, int(cy) // tamanho_celula), []).append((cx, cy))
+    return celulas
+
+# ==== DESENHA OS CÍRCULOS QUE CAEM EM UMA JANELA (x, y, largura, altura) ====
+def desenhar_overlay_janela(deteccoes, x, y, largura, altura, celulas=None, tamanho_celula=TILE_SAIDA, cor=COR_CIRCULO_RGB):
+    margem = RAIO_CIRCULO + ESPESSURA_CIRCULO + 2  # traço grosso ultrapassa o raio
+    # Desenha numa tela com borda para que o recorte do OpenCV nas bordas da janela
+    # não altere o traçado (o resultado fica idêntico ao canvas da cena inteira)
+    tela = np.zeros((altura + 2 * margem, largura + 2 * margem, 3), dtype=np.uint8)
+
+    if celulas is None:
+        candidatos = deteccoes
+    else:
+        candidatos = []
+        for cy_cel in range((y - margem) // tamanho_celula, (y + altura + margem) // tamanho_celula + 1):
+            for cx_cel in range((x - margem) // tamanho_celula, (x + largura + margem) // tamanho_celula + 1):
+                candidatos.extend(celulas.get((cx_cel, cy_cel), ()))
+
+    for cx, cy in candidatos:
+        # centros sub-pixel (float) são arredondados só na hora de desenhar
+        cx, cy = int(round(cx)), int(round(cy))
+        if x - margem <= cx < x + largura + margem and y - margem <= cy < y + altura + margem:
+            cv2.circle(tela, (cx - x + margem, cy - y + margem), RAIO_CIRCULO, cor, ESPESSURA_CIRCULO)
+    return tela[margem:margem + altura, margem:margem + largura]
+
+# ==== GERA OS TILES DO OVERLAY NA ORDEM ESPERADA PELO TIFFFILE ====
+def gerar_tiles_overlay(deteccoes, height, width, tile_saida=TILE_SAIDA):
+    celulas = agrupar_deteccoes_por_celula(deteccoes, tile_saida)
+    for y in range(0, height, tile_saida):
+        for x in range(0, width, tile_saida):
+            # tifffile espera tiles completos; as bordas ficam com preenchimento zero
+            yield desenhar_overlay_janela(deteccoes, x, y, tile_saida, tile_saida, celulas, tile_saida)
+
+# ==== GRAVA O OVERLAY EM BIGTIFF SEM ALOCAR A CENA INTEIRA ====
+def salvar_overlay_tiff(output_path, deteccoes, height, width, tile_saida=TILE_SAIDA, compression="zlib"):
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    tiff.imwrite(
+        output_path,
+        gerar_tiles_overlay(deteccoes, height, width, tile_saida),
+        shape=(height, width, 3),
+        dtype=np.uint8,
+        tile=(tile_saida, tile_saida),
+        photometric="rgb",
+        compression=compression,
+        bigtiff=True,
+    )
+
+# ==== LISTA DE FOCOS EM DISCO (modo "deteccoes") ====
+def caminho_deteccoes(output_path):
+    return os.path.splitext(output_path)[0] + "_deteccoes.npy"
+
+def salvar_deteccoes(output_path, deteccoes):
+    caminho = caminho_deteccoes(output_path)
+    output_dir = os.path.dirname(caminho)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    # int64 para centros inteiros, float64 quando vierem do modo sub-pixel
+    dados = np.asarray(deteccoes).reshape(-1, 2)
+    if not np.issubdtype(dados.dtype, np.floating):
+        dados = dados.astype(np.int64)
+    np.save(caminho, dados)
+    return caminho
+
+def carregar_deteccoes(caminho):
+    return [tuple(p) for p in np.load(caminho).tolist()]
+
+# ==== GRAVA A SAÍDA NO MODO ESCOLHIDO ====
+def salvar_saida(output_mode, output_path, deteccoes, height, width):
+    if output_mode == MODO_TIFF:
+        salvar_overlay_tiff(output_path, deteccoes, height, width)
+        return output_path
+    if output_mode == MODO_DETECCOES:
+        return salvar_deteccoes(output_path, deteccoes)
+    if output_mode == MODO_NENHUM:
+        return None
+    raise ValueError(f"Modo de saída inválido: {output_mode} (use um de {MODOS_SAIDA})")
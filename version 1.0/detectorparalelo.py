@@ -1,93 +1,135 @@
 import numpy as np
-import tifffile as tiff
 import cv2
 import time
 import os
-from skimage.measure import label, regionprops
+import sys
 from tqdm import tqdm
 import multiprocessing
 
-def preprocess_tile_for_fire(tile):
-    if tile.shape[2] == 4:
-        tile = cv2.cvtColor(tile, cv2.COLOR_BGRA2BGR)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import motor_deteccao
+import leitor_tiles
+import anel_memoria
+import registros_deteccoes
+import orcamento_memoria
 
-    r = tile[:, :, 2].astype(np.int16)
-    g = tile[:, :, 1].astype(np.int16)
-    b = tile[:, :, 0].astype(np.int16)
+# Kernel "vermelho_v1" do motor_deteccao: R > 180 e R dominando G e B por 80,
+# abertura + dilatação e componentes 8-conexos (mesma semântica do label/regionprops)
+def get_fire_focos(tile, area_minima=1, ordem="BGR", cores=False):
+    return motor_deteccao.detectar(motor_deteccao.garantir_3_canais(tile), "vermelho_v1", ordem=ordem, area_minima=area_minima, cores=cores)
 
-    red_mask = (r > 180) & ((r - g) > 80) & ((r - b) > 80)
-
-    binary = np.zeros(tile.shape[:2], dtype=np.uint8)
-    binary[red_mask] = 255
-
-    kernel = np.ones((3, 3), np.uint8)
-    binary = cv2.morphologyEx(binary, cv2.MORPH_OPEN, kernel)
-    binary = cv2.dilate(binary, kernel, iterations=1)
-
-    return binary
-
-def get_fire_centroids(tile, area_minima=1):
-    binary = preprocess_tile_for_fire(tile)
-    labeled = label(binary)
-    props = regionprops(labeled)
-    centroids = [region.centroid for region in props if region.area >= area_minima]
-    return centroids
+def get_fire_centroids(tile, area_minima=1, ordem="BGR"):
+    focos = get_fire_focos(tile, area_minima, ordem)
+    return [(f["y"], f["x"]) for f in focos]  # (linha, coluna), como o regionprops
 
+# Os workers devolvem os focos completos; o desenho usa só os centros
 def process_tile_wrapper(args):
-    tile, x, y = args
-    centroids = get_fire_centroids(tile, area_minima=10)
-    return x, y, centroids
-
-def process_large_image_parallel(image_path, tile_size=1024, output_path="resultados_paralelo/resultado_incendios_paralelo.tiff", num_threads=4, chunk_size=10):
+    tile, x, y, ordem, cores = args
+    return x, y, get_fire_focos(tile, area_minima=10, ordem=ordem, cores=cores)
+
+# Modo "anel": o tile chega como vista de um slot de memória compartilhada
+def process_tile_anel(tile, meta):
+    x, y, ordem, cores = meta
+    return x, y, get_fire_focos(tile, area_minima=10, ordem=ordem, cores=cores)
+
+# transporte: "pickle" manda cada tile pelo pipe do Pool (original);
+# "anel" copia os tiles para um anel de memória compartilhada (ver anel_memoria.py)
+def process_large_image_parallel(image_path, tile_size=1024, output_path="resultados_paralelo/resultado_incendios_paralelo.tiff", num_threads=4, chunk_size=10, transporte="pickle", registros=None, salvar_overlay=True, max_memoria=None):
+    # registros: caminho .csv, .parquet ou .geojson com um registro por foco (ver registros_deteccoes.py)
+    # salvar_overlay: False dispensa a imagem de saída (e o canvas do tamanho da cena)
+    # max_memoria: orçamento ("8GB", "512MB" ou bytes); reduz chunk_size (tiles em voo no pickle),
+    # workers e, se preciso, o tile_size (ver orcamento_memoria.py)
+    if transporte not in ("pickle", "anel"):
+        raise ValueError(f"Transporte inválido: {transporte} (use 'pickle' ou 'anel')")
+    if max_memoria is not None:
+        max_memoria = orcamento_memoria.interpretar_bytes(max_memoria)
     print(f"🔄 Carregando imagem: {image_path}")
     start = time.time()
 
-    ext = os.path.splitext(image_path)[1].lower()
-    if ext in [".tif", ".tiff"]:
-        with tiff.TiffFile(image_path) as tif:
-            page = tif.pages[0]
-            height, width = page.shape[:2]
-            img = tif.asarray(out='memmap')
-    else:
-        img = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
-        if img is None:
-            raise FileNotFoundError(f"Imagem não encontrada: {image_path}")
-        if img.ndim == 2:
-            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
-        elif img.shape[2] == 4:
-            img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
-        height, width = img.shape[:2]
+    # Sem cópia da cena: TIFF sem compressão é mapeado direto do arquivo, TIFF em tiles/strips
+    # decodifica só os segmentos de cada janela; JPG/PNG (e TIFF comprimido sem segmentos)
+    # continuam decodificados inteiros (ver leitor_tiles.py)
+    leitor = leitor_tiles.abrir_leitor_local(image_path)
+    height, width = leitor["shape"][:2]
+    ordem = leitor["ordem"]  # tifffile entrega RGB, cv2.imread entrega BGR
+    dtype = leitor["imagem"].dtype if "imagem" in leitor else leitor["page"].dtype
+    canais = leitor["shape"][2] if len(leitor["shape"]) > 2 else 1
 
     print(f"📐 Dimensões da imagem: {width}x{height}")
-    print(f"⚙️ Usando {num_threads} threads para processamento paralelo.")
-
-    tiles_data = []
-    ys = list(range(0, height, tile_size))
-    xs = list(range(0, width, tile_size))
-    for y in ys:
-        for x in xs:
-            tile = img[y:min(y+tile_size, height), x:min(x+tile_size, width)]
-            tiles_data.append((tile, x, y))
-
-    output = np.zeros((height, width, 3), dtype=np.uint8)
-    total_fires_detected = 0
-
-    print("▶️ Processando tiles (paralelo)...")
-
-    with multiprocessing.Pool(processes=num_threads) as pool:
-        results = pool.imap_unordered(process_tile_wrapper, tiles_data, chunksize=chunk_size)
-
-        for x_coord, y_coord, centroids in tqdm(results, total=len(tiles_data), desc="Tiles Processados", unit="tile"):
-            total_fires_detected += len(centroids)
-            for cy, cx in centroids:
-                cv2.circle(output, (int(cx)+x_coord, int(cy)+y_coord), 6, (0, 0, 255), 2)
-
-    # Garante que a pasta de saída exista
-    output_dir = os.path.dirname(output_path)
-    os.makedirs(output_dir, exist_ok=True)
-
-    # Salva imagem final
-    cv2.imwrite(output_path, output)
+    print(f"📖 Leitura dos tiles: {leitor['modo']}")
+    governo = None
+    escritor = None
+    try:
+        if max_memoria is not None:
+            # No pickle cada worker segura um chunk de tiles; no anel, os seus slots
+            em_voo, minimo = (chunk_size, 1) if transporte == "pickle" else (anel_memoria.SLOTS_POR_WORKER,) * 2
+            fixo = height * width * 3 if salvar_overlay else 0
+            if leitor["modo"] == leitor_tiles.MODO_COMPARTILHADA:
+                fixo += leitor["imagem"].nbytes
+            governo = orcamento_memoria.governar(max_memoria, fixo, "vermelho_v1", {"area_minima": 10, "ordem": ordem},
+                                                 tile_size, num_threads, canais, em_voo=em_voo, em_voo_minimo=minimo)
+            tile_size, num_threads = governo["tile_size"], governo["workers"]
+            if transporte == "pickle":
+                chunk_size = governo["em_voo"]
+            print(f"🧮 Orçamento de memória {max_memoria / 1024**2:.0f} MB: " +
+                  (", ".join(governo["ajustes"]) if governo["ajustes"] else "cabe sem ajustes"))
+        print(f"⚙️ Usando {num_threads} threads para processamento paralelo.")
+
+        # Janelas geradas sob demanda: cada tile só é lido quando o transporte pede o próximo
+        n_tiles = -(-height // tile_size) * -(-width // tile_size)
+        janelas = ((x, y, min(y+tile_size, height), min(x+tile_size, width))
+                   for y in range(0, height, tile_size) for x in range(0, width, tile_size))
+        cores = registros is not None
+
+        output = np.zeros((height, width, 3), dtype=np.uint8) if salvar_overlay else None
+        if registros is not None:
+            escritor = registros_deteccoes.abrir_registros(
+                registros, registros_deteccoes.cena_da_imagem(image_path), registros_deteccoes.georreferencia(image_path)
+            )
+
+        print(f"▶️ Processando tiles (paralelo, transporte {transporte})...")
+
+        def desenhar(results):
+            total = 0
+            for x_coord, y_coord, focos in tqdm(results, total=n_tiles, desc="Tiles Processados", unit="tile"):
+                total += len(focos)
+                if escritor is not None:
+                    registros_deteccoes.escrever_registros(escritor, registros_deteccoes.focos_globais(focos, x_coord, y_coord))
+                if output is not None:
+                    for f in focos:
+                        cv2.circle(output, (int(f["x"])+x_coord, int(f["y"])+y_coord), 6, (0, 0, 255), 2)
+            return total
+
+        if transporte == "anel":
+            # A janela é lida direto para o slot quando ele fica livre; só o handle vai para o worker
+            produtor = ((lambda destino, y=y, y1=y1, x=x, x1=x1: np.copyto(destino, leitor_tiles.ler_janela(leitor, y, y1, x, x1)),
+                         (y1 - y, x1 - x) + tuple(leitor["shape"][2:]), dtype, (x, y, ordem, cores))
+                        for x, y, y1, x1 in janelas)
+            total_fires_detected = desenhar(anel_memoria.processar_em_anel(
+                produtor, process_tile_anel, num_threads,
+                bytes_slot=tile_size * tile_size * canais * dtype.itemsize,
+            ))
+        else:
+            # O Pool consome o gerador numa thread própria; a escrita no pipe bloqueia quando os
+            # workers não dão conta, então só alguns chunks ficam lidos à frente
+            tarefas = ((leitor_tiles.ler_janela(leitor, y, y1, x, x1), x, y, ordem, cores) for x, y, y1, x1 in janelas)
+            with multiprocessing.Pool(processes=num_threads) as pool:
+                results = pool.imap_unordered(process_tile_wrapper, tarefas, chunksize=chunk_size)
+                total_fires_detected = desenhar(results)
+    finally:
+        leitor_tiles.fechar_leitor(leitor)
+        if escritor is not None:
+            print(f"🗒️ {registros_deteccoes.fechar_registros(escritor)} registros gravados em: {registros}")
+
+    if output is not None:
+        # Garante que a pasta de saída exista
+        output_dir = os.path.dirname(output_path)
+        os.makedirs(output_dir, exist_ok=True)
+
+        # Salva imagem final
+        cv2.imwrite(output_path, output)
+    if governo is not None:
+        print(orcamento_memoria.resumo_memoria(governo))
     elapsed = time.time() - start
     print(f"✅ Processamento Paralelo Concluído: {total_fires_detected} focos detectados em {elapsed:.2f} segundos.")
     return elapsed, total_fires_detected
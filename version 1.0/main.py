@@ -1,5 +1,7 @@
 from mpi4py import MPI
 import os
+import sys
+import csv
 import rasterio
 from rasterio.windows import Window
 import numpy as np
@@ -7,6 +9,14 @@ import cv2
 import time
 import warnings
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fusao_tiles import janela_com_halo
+import motor_deteccao
+import registros_deteccoes
+import leitura_antecipada
+import orcamento_memoria
+from saida_tiles import salvar_overlay_tiff
+
 warnings.filterwarnings("ignore", category=rasterio.errors.NotGeoreferencedWarning)
 
 
@@ -29,6 +39,41 @@ VERMELHO_BAIXO2 = np.array([170, 100, 100])
 VERMELHO_ALTO2 = np.array([179, 255, 255])
 AREA_MINIMA = 50 # Área mínima para considerar como foco (pixeis)
 
+# Borda extra lida em volta de cada tile (None = tiles disjuntos, como antes).
+# Com halo os focos que cruzam a borda entre tiles são fundidos, então a contagem
+# não depende do TILE_SIZE; nesse modo AREA_MINIMA é comparada à área em pixels.
+HALO = None
+
+# Registros por foco (coordenadas de mapa do GeoTIFF incluídas): ".csv", ".parquet",
+# ".geojson" ou None (padrão, sem registros nem cor média dos focos). Cada rank grava os
+# das suas imagens em resultados/registros_<nome>.
+FORMATO_REGISTROS = None
+SALVAR_OVERLAY = True  # False: só os registros, sem alocar a imagem final do tamanho da cena
+
+# Distribuição do trabalho entre os ranks:
+#   "imagens": cada rank processa imagens inteiras (imagens[rank::size]), como antes
+#   "tiles": o rank 0 distribui unidades (imagem, tile) sob demanda para os demais ranks
+#            (mestre/trabalhador); uma cena grande ocupa todos os ranks
+MODO_DISTRIBUICAO = "imagens"
+MODOS_DISTRIBUICAO = ("imagens", "tiles")
+
+# Tiles que uma thread leitora deixa prontos (src.read) enquanto o atual é detectado, no
+# modo "imagens" (0 = lê e detecta alternadamente, como antes). No modo "tiles" cada
+# trabalhador pede uma unidade por vez ao mestre e não antecipa: reservar unidades
+# adiantadas atrapalharia o balanceamento.
+PROFUNDIDADE_LEITURA = 2
+
+# Orçamento de memória por rank (ex.: "8GB"; None = sem limite, como antes). Cada rank é um
+# processo só, sem workers: no modo "imagens" entram na parte fixa a imagem final do
+# tamanho da cena e, por tile, os tiles em voo na leitura antecipada e o trabalho do
+# kernel; se não couber, o governador reduz a profundidade da leitura e depois o tile
+# (por imagem). No modo "tiles" o rank 0 escolhe um tile que caiba num trabalhador (um
+# tile por vez) e o distribui a todos, porque a fusão e as unidades dependem dele.
+MAX_MEMORIA = None
+
+# Uma linha por execução (modo, ranks, tempo...) para o relatório de escalonamento forte
+ARQUIVO_ESCALONAMENTO = os.path.join(PASTA_RESULTADOS, "escalonamento_mpi.csv")
+
 
 # CONFIGURAÇÃO MPI
 
@@ -36,27 +81,85 @@ comm = MPI.COMM_WORLD
 rank = comm.Get_rank()
 size = comm.Get_size()
 
+TAG_PEDIDO = 1   # trabalhador -> mestre: pronto para a próxima unidade
+TAG_TAREFA = 2   # mestre -> trabalhador: unidade (imagem, x, y) ou None para encerrar
+
 
 # FUNÇÃO PARA DETECTAR VERMELHO EM UM TILE
 
+# Kernel HSV do motor_deteccao com blur 5x5 e canais em RGB (ordem do rasterio)
+PARAMETROS_KERNEL = dict(
+    ordem="RGB", blur=5, area_minima=AREA_MINIMA,
+    baixo1=VERMELHO_BAIXO1, alto1=VERMELHO_ALTO1,
+    baixo2=VERMELHO_BAIXO2, alto2=VERMELHO_ALTO2,
+    cores=FORMATO_REGISTROS is not None,
+)
+
 def detectar_areas_vermelhas_tile(imagem_rgb):
-    imagem_hsv = cv2.cvtColor(imagem_rgb, cv2.COLOR_RGB2HSV)
-    imagem_hsv = cv2.GaussianBlur(imagem_hsv, (5, 5), 0)
+    focos = motor_deteccao.detectar(imagem_rgb, "hsv", retornar_contornos=True, **PARAMETROS_KERNEL)
+    cv2.drawContours(imagem_rgb, [f["contorno"] for f in focos], -1, (0, 255, 0), 2)
+    return focos, imagem_rgb
 
-    mascara1 = cv2.inRange(imagem_hsv, VERMELHO_BAIXO1, VERMELHO_ALTO1)
-    mascara2 = cv2.inRange(imagem_hsv, VERMELHO_BAIXO2, VERMELHO_ALTO2)
-    mascara = cv2.bitwise_or(mascara1, mascara2)
-    mascara = cv2.morphologyEx(mascara, cv2.MORPH_OPEN, np.ones((3, 3), np.uint8))
 
-    contornos, _ = cv2.findContours(mascara, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+# VARIANTE COM HALO: MÁSCARA DO TILE AMPLIADO, CONTORNOS E COMPONENTES SÓ DO NÚCLEO
 
-    focos = 0
-    for contorno in contornos:
-        if cv2.contourArea(contorno) >= AREA_MINIMA:
-            focos += 1
-            cv2.drawContours(imagem_rgb, [contorno], -1, (0, 255, 0), 2)
+def detectar_areas_vermelhas_tile_halo(imagem_rgb, x, y, topo, esq, h, w):
+    mascara = motor_deteccao.calcular_mascara(imagem_rgb, "hsv", **PARAMETROS_KERNEL)
+    cores = (imagem_rgb[:, :, 0], imagem_rgb[:, :, 1], imagem_rgb[:, :, 2]) if PARAMETROS_KERNEL["cores"] else None
+    componentes = motor_deteccao.componentes_tile(mascara, x, y, topo, esq, h, w, cores=cores)
+
+    # Desenha todos os contornos do núcleo: um pedaço pequeno na borda pode fazer
+    # parte de um foco grande do tile vizinho, então o filtro de área fica para a fusão
+    nucleo_rgb = np.ascontiguousarray(imagem_rgb[topo:topo + h, esq:esq + w])
+    nucleo_mascara = np.ascontiguousarray(mascara[topo:topo + h, esq:esq + w])
+    contornos, _ = cv2.findContours(nucleo_mascara, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    cv2.drawContours(nucleo_rgb, contornos, -1, (0, 255, 0), 2)
+
+    return componentes, nucleo_rgb
+
+
+# ORÇAMENTO DE MEMÓRIA DE UM RANK
+
+# Retorna o governo (orcamento_memoria.governar) de um rank com `fixo` bytes fixos e até
+# `em_voo` tiles de entrada em memória ao mesmo tempo; None sem MAX_MEMORIA
+def governar_rank(fixo, canais, em_voo):
+    if MAX_MEMORIA is None:
+        return None
+    governo = orcamento_memoria.governar(
+        orcamento_memoria.interpretar_bytes(MAX_MEMORIA), fixo, "hsv", PARAMETROS_KERNEL, TILE_SIZE, 1, canais, HALO,
+        processos=False, em_voo=em_voo,
+    )
+    if governo["ajustes"]:
+        print(f"[RANK {rank}] Orçamento de memória {governo['orcamento'] / 1024**2:.0f} MB: {', '.join(governo['ajustes'])}")
+    return governo
+
+
+# FUNÇÃO PARA LER UM TILE (COM OU SEM HALO) COMO RGB
+
+# Retorna (img_rgb, nucleo); img_rgb é None se a imagem tiver menos de 3 bandas e
+# nucleo = (topo, esq, h, w) localiza o tile dentro do recorte com halo (None sem halo)
+def ler_tile_rgb(src, x, y, tile_size=TILE_SIZE):
+    width, height = src.width, src.height
+    if HALO is None:
+        janela = Window(x, y, min(tile_size, width - x), min(tile_size, height - y))
+        nucleo = None
+    else:
+        y0, y1, x0, x1, topo, esq, h, w = janela_com_halo(x, y, tile_size, height, width, HALO)
+        janela = Window(x0, y0, x1 - x0, y1 - y0)
+        nucleo = (topo, esq, h, w)
+    bloco = src.read(window=janela)
+
+    if bloco.shape[0] < 3:
+        return None, nucleo
+    return np.dstack([bloco[0], bloco[1], bloco[2]]).astype(np.uint8), nucleo
 
-    return focos, imagem_rgb
+
+# Gerador (x, y, img_rgb, nucleo) na ordem das linhas de tiles, lido sob demanda
+def tiles_rgb(src, tile_size=TILE_SIZE):
+    for y in range(0, src.height, tile_size):
+        for x in range(0, src.width, tile_size):
+            img_rgb, nucleo = ler_tile_rgb(src, x, y, tile_size)
+            yield x, y, img_rgb, nucleo
 
 
 # FUNÇÃO PARA PROCESSAR UMA IMAGEM EM TILES
@@ -64,52 +167,271 @@ def detectar_areas_vermelhas_tile(imagem_rgb):
 def processar_imagem_em_blocos(imagem_path):
     nome_base = os.path.basename(imagem_path).replace('.tif', '').replace('.tiff', '')
 
+    escritor = None
     try:
         with rasterio.open(imagem_path) as src:
             width = src.width
             height = src.height
 
+            if FORMATO_REGISTROS is not None:
+                escritor = registros_deteccoes.abrir_registros(
+                    os.path.join(PASTA_RESULTADOS, f"registros_{nome_base}{FORMATO_REGISTROS}"),
+                    nome_base, registros_deteccoes.georreferencia_rasterio(src),
+                )
+
+            # Tiles em voo: os da fila da leitura antecipada mais o que está sendo detectado
+            governo = governar_rank(height * width * 3 if SALVAR_OVERLAY else 0, src.count, PROFUNDIDADE_LEITURA + 1)
+            tile_size = TILE_SIZE if governo is None else governo["tile_size"]
+            profundidade = PROFUNDIDADE_LEITURA if governo is None else governo["em_voo"] - 1
+
             focos_total = 0
-            imagem_final = np.zeros((height, width, 3), dtype=np.uint8)
-
-            for y in range(0, height, TILE_SIZE):
-                for x in range(0, width, TILE_SIZE):
-                    janela = Window(
-                        x, y,
-                        min(TILE_SIZE, width - x),
-                        min(TILE_SIZE, height - y)
-                    )
-                    bloco = src.read(window=janela)
-
-                    if bloco.shape[0] < 3:
+            componentes = []
+            imagem_final = np.zeros((height, width, 3), dtype=np.uint8) if SALVAR_OVERLAY else None
+
+            # A leitora lê os próximos tiles enquanto este rank detecta o atual
+            antecipacao = leitura_antecipada.nova_estatistica(profundidade)
+            tiles = leitura_antecipada.antecipar(tiles_rgb(src, tile_size), profundidade, antecipacao)
+            try:
+                for x, y, img_rgb, nucleo in tiles:
+                    if img_rgb is None:
                         print(f"[AVISO] Menos de 3 bandas em {imagem_path}")
                         continue
 
-                    img_rgb = np.dstack([bloco[0], bloco[1], bloco[2]]).astype(np.uint8)
-
-                    focos_tile, imagem_processada = detectar_areas_vermelhas_tile(img_rgb)
-                    focos_total += focos_tile
+                    if HALO is None:
+                        focos_tile, imagem_processada = detectar_areas_vermelhas_tile(img_rgb)
+                        focos_total += len(focos_tile)
+                        if escritor is not None:
+                            registros_deteccoes.escrever_registros(escritor, registros_deteccoes.focos_globais(focos_tile, x, y))
+                    else:
+                        componentes_bloco, imagem_processada = detectar_areas_vermelhas_tile_halo(img_rgb, x, y, *nucleo)
+                        componentes.append(componentes_bloco)
 
                     # Insere o tile processado na imagem final
-                    h_tile, w_tile = imagem_processada.shape[:2]
-                    imagem_final[y:y + h_tile, x:x + w_tile, :] = imagem_processada
+                    if imagem_final is not None:
+                        h_tile, w_tile = imagem_processada.shape[:2]
+                        imagem_final[y:y + h_tile, x:x + w_tile, :] = imagem_processada
+            finally:
+                tiles.close()  # encerra a leitora antes de fechar o dataset
+            if profundidade > 0:
+                print(f"[RANK {rank}] {nome_base}: {leitura_antecipada.resumo_antecipacao(antecipacao)}")
+
+            if HALO is not None:
+                focos = motor_deteccao.fundir(componentes, tile_size, "hsv", **PARAMETROS_KERNEL)
+                focos_total = len(focos)
+                if escritor is not None:
+                    registros_deteccoes.escrever_registros(escritor, registros_deteccoes.atribuir_tiles(focos, tile_size))
 
             # Salva a imagem final com todos os contornos
-            caminho_saida = os.path.join(PASTA_RESULTADOS, f"resultado_{nome_base}.png")
-            cv2.imwrite(caminho_saida, cv2.cvtColor(imagem_final, cv2.COLOR_RGB2BGR))
+            if imagem_final is not None:
+                caminho_saida = os.path.join(PASTA_RESULTADOS, f"resultado_{nome_base}.png")
+                cv2.imwrite(caminho_saida, cv2.cvtColor(imagem_final, cv2.COLOR_RGB2BGR))
 
             print(f"[RANK {rank}] Processado {nome_base} - Focos detectados: {focos_total}")
+            if governo is not None:
+                print(f"[RANK {rank}] {orcamento_memoria.resumo_memoria(governo)}")
 
             return focos_total
 
     except Exception as e:
         print(f"[ERRO] Falha ao processar {imagem_path}: {e}")
         return 0
+    finally:
+        if escritor is not None:
+            registros_deteccoes.fechar_registros(escritor)
+
+
+# MODO "tiles": UNIDADES (IMAGEM, TILE) DISTRIBUÍDAS SOB DEMANDA
+
+# Lista de unidades (índice da imagem, x, y) na ordem das imagens e das linhas de tiles
+def listar_unidades(imagens, tile_size=TILE_SIZE):
+    unidades = []
+    for i, imagem_path in enumerate(imagens):
+        with rasterio.open(imagem_path) as src:
+            unidades.extend((i, x, y) for y in range(0, src.height, tile_size) for x in range(0, src.width, tile_size))
+    return unidades
+
+# Detecta um tile; sem halo devolve os focos já em coordenadas globais, com halo os
+# componentes do núcleo (a fusão é feita no rank 0 depois do gather)
+def processar_unidade(src, x, y, tile_size=TILE_SIZE):
+    img_rgb, nucleo = ler_tile_rgb(src, x, y, tile_size)
+    if img_rgb is None:
+        print(f"[AVISO] Menos de 3 bandas em {src.name}")
+        return [] if HALO is None else None
+    if HALO is None:
+        focos = motor_deteccao.detectar(img_rgb, "hsv", **PARAMETROS_KERNEL)
+        return registros_deteccoes.focos_globais(focos, x, y)
+    cores = (img_rgb[:, :, 0], img_rgb[:, :, 1], img_rgb[:, :, 2]) if PARAMETROS_KERNEL["cores"] else None
+    mascara = motor_deteccao.calcular_mascara(img_rgb, "hsv", **PARAMETROS_KERNEL)
+    return motor_deteccao.componentes_tile(mascara, x, y, *nucleo, cores=cores)
+
+# Mestre (rank 0): responde cada pedido com a próxima unidade; quem pede primeiro
+# recebe primeiro, então ranks mais rápidos ou com tiles vazios pegam mais unidades
+def mestre(unidades):
+    status = MPI.Status()
+    proxima = 0
+    ativos = size - 1
+    while ativos:
+        comm.recv(source=MPI.ANY_SOURCE, tag=TAG_PEDIDO, status=status)
+        destino = status.Get_source()
+        if proxima < len(unidades):
+            comm.send(unidades[proxima], dest=destino, tag=TAG_TAREFA)
+            proxima += 1
+        else:
+            comm.send(None, dest=destino, tag=TAG_TAREFA)
+            ativos -= 1
+
+# Trabalhador: pede unidades até receber None. Cada imagem é aberta uma vez por rank.
+# Retorna (resultados [(índice, x, y, focos ou componentes)], unidades, tempo ocupado)
+def trabalhador(imagens, proxima_unidade, tile_size=TILE_SIZE):
+    abertas = {}
+    resultados = []
+    ocupado = 0.0
+    try:
+        while True:
+            unidade = proxima_unidade()
+            if unidade is None:
+                break
+            i, x, y = unidade
+            t0 = time.perf_counter()
+            if i not in abertas:
+                abertas[i] = rasterio.open(imagens[i])
+            resultados.append((i, x, y, processar_unidade(abertas[i], x, y, tile_size)))
+            ocupado += time.perf_counter() - t0
+    finally:
+        for src in abertas.values():
+            src.close()
+    return resultados, len(resultados), ocupado
+
+def _pedir_unidade():
+    comm.send(None, dest=0, tag=TAG_PEDIDO)
+    return comm.recv(source=0, tag=TAG_TAREFA)
+
+# Rank 0: junta os resultados de todos os ranks por imagem, funde (halo), grava
+# registros e overlay e devolve o total de focos
+def consolidar_imagens(imagens, resultados, tile_size=TILE_SIZE):
+    por_imagem = {i: [] for i in range(len(imagens))}
+    for i, x, y, resultado in resultados:
+        por_imagem[i].append(resultado)
+
+    total = 0
+    for i, imagem_path in enumerate(imagens):
+        nome_base = os.path.basename(imagem_path).replace('.tif', '').replace('.tiff', '')
+        with rasterio.open(imagem_path) as src:
+            width, height = src.width, src.height
+            georef = registros_deteccoes.georreferencia_rasterio(src)
+
+        if HALO is None:
+            focos = [f for focos_tile in por_imagem[i] for f in focos_tile]
+        else:
+            focos = motor_deteccao.fundir(por_imagem[i], tile_size, "hsv", **PARAMETROS_KERNEL)
+            registros_deteccoes.atribuir_tiles(focos, tile_size)
+        total += len(focos)
+
+        if FORMATO_REGISTROS is not None:
+            escritor = registros_deteccoes.abrir_registros(
+                os.path.join(PASTA_RESULTADOS, f"registros_{nome_base}{FORMATO_REGISTROS}"), nome_base, georef
+            )
+            try:
+                registros_deteccoes.escrever_registros(escritor, focos)
+            finally:
+                registros_deteccoes.fechar_registros(escritor)
+
+        # Sem a imagem final do tamanho da cena: círculos nos centros sobre fundo preto,
+        # gravados tile a tile. Nome próprio (centros_): não é o resultado_<nome>.png do
+        # modo "imagens", que desenha os contornos sobre a imagem original
+        if SALVAR_OVERLAY:
+            salvar_overlay_tiff(os.path.join(PASTA_RESULTADOS, f"centros_{nome_base}.tif"),
+                                [(f["x"], f["y"]) for f in focos], height, width)
+
+        print(f"[RANK {rank}] Consolidado {nome_base} - Focos detectados: {len(focos)}")
+    return total
+
+def processar_por_tiles(imagens):
+    governo = None
+    tile_size = TILE_SIZE
+    if rank == 0:
+        # Trabalhador: um tile de entrada por vez, nada fixo além do interpretador
+        governo = governar_rank(0, 3, 1)
+        if governo is not None:
+            tile_size = governo["tile_size"]
+        unidades = listar_unidades(imagens, tile_size)
+        print(f"[INFO] {len(unidades)} unidades (imagem, tile {tile_size}) para {max(size - 1, 1)} trabalhadores")
+    tile_size = comm.bcast(tile_size, root=0)
+    comm.Barrier()
+    t0 = time.perf_counter()
+
+    if size == 1:
+        # Um só rank: ele mesmo percorre a fila
+        fila = iter(unidades)
+        local = trabalhador(imagens, lambda: next(fila, None), tile_size)
+    elif rank == 0:
+        mestre(unidades)
+        local = ([], 0, 0.0)
+    else:
+        local = trabalhador(imagens, _pedir_unidade, tile_size)
+
+    # Só focos/componentes voltam para o rank 0, nunca imagens
+    todos = comm.gather(local, root=0)
+    if rank != 0:
+        return None
+
+    tempo_deteccao = time.perf_counter() - t0
+    resultados = [r for resultados_rank, _, _ in todos for r in resultados_rank]
+    total = consolidar_imagens(imagens, resultados, tile_size)
+    tempo_total = time.perf_counter() - t0
+    if governo is not None:
+        print(f"[RANK {rank}] {orcamento_memoria.resumo_memoria(governo)}")
+
+    # O mestre não detecta; trabalhadores que não receberam nada entram no balanceamento
+    carga = [(r, n, ocupado) for r, (_, n, ocupado) in enumerate(todos) if r != 0 or size == 1]
+    for r, n, ocupado in carga:
+        print(f"[RANK {r}] {n} unidades, {ocupado:.2f}s ocupado")
+    ocupados = [ocupado for _, _, ocupado in carga] or [0.0]
+    media = sum(ocupados) / len(ocupados)
+    print(f"[INFO] Balanceamento: ocupado máx {max(ocupados):.2f}s / médio {media:.2f}s "
+          f"({max(ocupados) / media if media > 0 else 1.0:.2f}x)")
+    return total, len(unidades), tile_size, tempo_deteccao, tempo_total, max(ocupados), media
+
+
+# RELATÓRIO DE ESCALONAMENTO FORTE
+
+CAMPOS_ESCALONAMENTO = ("data", "modo", "ranks", "trabalhadores", "imagens", "unidades", "tile_size",
+                        "halo", "tempo_deteccao", "tempo_total", "ocupado_max", "ocupado_medio", "focos")
+
+def registrar_escalonamento(linha, caminho=ARQUIVO_ESCALONAMENTO):
+    novo = not os.path.exists(caminho)
+    with open(caminho, "a", newline="") as f:
+        escritor = csv.DictWriter(f, fieldnames=CAMPOS_ESCALONAMENTO)
+        if novo:
+            escritor.writeheader()
+        escritor.writerow(linha)
+
+# Mesmo problema (modo, imagens, unidades, tile, halo) com números de ranks diferentes:
+# speedup = T(menor número de trabalhadores) / T(N) e eficiência = speedup / (N / N_base).
+# Para cada número de trabalhadores vale a última execução registrada.
+def relatorio_escalonamento(caminho=ARQUIVO_ESCALONAMENTO):
+    with open(caminho, newline="") as f:
+        linhas = list(csv.DictReader(f))
+
+    grupos = {}
+    for linha in linhas:
+        chave = (linha["modo"], linha["imagens"], linha["unidades"], linha["tile_size"], linha["halo"])
+        grupos.setdefault(chave, {})[int(linha["trabalhadores"])] = float(linha["tempo_total"])
+
+    for (modo, imagens, unidades, tile_size, halo), tempos in sorted(grupos.items()):
+        print(f"\n[ESCALONAMENTO] modo {modo} | {imagens} imagens | {unidades} unidades | tile {tile_size} | halo {halo}")
+        print(f"{'trabalhadores':>13} {'tempo (s)':>10} {'speedup':>8} {'eficiência':>10}")
+        base = min(tempos)
+        for n in sorted(tempos):
+            speedup = tempos[base] / tempos[n] if tempos[n] > 0 else 0.0
+            print(f"{n:>13} {tempos[n]:>10.2f} {speedup:>8.2f} {speedup / (n / base):>10.1%}")
 
 
 # MAIN
 
 def main():
+    if MODO_DISTRIBUICAO not in MODOS_DISTRIBUICAO:
+        raise ValueError(f"Modo de distribuição inválido: {MODO_DISTRIBUICAO} (use um de {MODOS_DISTRIBUICAO})")
     if rank == 0:
         imagens = sorted([
             os.path.join(PASTA_IMAGENS, f)
@@ -121,15 +443,38 @@ def main():
 
     imagens = comm.bcast(imagens, root=0)
 
-    imagens_local = imagens[rank::size]
-
-    resultados_locais = [processar_imagem_em_blocos(p) for p in imagens_local]
-    total_local = sum(resultados_locais)
-
-    total_geral = comm.reduce(total_local, op=MPI.SUM, root=0)
+    if MODO_DISTRIBUICAO == "tiles":
+        resumo = processar_por_tiles(imagens)
+        if rank == 0:
+            total_geral, n_unidades, tile_size, tempo_deteccao, tempo_total, ocupado_max, ocupado_medio = resumo
+            trabalhadores = max(size - 1, 1)
+    else:
+        comm.Barrier()
+        t0 = time.perf_counter()
+        imagens_local = imagens[rank::size]
+
+        resultados_locais = [processar_imagem_em_blocos(p) for p in imagens_local]
+        total_local = sum(resultados_locais)
+        ocupado = time.perf_counter() - t0
+
+        total_geral = comm.reduce(total_local, op=MPI.SUM, root=0)
+        ocupados = comm.gather(ocupado, root=0)
+        if rank == 0:
+            tempo_deteccao = tempo_total = time.perf_counter() - t0
+            n_unidades = len(imagens)
+            tile_size = TILE_SIZE  # o configurado; com MAX_MEMORIA cada imagem pode ter usado um menor
+            ocupado_max, ocupado_medio = max(ocupados), sum(ocupados) / len(ocupados)
+            trabalhadores = size
 
     if rank == 0:
         print(f"\n[INFO] Total geral de areas de incendio detectadas: {total_geral}")
+        registrar_escalonamento({
+            "data": time.strftime("%Y-%m-%d %H:%M:%S"), "modo": MODO_DISTRIBUICAO, "ranks": size,
+            "trabalhadores": trabalhadores, "imagens": len(imagens), "unidades": n_unidades,
+            "tile_size": tile_size, "halo": str(HALO), "tempo_deteccao": f"{tempo_deteccao:.3f}",
+            "tempo_total": f"{tempo_total:.3f}", "ocupado_max": f"{ocupado_max:.3f}",
+            "ocupado_medio": f"{ocupado_medio:.3f}", "focos": total_geral,
+        })
 
         fim = time.time()
         tempo_execucao = fim - inicio
@@ -138,5 +483,11 @@ def main():
 
         print(f"[INFO] Tempo total de execucao: {minutos} min {segundos} seg ({tempo_execucao:.2f} segundos)")
 
+# mpiexec -n N python main.py           -> uma execução (anexa uma linha ao ARQUIVO_ESCALONAMENTO)
+# python main.py relatorio               -> speedup e eficiência das execuções registradas
 if __name__ == "__main__":
-    main()
+    if sys.argv[1:] == ["relatorio"]:
+        if rank == 0:
+            relatorio_escalonamento()
+    else:
+        main()